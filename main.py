@@ -4,12 +4,125 @@ from src.extraction.document import MedicalDocument
 from src.extraction.converter import DocumentConverter
 from src.extraction.ocr import TextExtractor
 from src.model.inference import LayoutLMPredictor
-from src.config import DATA_INPUT_PATH, DATA_OUTPUT_PATH, DATA_FAILED_PATH
+from src.model.templates import TemplateRegistry
+from src.extraction.dedup import DuplicateIndex, file_page_hashes
+from src.utils.profiling import PipelineProfiler
+from src.integration.database import ResultStore, file_sha256
+from src.config import DATA_INPUT_PATH, DATA_OUTPUT_PATH, DATA_FAILED_PATH, MODEL_VERSION, DEDUP
+
+def process_file(file_path, extractor, predictor, profiler, templates=None):
+    """Runs one file through the full pipeline, timing every stage."""
+    with profiler.document(os.path.basename(file_path)) as prof:
+        with prof.stage("route"):
+            doc = MedicalDocument(file_path)
+        with prof.stage("convert"):
+            # Only .docx conversion and starting the poppler shards; pages are rendered while "extract" consumes them
+            pages = DocumentConverter.stream_pages(doc)
+        with prof.stage("extract"):
+            extractor.extract(doc, pages)
+        with prof.stage("predict"):
+            # Known provider layouts: fixed regions come from template priors, LayoutLM labels the rest
+            plan = templates.apply_priors(doc) if templates else {}
+            token_indices = TemplateRegistry.token_indices(plan)
+            predictor.predict(doc, token_indices=token_indices)
+        with prof.stage("refine"):
+            # Uncertain patient fields on scans: re-OCR at high DPI, re-predict only those pages (priors stay)
+            changed_pages = extractor.refine_critical(doc)
+            if changed_pages:
+                predictor.predict(doc, changed_pages, token_indices=token_indices)
+        if templates:
+            with prof.stage("templates"):
+                templates.learn(doc, plan)
+        prof.count(
+            pages=len(doc.pages),
+            tokens=sum(len(page) for page in doc.extracted_data),
+            chunks=predictor.last_num_chunks,
+            skipped_pages=len(doc.skipped_pages),
+        )
+    return doc
+
+def archive(paths, dest_dir):
+    """Moves a processed (or failed) file out of the inbox so the next run doesn't see it again."""
+    for path in paths:
+        if os.path.exists(path):
+            shutil.move(path, os.path.join(dest_dir, os.path.basename(path)))
+
+def serve_file(file_path, extractor, predictor, profiler, store, templates=None, dedup=None):
+    """
+    Results for one file, from the result cache (exact or near-duplicate) or
+    the pipeline. Returns (extracted_data, skipped_pages, doc); doc is None
+    when the result came from the cache. Pipeline errors propagate.
+    """
+    filename = os.path.basename(file_path)
+
+    # Hash before converting: the converter replaces .docx files with their PDF
+    content_hash = file_sha256(file_path)
+    extracted_data = store.get(content_hash)
+    if extracted_data is not None:
+        print(f"♻️ Seen before under {MODEL_VERSION}, serving cached result.")
+        return extracted_data, store.get_skipped(content_hash), None
+
+    page_hashes = []
+    if dedup is not None:
+        try:
+            page_hashes = file_page_hashes(file_path)
+        except Exception as e:
+            print(f"⚠️ Could not hash pages of {filename} for dedup: {e}")
+        for twin_hash, twin_name in dedup.find(page_hashes, exclude=content_hash):
+            twin_data = store.get(twin_hash)
+            if twin_data is None:
+                continue
+            # Looking alike isn't enough: a re-test on the same template differs only in its values
+            if not extractor.same_content(file_path, twin_data):
+                print(f"🔎 Looks like {twin_name}, but its text differs; processing it.")
+                continue
+            print(f"♻️ Near-duplicate of {twin_name} with the same text, serving its result.")
+            skipped_pages = store.get_skipped(twin_hash)
+            store.put(content_hash, filename, twin_data, skipped_pages)
+            dedup.add(content_hash, filename, page_hashes)
+            return twin_data, skipped_pages, None
+
+    doc = process_file(file_path, extractor, predictor, profiler, templates)
+    store.put(content_hash, filename, doc.extracted_data, doc.skipped_pages)
+    if page_hashes:
+        dedup.add(content_hash, filename, page_hashes)
+    return doc.extracted_data, doc.skipped_pages, doc
+
+def handle_file(file_path, extractor, predictor, profiler, store, templates=None, dedup=None):
+    """Runs one inbox file through serve_file, then archives it. Returns True on success."""
+    filename = os.path.basename(file_path)
+    print(f"\n--- Processing: {filename} ---")
+
+    try:
+        extracted_data, skipped_pages, doc = serve_file(file_path, extractor, predictor, profiler, store, templates, dedup)
+    except Exception as e:
+        print(f"❌ Failed to process {filename}: {e}")
+        archive([file_path], DATA_FAILED_PATH)
+        return False
+
+    for page_idx, skip in sorted(skipped_pages.items()):
+        print(f"Skipped page {page_idx+1}: {skip['reason']}")
+    for page in extracted_data:
+        for token in page:
+            if "label" in token:
+                print(f"Found: {token['text']} -> {token['label']} ({token['confidence']:.2f})")
+            else:
+                print(f"Found: {token['text']}, no label")
+    
+    archive([file_path] if doc is None else [file_path, doc.original_path], DATA_OUTPUT_PATH)
+    print(f"✅ Successfully processed and archived: {filename}")
+    return True
 
 def main():
     extractor = TextExtractor()
-    predictor = LayoutLMPredictor() 
+    # Weights load in the background while the first file is converted and extracted
+    predictor = LayoutLMPredictor().preload()
+    profiler = PipelineProfiler()
+    store = ResultStore()
+    templates = TemplateRegistry()
+    dedup = DuplicateIndex() if DEDUP else None
 
+    os.makedirs(DATA_OUTPUT_PATH, exist_ok=True)
     os.makedirs(DATA_FAILED_PATH, exist_ok=True)
     
     incoming_files = [f for f in os.listdir(DATA_INPUT_PATH) if not f.startswith('.')]
@@ -18,26 +131,13 @@ def main():
         return
 
     for filename in incoming_files:
-        file_path = os.path.join(DATA_INPUT_PATH, filename)
-        
-        print(f"\n--- Processing: {filename} ---")
-        
-        doc = MedicalDocument(file_path)
-        DocumentConverter.convert_to_images(doc)
-        extractor.extract(doc)
-        predictor.predict(doc)
-
-        for page in doc.extracted_data:
-            for token in page:
-                if "label" in token:
-                    print(f"Found: {token['text']} -> {token['label']} ({token['confidence']:.2f})")
-                else:
-                    print(f"Found: {token['text']}, no label")
-        
-        # processed_path = os.path.join(DATA_OUTPUT_PATH, doc.filename)
-        # shutil.move(doc.original_path, processed_path)
-        # print(f"✅ Successfully processed and archived: {doc.filename}")
-            
+        handle_file(os.path.join(DATA_INPUT_PATH, filename), extractor, predictor, profiler, store, templates, dedup)
+
+    store.close()
+    templates.close()
+    if dedup:
+        dedup.close()
+    print(f"\n{profiler.summary()}")
         
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
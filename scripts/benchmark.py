@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+import numpy as np
+from src.utils.synthetic import generate_corpus
+from src.utils.profiling import PipelineProfiler, peak_rss_mb
+from src.config import BENCHMARK_PATH
+
+# (kind, pages, rows per page)
+SUITES = {
+    "smoke": [
+        ("digital", 1, 15), ("scanned", 1, 15), ("image", 1, 15), ("docx", 1, 15),
+    ],
+    "standard": [
+        ("digital", 1, 10), ("digital", 3, 30), ("digital", 10, 40),
+        ("scanned", 1, 10), ("scanned", 3, 30), ("scanned", 6, 40),
+        ("image", 1, 10), ("image", 1, 40),
+        ("docx", 1, 20), ("docx", 3, 30),
+    ],
+    "dense": [
+        ("digital", 5, 45), ("scanned", 5, 45), ("image", 1, 45),
+    ],
+}
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+def percentiles(values):
+    if not values:
+        return {}
+    arr = np.asarray(values, dtype=float)
+    return {
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p90": float(np.percentile(arr, 90)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+    }
+
+def summarize(records):
+    total_wall = sum(r["wall_s"] for r in records)
+    total_pages = sum(r["pages"] for r in records)
+    stage_names = sorted({name for r in records for name in r["stages"]})
+
+    summary = {
+        "documents": len(records),
+        "pages": total_pages,
+        "tokens": sum(r["tokens"] for r in records),
+        "docs_per_s": len(records) / total_wall if total_wall else 0.0,
+        "pages_per_s": total_pages / total_wall if total_wall else 0.0,
+        "document_latency_s": percentiles([r["wall_s"] for r in records]),
+        "page_latency_s": percentiles([r["wall_s"] / r["pages"] for r in records if r["pages"]]),
+        "stages_wall_s": {name: percentiles([r["stages"][name]["wall_s"] for r in records if name in r["stages"]]) for name in stage_names},
+        "peak_rss_mb": max((r["peak_rss_mb"] for r in records), default=0.0),
+    }
+
+    by_kind = {}
+    for r in records:
+        by_kind.setdefault(r["kind"], []).append(r)
+    summary["by_kind"] = {
+        kind: {
+            "documents": len(rs),
+            "pages_per_s": sum(r["pages"] for r in rs) / max(1e-9, sum(r["wall_s"] for r in rs)),
+            "document_latency_s": percentiles([r["wall_s"] for r in rs]),
+        }
+        for kind, rs in by_kind.items()
+    }
+    return summary
+
+def run(suite, repeat, warmup, seed):
+    # Heavy imports only once we know we are actually running
+    from main import process_file
+    from src.extraction.ocr import TextExtractor
+    from src.model.inference import LayoutLMPredictor
+
+    corpus_dir = os.path.join(BENCHMARK_PATH, "corpus", f"{suite}-seed{seed}")
+    scratch_dir = os.path.join(BENCHMARK_PATH, "scratch")
+    specs = SUITES[suite]
+
+    print(f"🧪 Generating '{suite}' corpus ({len(specs)} documents, seed={seed})...")
+    corpus = generate_corpus(corpus_dir, specs, seed=seed)
+
+    startup = {}
+    t0 = time.perf_counter()
+    extractor = TextExtractor()
+    startup["extractor_s"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    predictor = LayoutLMPredictor()
+    startup["predictor_s"] = time.perf_counter() - t0
+    startup["rss_after_load_mb"] = peak_rss_mb()
+
+    profiler = PipelineProfiler(path=None, record_limit=None)
+
+    def run_once(src_path):
+        # The converter deletes .docx originals, so every run works on a fresh copy
+        os.makedirs(scratch_dir, exist_ok=True)
+        path = shutil.copy(src_path, scratch_dir)
+        try:
+            return process_file(path, extractor, predictor, profiler)
+        finally:
+            for name in os.listdir(scratch_dir):
+                os.remove(os.path.join(scratch_dir, name))
+
+    for src_path in corpus[:warmup]:
+        run_once(src_path)
+    profiler.records.clear()
+
+    records = []
+    for iteration in range(repeat):
+        for src_path, (kind, num_pages, rows) in zip(corpus, specs):
+            run_once(src_path)
+            record = profiler.records[-1]
+            record.update({"kind": kind, "spec_pages": num_pages, "spec_rows": rows, "iteration": iteration})
+            records.append(record)
+            print(f"   {os.path.basename(src_path):<32} {record['wall_s']:7.2f}s")
+
+    commit, dirty = git_revision()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "suite": suite,
+        "seed": seed,
+        "repeat": repeat,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "startup": startup,
+        "summary": summarize(records),
+        "records": records,
+    }
+
+def compare(path_a, path_b):
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+
+    print(f"📊 {a['commit']} ({a['suite']}) -> {b['commit']} ({b['suite']})")
+
+    def row(name, va, vb, lower_is_better=True):
+        delta = (vb - va) / va * 100 if va else 0.0
+        better = (delta < 0) == lower_is_better
+        marker = "✅" if abs(delta) < 5 or better else "⚠️"
+        print(f"   {name:<28} {va:10.3f} -> {vb:10.3f}  ({delta:+6.1f}%) {marker}")
+
+    sa, sb = a["summary"], b["summary"]
+    row("pages/s", sa["pages_per_s"], sb["pages_per_s"], lower_is_better=False)
+    row("docs/s", sa["docs_per_s"], sb["docs_per_s"], lower_is_better=False)
+    for p in ("p50", "p90", "p99"):
+        row(f"document latency {p} (s)", sa["document_latency_s"][p], sb["document_latency_s"][p])
+    for stage in sorted(set(sa["stages_wall_s"]) & set(sb["stages_wall_s"])):
+        row(f"{stage} p50 (s)", sa["stages_wall_s"][stage]["p50"], sb["stages_wall_s"][stage]["p50"])
+    row("peak RSS (MB)", sa["peak_rss_mb"], sb["peak_rss_mb"])
+    for key in ("extractor_s", "predictor_s"):
+        if key in a["startup"] and key in b["startup"]:
+            row(f"startup {key}", a["startup"][key], b["startup"][key])
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on synthetic lab documents.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="standard")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1, help="Documents to run once before measuring.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two saved result files.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = run(args.suite, args.repeat, args.warmup, args.seed)
+
+    results_dir = os.path.join(BENCHMARK_PATH, "results")
+    os.makedirs(results_dir, exist_ok=True)
+    suffix = "-dirty" if result["dirty"] else ""
+    out_path = os.path.join(results_dir, f"{result['suite']}-{result['commit']}{suffix}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+    s = result["summary"]
+    print(f"\n✅ {s['documents']} documents, {s['pages']} pages | {s['pages_per_s']:.2f} pages/s | "
+          f"p50 {s['document_latency_s']['p50']:.2f}s p90 {s['document_latency_s']['p90']:.2f}s | peak RSS {s['peak_rss_mb']:.0f} MB")
+    print(f"💾 Saved to {out_path}")
+
+if __name__ == "__main__":
+    main()
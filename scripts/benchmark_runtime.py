@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from src.utils.hardware import available_cpus, cpu_supports_bf16
+from src.config import BENCHMARK_PATH, CPU_RUNTIME
+
+def candidate_profiles(compile_too, pin):
+    """A grid of CPU_RUNTIME variants sized to this node."""
+    cpus = available_cpus()
+    threads = sorted({1, max(1, cpus // 4), max(1, cpus // 2), cpus})
+    profiles = []
+    for t in threads:
+        for bf16 in ([False, True] if cpu_supports_bf16() else [False]):
+            for compiled in ([False, True] if compile_too else [False]):
+                profile = {**CPU_RUNTIME, "intra_op_threads": t, "inter_op_threads": 1, "bf16": bf16, "compile": compiled, "pin_cores": None}
+                profiles.append(profile)
+                if pin and t < cpus:
+                    profiles.append({**profile, "pin_cores": f"0-{t - 1}"})
+    return profiles
+
+def profile_name(profile):
+    name = f"{profile['intra_op_threads']}t"
+    if profile["pin_cores"] is not None:
+        name += f" pin {profile['pin_cores']}"
+    if profile["bf16"]:
+        name += " bf16"
+    if profile["compile"]:
+        name += " compile"
+    return name
+
+def run_profile(profile, num_pages, rows_per_page, repeats):
+    """Runs in a fresh interpreter: inter-op threads, pinning and compiled graphs can't be undone in-process."""
+    from src.model.inference import LayoutLMPredictor
+    from src.utils.synthetic import synthetic_pages
+
+    pages = synthetic_pages(num_pages, rows_per_page)
+    images, tokens = [img for img, _ in pages], [t for _, t in pages]
+    predictor = LayoutLMPredictor(device="cpu", runtime=profile)
+
+    start = time.perf_counter()
+    predictor.model # Includes compiling and warming up the buckets
+    load_s = time.perf_counter() - start
+    predictor.predict_arrays(images[:1], tokens[:1]) # First real call: allocator and thread pools
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predictor.predict_arrays(images, tokens)
+        timings.append(time.perf_counter() - start)
+    timings = np.asarray(timings)
+    return {
+        "profile": profile,
+        "load_s": load_s,
+        "chunks": predictor.last_num_chunks,
+        "pages_per_s": float(num_pages / np.median(timings)),
+        "run_s": {"p50": float(np.percentile(timings, 50)), "p90": float(np.percentile(timings, 90)), "min": float(timings.min())},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time LayoutLM inference under CPU runtime profiles to pick CPU_RUNTIME for this node.")
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=30, help="Result rows per synthetic page.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--compile", action="store_true", help="Also try torch.compile (slow to warm up).")
+    parser.add_argument("--pin", action="store_true", help="Also try each partial thread count pinned to its own cores.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.out, "w") as f:
+            json.dump(run_profile(json.loads(args.child), args.pages, args.rows, args.repeats), f)
+        return
+
+    results = []
+    for profile in candidate_profiles(args.compile, args.pin):
+        name = profile_name(profile)
+        print(f"⏱️ {name}...")
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "result.json")
+            cmd = [sys.executable, "-m", "scripts.benchmark_runtime", "--child", json.dumps(profile), "--out", out,
+                   "--pages", str(args.pages), "--rows", str(args.rows), "--repeats", str(args.repeats)]
+            if subprocess.run(cmd).returncode != 0:
+                print(f"❌ Profile '{name}' failed.")
+                continue
+            with open(out) as f:
+                results.append({"name": name, **json.load(f)})
+
+    if not results:
+        return
+    results.sort(key=lambda r: r["pages_per_s"], reverse=True)
+    print(f"\n{'profile':<28} {'pages/s':>8} {'p50 s':>7} {'p90 s':>7} {'load s':>7}")
+    for r in results:
+        print(f"{r['name']:<28} {r['pages_per_s']:8.2f} {r['run_s']['p50']:7.2f} {r['run_s']['p90']:7.2f} {r['load_s']:7.1f}")
+
+    best = results[0]["profile"]
+    print(f"\n🏆 Fastest on this node: CPU_RUNTIME = {json.dumps(best)}")
+
+    out_dir = os.path.join(BENCHMARK_PATH, "runtime")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{platform.node()}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "host": platform.node(), "machine": platform.machine(), "cpus": available_cpus(),
+            "native_bf16": cpu_supports_bf16(), "pages": args.pages, "rows": args.rows, "results": results,
+        }, f, indent=2)
+    print(f"💾 Saved {path}")
+
+if __name__ == "__main__":
+    main()
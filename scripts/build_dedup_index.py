@@ -0,0 +1,38 @@
+import argparse
+import os
+from src.extraction.dedup import DuplicateIndex
+from src.config import IMAGES_PATH, DATA_OUTPUT_PATH, DEDUP_DB_PATH
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash pages into the near-duplicate index and list the duplicate groups found.")
+    parser.add_argument("folders", nargs="*", default=[IMAGES_PATH, DATA_OUTPUT_PATH])
+    parser.add_argument("--db", default=DEDUP_DB_PATH)
+    args = parser.parse_args()
+
+    paths = [
+        os.path.join(folder, name)
+        for folder in args.folders if os.path.isdir(folder)
+        for name in sorted(os.listdir(folder)) if not name.startswith('.')
+    ]
+    with DuplicateIndex(args.db) as index:
+        hashes = index.update(paths)
+
+        # Group each file with the earliest file it duplicates, so thresholds can be checked by eye
+        groups, seen = {}, {}
+        for path in paths:
+            h = hashes[path]
+            twins = [h] + [t for t, _ in index.find(index.hashes(h), exclude=h)]
+            first = next((seen[t] for t in twins if t in seen), None)
+            if first is None:
+                seen[h] = path
+            else:
+                groups.setdefault(first, []).append(path)
+
+    for first, others in groups.items():
+        print(f"🪞 {first}")
+        for path in others:
+            print(f"     {path}")
+    print(f"✅ {len(paths)} files indexed, {sum(len(o) for o in groups.values())} near-duplicates in {len(groups)} groups")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import argparse
+import os
+from transformers import LayoutLMv3ForTokenClassification
+from src.config import CUSTOM_MODEL_PATH
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-save a checkpoint as model.safetensors so it can be memory-mapped at load time.")
+    parser.add_argument("model_path", nargs="?", default=CUSTOM_MODEL_PATH)
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.model_path, "model.safetensors")):
+        print(f"✅ {args.model_path} already has model.safetensors.")
+        return
+
+    print(f"⏳ Loading {args.model_path}...")
+    model = LayoutLMv3ForTokenClassification.from_pretrained(args.model_path)
+    model.save_pretrained(args.model_path, safe_serialization=True)
+
+    legacy_path = os.path.join(args.model_path, "pytorch_model.bin")
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    print(f"✅ Saved {args.model_path}/model.safetensors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import time
+from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Config, EarlyStoppingCallback
+from datasets import load_from_disk
+import torch
+from src.model.training import LayoutLMCollator, DistillationTrainer, build_training_arguments, init_student_from_teacher
+from src.config import (
+    LABELS, DATASET_PATH, CUSTOM_MODEL_PATH, STUDENT_MODEL_PATH, STUDENT_ARCHITECTURE,
+    DISTILL_TEMPERATURE, DISTILL_ALPHA, DISTILL_EPOCHS
+)
+
+id2label = {k: v for k, v in enumerate(LABELS)}
+label2id = {v: k for k, v in enumerate(LABELS)}
+
+def count_parameters(model):
+    return sum(p.numel() for p in model.parameters())
+
+def time_forward(model, dataset, collator, batch_size):
+    """Seconds per example for a plain forward pass over `dataset`."""
+    model.eval()
+    start = time.perf_counter()
+    with torch.inference_mode():
+        for i in range(0, len(dataset), batch_size):
+            batch = collator([dataset[j] for j in range(i, min(i + batch_size, len(dataset)))])
+            batch.pop("labels")
+            model(**batch)
+    return (time.perf_counter() - start) / max(1, len(dataset))
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the fine-tuned LayoutLMv3 into a smaller student model.")
+    parser.add_argument("--teacher", default=CUSTOM_MODEL_PATH)
+    parser.add_argument("--output", default=STUDENT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=DISTILL_EPOCHS)
+    parser.add_argument("--temperature", type=float, default=DISTILL_TEMPERATURE)
+    parser.add_argument("--alpha", type=float, default=DISTILL_ALPHA, help="Weight of the teacher's soft labels (1 - alpha goes to the annotations).")
+    cli = parser.parse_args()
+
+    print("⏳ Loading Dataset...")
+    dataset = load_from_disk(DATASET_PATH).with_format("numpy")
+    dataset = dataset.train_test_split(test_size=0.2, seed=42)
+
+    print(f"👩‍🏫 Loading teacher from {cli.teacher}...")
+    teacher = LayoutLMv3ForTokenClassification.from_pretrained(cli.teacher, id2label=id2label, label2id=label2id)
+
+    # Same vocabulary, embeddings layout and labels as the teacher; only depth and width shrink
+    config = LayoutLMv3Config.from_dict({**teacher.config.to_dict(), **STUDENT_ARCHITECTURE})
+    student = LayoutLMv3ForTokenClassification(config)
+    copied = init_student_from_teacher(teacher, student)
+    print(f"🎓 Student: {config.num_hidden_layers} layers, hidden {config.hidden_size}, "
+          f"{count_parameters(student) / 1e6:.1f}M parameters (teacher {count_parameters(teacher) / 1e6:.1f}M); "
+          f"{copied} tensors initialized from the teacher.")
+
+    args, description = build_training_arguments(cli.output, cli.epochs, 1e-4)
+    collator = LayoutLMCollator(pad_token_id=config.pad_token_id)
+
+    trainer = DistillationTrainer(
+        model=student,
+        args=args,
+        train_dataset=dataset["train"],
+        eval_dataset=dataset["test"],
+        data_collator=collator,
+        teacher=teacher,
+        temperature=cli.temperature,
+        alpha=cli.alpha,
+
+        callbacks=[EarlyStoppingCallback(early_stopping_patience=3)]
+    )
+
+    print(f"🚀 Distilling on {len(dataset['train'])} examples... ({description}, T={cli.temperature}, alpha={cli.alpha})")
+    trainer.train()
+    trainer.save_model(cli.output)
+    print(f"✅ Student saved to {cli.output}.")
+
+    # Forward-pass cost on the held-out split, both in fp32 on the CPU
+    student = trainer.model.to("cpu").float()
+    teacher = teacher.to("cpu").float()
+    teacher_s = time_forward(teacher, dataset["test"], collator, args.per_device_eval_batch_size)
+    student_s = time_forward(student, dataset["test"], collator, args.per_device_eval_batch_size)
+    print(f"⏱️ Forward pass per example: teacher {teacher_s * 1000:.0f} ms, student {student_s * 1000:.0f} ms "
+          f"({teacher_s / student_s if student_s else 0:.1f}x)")
+    print("   Set USE_STUDENT_MODEL = True in src/config.py to serve it, and compare accuracy with "
+          "`python -m scripts.evaluate --config baseline --config student`.")
+
+if __name__ == "__main__":
+    main()
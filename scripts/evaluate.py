@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from src.config import JSON_MIN_PATH, IMAGES_PATH, BENCHMARK_PATH, STUDENT_MODEL_PATH, RASTER_DPI, OCR_ONE_PASS_DPI
+
+# Named configurations: overrides applied to src.config before the pipeline is imported.
+# Keys starting with "_" are harness options rather than config values.
+CONFIGS = {
+    "baseline": {},
+    "low-dpi": {
+        "RASTER_DPI": {"scanned": 110, "digital": 72},
+        "PREPROCESSING": {
+            "scan": {"max_side": 1400, "grayscale": True, "deskew": True, "crop_borders": True},
+            "photo": {"max_side": 1100, "grayscale": True, "deskew": True, "crop_borders": True},
+        },
+    },
+    # RASTER_DPI is derived from OCR_TWO_PASS when config is imported, so it has to be overridden with it
+    "one-pass-ocr": {"OCR_TWO_PASS": False, "RASTER_DPI": {**RASTER_DPI, "scanned": OCR_ONE_PASS_DPI}},
+    "no-stride": {"CHUNK_STRIDE_TOKENS": 0},
+    "no-page-filter": {"RELEVANCE_FILTER": False},
+    "int8-dynamic": {"_quantize": "int8"},
+    "student": {"INFERENCE_MODEL_PATH": STUDENT_MODEL_PATH, "MODEL_VERSION": "custom_v8_student"},
+}
+
+def evaluate_config(name, limit, iou_threshold):
+    """Runs in a fresh interpreter per configuration, so overrides reach every module and memory is measured cleanly."""
+    import src.config as config
+    options = {}
+    for key, value in CONFIGS[name].items():
+        if key.startswith("_"):
+            options[key] = value
+        else:
+            setattr(config, key, value)
+
+    from main import process_file
+    from src.extraction.ocr import TextExtractor
+    from src.model.inference import LayoutLMPredictor
+    from src.integration.label_studio import build_prediction_results
+    from src.utils.profiling import PipelineProfiler, peak_rss_mb
+    from src.utils.evaluation import load_ground_truth, entities_from_results, EntityScorer
+
+    items = load_ground_truth(JSON_MIN_PATH, IMAGES_PATH)[:limit]
+    extractor = TextExtractor()
+    predictor = LayoutLMPredictor()
+    if options.get("_quantize") == "int8":
+        import torch
+        predictor.model # Load first, then swap in the quantized copy
+        predictor._model = predictor._forward = torch.ao.quantization.quantize_dynamic(predictor.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    profiler = PipelineProfiler(path=None, record_limit=None)
+    scorer = EntityScorer(iou_threshold)
+    failures = 0
+
+    for image_path, gold in items:
+        try:
+            doc = process_file(image_path, extractor, predictor, profiler)
+        except Exception as e:
+            print(f"   ❌ {os.path.basename(image_path)}: {e}")
+            failures += 1
+            scorer.add(gold, [])
+            continue
+
+        predicted = []
+        if doc.pages and doc.extracted_data:
+            width, height = doc.pages[0].size
+            tokens = doc.extracted_data[0]
+            predictions = [(t["label"], t["confidence"]) if "label" in t else None for t in tokens]
+            predicted = entities_from_results(build_prediction_results(tokens, predictions, width, height))
+        scorer.add(gold, predicted)
+
+    records = profiler.records
+    wall = sum(r["wall_s"] for r in records)
+    pages = sum(r["pages"] for r in records)
+    stages = {}
+    for r in records:
+        for stage, times in r["stages"].items():
+            stages[stage] = stages.get(stage, 0.0) + times["wall_s"]
+
+    return {
+        "config": name,
+        "overrides": {k: v for k, v in CONFIGS[name].items()},
+        "documents": len(items),
+        "failures": failures,
+        "pages": pages,
+        "pages_per_s": pages / wall if wall else 0.0,
+        "stages_wall_s": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "accuracy": scorer.report(),
+    }
+
+def print_report(results):
+    print(f"\n{'config':<16} {'pages/s':>8} {'peak MB':>8} {'P':>6} {'R':>6} {'F1':>6}")
+    for r in results:
+        micro = r["accuracy"]["micro"]
+        print(f"{r['config']:<16} {r['pages_per_s']:8.3f} {r['peak_rss_mb']:8.0f} "
+              f"{micro['precision']:6.3f} {micro['recall']:6.3f} {micro['f1']:6.3f}")
+
+    labels = sorted({label for r in results for label in r["accuracy"]["labels"]})
+    print(f"\n{'label':<20}" + "".join(f" {r['config'][:14]:>14}" for r in results) + "   (P / R)")
+    for label in labels:
+        cells = []
+        for r in results:
+            s = r["accuracy"]["labels"].get(label)
+            cells.append(f" {s['precision']:6.2f}/{s['recall']:<6.2f}" if s else f" {'-':>14}")
+        print(f"{label:<20}" + "".join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy vs throughput of pipeline configurations on the annotated export.")
+    parser.add_argument("--config", action="append", choices=sorted(CONFIGS), help="Repeatable; default: all configurations.")
+    parser.add_argument("--limit", type=int, help="Only the first N annotated items.")
+    parser.add_argument("--iou", type=float, default=0.5, help="Minimum overlap for a predicted entity to match a gold one.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.out, "w") as f:
+            json.dump(evaluate_config(args.child, args.limit, args.iou), f)
+        return
+
+    results = []
+    for name in args.config or list(CONFIGS):
+        print(f"🧪 {name}...")
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "result.json")
+            cmd = [sys.executable, "-m", "scripts.evaluate", "--child", name, "--out", out, "--iou", str(args.iou)]
+            if args.limit:
+                cmd += ["--limit", str(args.limit)]
+            if subprocess.run(cmd).returncode != 0:
+                print(f"❌ Configuration '{name}' failed.")
+                continue
+            with open(out) as f:
+                results.append(json.load(f))
+
+    if not results:
+        return
+    print_report(results)
+
+    out_dir = os.path.join(BENCHMARK_PATH, "evaluations")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Saved {path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,14 @@
 import json
 import os
 import shutil
-import torch
-import uuid
 import unicodedata
 from pathlib import Path
-from PIL import Image
-from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Processor
-from src.config import JSON_MIN_PATH, IMAGES_PATH, FINAL_MODEL_PATH, BASE_MODEL_PATH, PRIORITY_FOLDER
-from src.train.generate_predictions import merge_boxes_bio
+from src.extraction.document import MedicalDocument
+from src.extraction.converter import DocumentConverter
+from src.extraction.ocr import TextExtractor
+from src.model.inference import LayoutLMPredictor
+from src.integration.label_studio import build_prediction_results
+from src.config import JSON_MIN_PATH, PRIORITY_FOLDER
 
 OUTPUT_DIR = "./data/batch_upload"
 
@@ -75,10 +75,9 @@ def main():
 
     print(f"🚀 Processing {len(todo_files)} Priority Images...")
 
-    # 4. Load Model
-    model = LayoutLMv3ForTokenClassification.from_pretrained(CUSTOM_MODEL_PATH)
-    processor = LayoutLMv3Processor.from_pretrained(BASE_MODEL_PATH)
-    id2label = model.config.id2label
+    # 4. Load Model & Extractor (same engine as main.py)
+    extractor = TextExtractor()
+    predictor = LayoutLMPredictor()
 
     ls_tasks = []
 
@@ -88,90 +87,22 @@ def main():
         
         # Copy to upload folder
         shutil.copy(src_path, dst_path)
-        
-        image = Image.open(src_path).convert("RGB")
+
+        doc = MedicalDocument(src_path)
+        DocumentConverter.convert_to_images(doc)
+        extractor.extract(doc)
+
+        if not doc.extracted_data or not doc.extracted_data[0]:
+            print(f"  ⚠️ No text found by OCR in {filename}.")
+            continue
+
+        image = doc.pages[0]
         width, height = image.size
+        tokens = doc.extracted_data[0]
 
-        # --- SLIDING WINDOW INFERENCE ---
-        inputs = processor(
-            image, 
-            return_tensors="pt", 
-            truncation=True, 
-            max_length=512, 
-            padding="max_length",
-            return_overflowing_tokens=True, 
-            stride=128
-        )
-        
-        # Fix Pixel Values (Replicate Image for batches)
-        pixel_values = inputs['pixel_values']
-        if isinstance(pixel_values, list):
-            if len(pixel_values) > 0 and isinstance(pixel_values[0], torch.Tensor):
-                pixel_values = torch.stack(pixel_values)
-            else:
-                pixel_values = torch.tensor(pixel_values)
-        
-        if pixel_values.dim() == 3:
-            pixel_values = pixel_values.unsqueeze(0)
-            
-        num_chunks = inputs['input_ids'].shape[0]
-        if pixel_values.shape[0] != num_chunks:
-            pixel_values = pixel_values.repeat(num_chunks, 1, 1, 1)
-            
-        inputs['pixel_values'] = pixel_values
-
-        with torch.no_grad():
-            outputs = model(**inputs)
-        
-        # --- STITCHING LOGIC ---
-        chunk_predictions = outputs.logits.argmax(-1)
-        chunk_probs = outputs.logits.softmax(-1).max(-1).values
-        chunk_boxes = inputs.bbox 
-
-        final_pixel_boxes = []
-        final_labels = []
-        final_probs = []
-        seen_boxes = set()
-
-        for i in range(len(chunk_predictions)):
-            preds = chunk_predictions[i].tolist()
-            probs = chunk_probs[i].tolist()
-            boxes = chunk_boxes[i].tolist()
-
-            for pred_id, prob, box in zip(preds, probs, boxes):
-                if box == [0, 0, 0, 0]: continue
-                
-                box_tuple = tuple(box)
-                if box_tuple in seen_boxes: continue
-                seen_boxes.add(box_tuple)
-                
-                final_pixel_boxes.append([
-                    box[0] * width / 1000,
-                    box[1] * height / 1000,
-                    box[2] * width / 1000,
-                    box[3] * height / 1000
-                ])
-                final_labels.append(id2label[pred_id])
-                final_probs.append(prob)
-
-        merge_detections = merge_boxes_bio(final_pixel_boxes, final_labels, final_probs) 
-
-        results = []
-        for box, label, score in merge_detections:
-            if score < 0.40 or label == "O": continue
-            x1, y1, x2, y2 = box
-            
-            results.append({
-                "from_name": "label",
-                "to_name": "image",
-                "type": "rectanglelabels",
-                "value": {
-                    "x": (x1 / width) * 100, "y": (y1 / height) * 100, 
-                    "width": ((x2 - x1) / width) * 100, "height": ((y2 - y1) / height) * 100,
-                    "rotation": 0, "rectanglelabels": [label]
-                },
-                "score": float(score)
-            })
+        # --- SLIDING WINDOW INFERENCE + STITCHING (shared engine) ---
+        predictions = predictor.predict_pages([image], [tokens])[0]
+        results = build_prediction_results(tokens, predictions, width, height)
 
         ls_tasks.append({
             "data": { "image": filename }, 
@@ -1,43 +1,31 @@
-import requests
-import json
+import argparse
 
 # --- CONFIG ---
-from src.config import LABEL_STUDIO_URL, PROJECT_ID, SESSION_ID, TASKS_JSON_PATH
+from src.config import PROJECT_ID, TASKS_INDEX_PATH
+from src.integration.label_studio import LabelStudioClient, TaskIndex
 
 def main():
+    parser = argparse.ArgumentParser(description="Sync Label Studio tasks into the local task index.")
+    parser.add_argument("--full", action="store_true", help="Ignore the last sync point and re-download every task.")
+    args = parser.parse_args()
+
     print(f"⏳ Connecting to Project {PROJECT_ID} via Session Cookie...")
-    
-    # Define cookies dictionary
-    cookies = {
-        "sessionid": SESSION_ID
-    }
-    
-    # URL to export tasks
-    url = f"{LABEL_STUDIO_URL}/api/projects/{PROJECT_ID}/export?exportType=JSON&download_all_tasks=true"
-    
-    try:
-        # Note: We use 'cookies=' instead of 'headers='
-        response = requests.get(url, cookies=cookies)
-        
-        # Check for errors
-        if response.status_code == 403:
-             print("❌ 403 Forbidden: Your cookie might be expired. Refresh the page and copy 'sessionid' again.")
-             return
-        if response.status_code == 401:
-             print("❌ 401 Unauthorized: The cookie is invalid.")
-             return
-             
-        response.raise_for_status()
-        
-        data = response.json()
-        print(f"✅ Success! Downloaded {len(data)} tasks.")
-        
-        # Save file
-        with open(TASKS_JSON_PATH, "w") as f:
-            json.dump(data, f, indent=2)
-            
-    except Exception as e:
-        print(f"❌ Error: {e}")
+    client = LabelStudioClient()
+
+    with TaskIndex(TASKS_INDEX_PATH) as index:
+        since = None if args.full else index.get_meta("last_updated_at")
+        print(f"   Fetching tasks updated since: {since or 'the beginning'}")
+
+        try:
+            written = client.sync(index, full=args.full)
+        except PermissionError as e:
+            print(f"❌ {e}")
+            return
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return
+
+        print(f"✅ Success! Synced {written} new/updated tasks ({len(index)} total in '{TASKS_INDEX_PATH}').")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
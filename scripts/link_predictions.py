@@ -1,25 +1,21 @@
 import json
 import os
-import urllib.parse
-from src.config import TASKS_JSON_PATH
+from src.config import TASKS_INDEX_PATH
+from src.integration.label_studio import TaskIndex
 
 PREDICTIONS_JSON = "data/batch_upload/predictions.json"
 OUTPUT_JSON = "data/batch_upload/ready_to_import.json"
 
 def main():
-    if not os.path.exists(TASKS_JSON_PATH):
-        print(f"❌ Error: Could not find {TASKS_JSON_PATH}")
+    if not os.path.exists(TASKS_INDEX_PATH):
+        print(f"❌ Error: Could not find {TASKS_INDEX_PATH}. Run scripts/get_studio_files.py first.")
         return
 
-    print(f"⏳ Loading huge export: {TASKS_JSON_PATH}...")
-    with open(TASKS_JSON_PATH, 'r') as f:
-        all_tasks = json.load(f)
-    
     print(f"⏳ Loading local predictions: {PREDICTIONS_JSON}...")
     with open(PREDICTIONS_JSON, 'r') as f:
         preds_raw = json.load(f)
 
-    # 1. Build a map of our 20 new predictions
+    # 1. Build a map of our new predictions
     # Key: "page1.png" -> Value: [Prediction Object]
     pred_map = {}
     for item in preds_raw:
@@ -27,45 +23,28 @@ def main():
         fname = os.path.basename(item['data']['image']) 
         pred_map[fname] = item['predictions']
 
-    print(f"   Found {len(all_tasks)} total tasks in export.")
-    print(f"   Looking for {len(pred_map)} new predictions.")
-
     tasks_to_update = []
-    
-    # 2. Filter the Huge List
-    for task in all_tasks:
-        # Label Studio path: "/data/upload/1/8d9bc659-%D0%9C%D0%B0...png"
-        raw_path = task['data']['image']
-        
-        # 1. DECODE the URL (Turn %D0%9C into Cyrillic characters)
-        # This converts "/data/.../%D0%9C.png" -> "/data/.../Махмудова.png"
-        decoded_path = urllib.parse.unquote(raw_path)
-        
-        # Check if this task matches any of our new files
-        match_found = False
+
+    # 2. Look each file up in the task index instead of scanning the whole export
+    with TaskIndex(TASKS_INDEX_PATH) as index:
+        print(f"   Found {len(index)} total tasks in index.")
+        print(f"   Looking for {len(pred_map)} new predictions.")
+
         for fname, prediction in pred_map.items():
-            # Now we compare "Махмудова.png" with "Махмудова.png"
-            # We check both raw and decoded just to be safe
-            if decoded_path.endswith(fname) or raw_path.endswith(fname):
-                
-                # MATCH! This is one of the 20 new files.
-                # Attach the prediction
-                task['predictions'] = prediction
-                
-                # Add to our "Update List"
-                tasks_to_update.append(task)
-                
-                # Remove from map so we don't double-match
-                del pred_map[fname]
-                match_found = True
-                break
-        
-        if len(pred_map) == 0:
-            break
+            # Label Studio path: "/data/upload/1/8d9bc659-%D0%9C%D0%B0...png"
+            # The index stores it decoded, so "Махмудова.png" matches directly
+            matches = index.find_by_filename(fname)
+            if not matches:
+                continue
+
+            # MATCH! Attach the prediction to the first task with this file
+            task = matches[0]
+            task['predictions'] = prediction
+            tasks_to_update.append(task)
 
     # 3. Save ONLY the updated tasks
     if not tasks_to_update:
-        print("❌ CRITICAL: No matching tasks found. Did you upload the images first?")
+        print("❌ CRITICAL: No matching tasks found. Did you upload the images and sync the index first?")
         return
 
     with open(OUTPUT_JSON, 'w') as f:
@@ -76,4 +55,4 @@ def main():
     print("   (This file is small and safe—it only updates the new images).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
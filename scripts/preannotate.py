@@ -0,0 +1,33 @@
+import argparse
+import os
+from src.extraction.ocr import TextExtractor
+from src.model.inference import LayoutLMPredictor
+from src.integration.preannotation import PreAnnotator, jsonl_to_json
+from src.config import IMAGES_PATH, SUPPORTED_IMAGES, MODEL_VERSION, PIPELINE_WORKERS, PREANNOTATION_BATCH_PAGES
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk pre-annotate images for Label Studio (resumable JSONL output).")
+    parser.add_argument("--input", default=IMAGES_PATH, help="Folder of page images.")
+    parser.add_argument("--output", default="./data/preannotations/predictions.jsonl")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS, help="OCR processes; 0 runs OCR in this process.")
+    parser.add_argument("--batch-pages", type=int, default=PREANNOTATION_BATCH_PAGES)
+    parser.add_argument("--model-version", default=MODEL_VERSION)
+    parser.add_argument("--json", help="Also write the finished tasks as a JSON array to this path, for Label Studio import.")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.input, f) for f in os.listdir(args.input)
+        if os.path.splitext(f)[1].lower() in SUPPORTED_IMAGES
+    )
+    annotator = PreAnnotator(
+        LayoutLMPredictor(), TextExtractor(), args.output,
+        workers=args.workers, batch_pages=args.batch_pages, model_version=args.model_version,
+    )
+    annotator.run(paths)
+
+    if args.json:
+        jsonl_to_json(args.output, args.json)
+        print(f"📦 Label Studio import file: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,8 @@ from urllib.parse import unquote
 import time
 import shutil
 from PIL import Image
-import torch
 from transformers import LayoutLMv3Processor
-from datasets import Dataset, Features, Sequence, ClassLabel, Value, Array2D, Array3D
+from datasets import Dataset, Features, Sequence, ClassLabel, Value, Array3D
 import numpy as np
 from collections import defaultdict 
 from src.extraction.document import MedicalDocument
@@ -88,35 +87,34 @@ def generate_examples(json_path=JSON_MIN_PATH):
             continue
             
         tokens = doc.extracted_data[0]
-        words = [t['text'] for t in tokens]
-        boxes = [t['bbox'] for t in tokens]
+        words = tokens.texts
+        boxes = tokens.bboxes.tolist()
 
         # 3. PROCESS
+        # No padding here: examples are stored at their real length and padded per batch
+        # by LayoutLMCollator at training time.
         try:
             encoding = processor(
-                image, words, boxes=boxes, truncation=True, 
-                max_length=512, padding="max_length", return_tensors="pt",
+                image, words, boxes=boxes, truncation=True,
+                max_length=512, padding=False,
                 return_overflowing_tokens=True, stride=128 
             )
         except Exception as e:
             print(f"❌ [File {filename}] Processor Failed: {e}")
             continue
 
-        num_chunks = len(encoding.input_ids)
+        num_chunks = len(encoding["input_ids"])
         
-        pv = encoding.pixel_values
-        if isinstance(pv, list):
-            if len(pv) > 0 and isinstance(pv[0], torch.Tensor): pv = torch.stack(pv)
-            else: pv = torch.tensor(pv)
-        if pv.dim() == 3: pv = pv.unsqueeze(0)
-        if pv.shape[0] == 1 and num_chunks > 1: pv = pv.repeat(num_chunks, 1, 1, 1)
+        pv = np.asarray(encoding["pixel_values"], dtype=np.float32)
+        if pv.ndim == 3: pv = pv[None]
+        if pv.shape[0] == 1 and num_chunks > 1: pv = np.repeat(pv, num_chunks, axis=0)
 
         for chunk_idx in range(num_chunks):
-            ocr_boxes_1000 = encoding.bbox[chunk_idx]
+            ocr_boxes_1000 = encoding["bbox"][chunk_idx]
             token_labels = []
             
             for i, ocr_box in enumerate(ocr_boxes_1000):
-                if ocr_box.tolist() == [0, 0, 0, 0]:
+                if list(ocr_box) == [0, 0, 0, 0]:
                     token_labels.append(label2id["O"])
                     continue
 
@@ -149,11 +147,12 @@ def generate_examples(json_path=JSON_MIN_PATH):
                 total_valid_samples += 1
                 yield {
                     "id": f"{filename}_{chunk_idx}",
-                    "input_ids": encoding.input_ids[chunk_idx].tolist(),
-                    "attention_mask": encoding.attention_mask[chunk_idx].tolist(),
-                    "bbox": encoding.bbox[chunk_idx].tolist(),
-                    "pixel_values": pv[chunk_idx].tolist(), 
-                    "labels": token_labels
+                    "input_ids": encoding["input_ids"][chunk_idx],
+                    "attention_mask": encoding["attention_mask"][chunk_idx],
+                    "bbox": encoding["bbox"][chunk_idx],
+                    "pixel_values": pv[chunk_idx],
+                    "labels": token_labels,
+                    "length": len(encoding["input_ids"][chunk_idx])
                 }
 
         # --- 🔍 FILE-LEVEL DIAGNOSTICS LOGGING ---
@@ -177,13 +176,15 @@ print("🚀 Parsing Label Studio Data with OOP Engine...")
 
 if os.path.exists(DATASET_PATH): shutil.rmtree(DATASET_PATH)
 
+# Variable-length rows; "length" lets the trainer group similar lengths without decoding input_ids
 features = Features({
     "id": Value("string"),
-    "input_ids": Sequence(Value("int64")),
-    "attention_mask": Sequence(Value("int64")),
-    "bbox": Array2D(dtype="int64", shape=(512, 4)),
+    "input_ids": Sequence(Value("int32")),
+    "attention_mask": Sequence(Value("int8")),
+    "bbox": Sequence(Sequence(Value("int16"), length=4)),
     "pixel_values": Array3D(dtype="float32", shape=(3, 224, 224)),
-    "labels": Sequence(ClassLabel(names=LABELS))
+    "labels": Sequence(ClassLabel(names=LABELS)),
+    "length": Value("int32"),
 })
 
 ds = Dataset.from_generator(
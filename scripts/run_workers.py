@@ -0,0 +1,59 @@
+import argparse
+import os
+from main import handle_file
+from src.extraction.ocr import TextExtractor
+from src.model.inference import LayoutLMPredictor
+from src.integration.database import ResultStore
+from src.model.templates import TemplateRegistry
+from src.extraction.dedup import DuplicateIndex
+from src.utils.profiling import PipelineProfiler, memory_breakdown
+from src.utils.workers import ForkedWorkerPool
+from src.config import DATA_INPUT_PATH, DATA_OUTPUT_PATH, DATA_FAILED_PATH, PIPELINE_WORKERS, METRICS_PATH, METRICS_FORMAT, DEDUP
+
+_process_state = {} # Per worker: SQLite connections and metrics files must not be shared across fork
+
+def _handle(extractor, predictor, file_path):
+    if not _process_state:
+        path = METRICS_PATH if METRICS_FORMAT != "prometheus" else f"{METRICS_PATH}.{os.getpid()}"
+        _process_state["profiler"] = PipelineProfiler(path=path)
+        _process_state["store"] = ResultStore()
+        _process_state["templates"] = TemplateRegistry()
+        _process_state["dedup"] = DuplicateIndex() if DEDUP else None
+    return handle_file(
+        file_path, extractor, predictor, _process_state["profiler"], _process_state["store"],
+        _process_state["templates"], _process_state["dedup"]
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Process the inbox with forked workers that share one copy of the models.")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    args = parser.parse_args()
+
+    os.makedirs(DATA_OUTPUT_PATH, exist_ok=True)
+    os.makedirs(DATA_FAILED_PATH, exist_ok=True)
+    files = [os.path.join(DATA_INPUT_PATH, f) for f in os.listdir(DATA_INPUT_PATH) if not f.startswith('.')]
+    if not files:
+        print("Inbox is empty. Nothing to process.")
+        return
+
+    # Load everything once, before forking, so every worker maps the same pages
+    before = memory_breakdown()
+    extractor = TextExtractor()
+    predictor = LayoutLMPredictor()
+    extractor.ocr_engine
+    predictor.model
+    parent = memory_breakdown()
+    print(f"🧠 Models loaded in parent: +{parent['rss_mb'] - before['rss_mb']:.0f} MB")
+
+    pool = ForkedWorkerPool(lambda path: _handle(extractor, predictor, path), num_workers=args.workers)
+    print(f"🚀 {len(files)} files, {args.workers} workers x {pool.threads_per_worker} threads")
+    outcomes = pool.run(files)
+
+    failed = [(path, error) for path, ok, error in outcomes if error or not ok]
+    for path, error in failed:
+        print(f"❌ {os.path.basename(path)}{': ' + error.strip().splitlines()[-1] if error else ''}")
+    print(f"✅ {len(outcomes) - len(failed)}/{len(files)} processed")
+    print(pool.memory_report(parent))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import argparse
+from src.integration.server import serve
+from src.config import SERVER_HOST, SERVER_PORT
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve LayoutLMv3 predictions over HTTP (Label Studio ML backend compatible).")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,46 @@
-from transformers import LayoutLMv3ForTokenClassification, TrainingArguments, Trainer, EarlyStoppingCallback
+import argparse
+import os
+from transformers import LayoutLMv3ForTokenClassification, Trainer, EarlyStoppingCallback
 from datasets import load_from_disk
 import torch
-from src.config import LABELS, BASE_MODEL_PATH, DATASET_PATH, CUSTOM_MODEL_PATH
+from src.model.training import LayoutLMCollator, build_training_arguments, load_manifest, save_manifest, next_model_path, select_incremental
+from src.config import (
+    LABELS, BASE_MODEL_PATH, DATASET_PATH, CUSTOM_MODEL_PATH,
+    INCREMENTAL_EPOCHS, INCREMENTAL_LEARNING_RATE, INCREMENTAL_REPLAY_RATIO
+)
 
 id2label = {k: v for k, v in enumerate(LABELS)}
 label2id = {v: k for k, v in enumerate(LABELS)}
 
 def main():
+    parser = argparse.ArgumentParser(description="Fine-tune LayoutLMv3 on the prepared Label Studio dataset.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Continue from CUSTOM_MODEL_PATH on examples it hasn't seen (plus replay) and save as the next custom_vN.")
+    cli = parser.parse_args()
+
     print("⏳ Loading Dataset...")
-    dataset = load_from_disk(DATASET_PATH)
+    # Memory-mapped Arrow: rows are read on demand by the loader workers, nothing is copied into RAM
+    dataset = load_from_disk(DATASET_PATH).with_format("numpy")
+
+    if cli.incremental:
+        start_path = CUSTOM_MODEL_PATH
+        output_path = next_model_path(CUSTOM_MODEL_PATH)
+        trained_ids = load_manifest(CUSTOM_MODEL_PATH)
+        if not trained_ids:
+            print(f"⚠️ {CUSTOM_MODEL_PATH} has no training manifest; every example counts as new.")
+        dataset, num_new = select_incremental(dataset, trained_ids, INCREMENTAL_REPLAY_RATIO)
+        if num_new == 0:
+            print("✅ No new examples since the last training run. Nothing to do.")
+            return
+        if len(dataset) < 2:
+            print("⚠️ Need at least 2 examples to train and evaluate. Annotate a little more first.")
+            return
+        print(f"🔁 Incremental: {num_new} new + {len(dataset) - num_new} replayed examples, {start_path} -> {output_path}")
+        epochs, learning_rate = INCREMENTAL_EPOCHS, INCREMENTAL_LEARNING_RATE
+    else:
+        start_path, output_path = BASE_MODEL_PATH, CUSTOM_MODEL_PATH
+        trained_ids = set()
+        epochs, learning_rate = 20, 5e-5
     
     # Split: 80% Train, 20% Test (even with 20 items, we need to verify overfitting)
     dataset = dataset.train_test_split(test_size=0.2)
@@ -16,50 +48,33 @@ def main():
     print(f"🏋️‍♀️ Training on {len(dataset['train'])} examples...")
 
     model = LayoutLMv3ForTokenClassification.from_pretrained(
-        BASE_MODEL_PATH,
+        start_path,
         id2label=id2label,
         label2id=label2id
     )
 
-    args = TrainingArguments(
-        output_dir=CUSTOM_MODEL_PATH,
-        max_steps=-1,
-        num_train_epochs=20,
-        
-        per_device_train_batch_size=1,
-        gradient_accumulation_steps=4,
-
-        fp16=False,         
-        dataloader_num_workers=0,
-
-        save_strategy="epoch",
-        eval_strategy="epoch",
-        logging_strategy="epoch",
-
-        load_best_model_at_end=True,
-        metric_for_best_model="eval_loss",
-        greater_is_better=False,
-        save_total_limit=3,
-        
-        warmup_ratio=0.1,
-        learning_rate=5e-5,
-    )
+    args, description = build_training_arguments(output_path, epochs, learning_rate)
 
     trainer = Trainer(
         model=model,
         args=args,
         train_dataset=dataset["train"],
         eval_dataset=dataset["test"],
+        data_collator=LayoutLMCollator(pad_token_id=model.config.pad_token_id),
 
         callbacks=[EarlyStoppingCallback(early_stopping_patience=3)]
     )
 
-    print("🚀 Starting Training...")
+    print(f"🚀 Starting Training... ({description})")
     trainer.train()
     
     # Save final model
-    trainer.save_model(CUSTOM_MODEL_PATH)
-    print("✅ Training Complete! Model saved.")
+    trainer.save_model(output_path)
+    save_manifest(output_path, trained_ids | {str(i) for i in dataset["train"]["id"]}, parent=start_path)
+    print(f"✅ Training Complete! Model saved to {output_path}.")
+    if cli.incremental:
+        version = os.path.basename(os.path.normpath(output_path))
+        print(f"   Point CUSTOM_MODEL_PATH at it and set MODEL_VERSION = \"{version}\" in src/config.py to serve it.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+from src.extraction.document import MedicalDocument
+from src.extraction.converter import DocumentConverter
+from src.extraction.relevance import PageRelevanceFilter
+from src.config import RELEVANCE_MODEL_PATH, RELEVANCE_TARGET_RECALL, RASTER_DPI
+
+def page_features(path):
+    """
+    Features for every page of a file, computed the way TextExtractor sees them
+    at runtime. Example files are only read: a .docx is converted into a temp
+    directory, and only scans are rasterized.
+    """
+    doc = MedicalDocument(path)
+    if doc.is_digital:
+        import pdfplumber
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf_path = DocumentConverter.docx_to_pdf(path, tmp) if doc.file_ext == '.docx' else path
+            with pdfplumber.open(pdf_path) as pdf:
+                return [PageRelevanceFilter.features(texts=[w['text'] for w in page.extract_words()]) for page in pdf.pages]
+
+    if doc.file_ext == '.pdf':
+        images = DocumentConverter.rasterize(path, RASTER_DPI["scanned"])
+    else:
+        images = [Image.open(path).convert("RGB")]
+    return [PageRelevanceFilter.features(image=img) for img in images]
+
+def load_folder(folder):
+    rows = []
+    for name in sorted(os.listdir(folder)):
+        if name.startswith('.'):
+            continue
+        try:
+            rows.extend(page_features(os.path.join(folder, name)))
+        except Exception as e:
+            print(f"⚠️ Skipping {name}: {e}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the page-relevance pre-filter from example pages.")
+    parser.add_argument("--relevant", required=True, help="Folder of files whose pages all hold lab results.")
+    parser.add_argument("--irrelevant", required=True, help="Folder of cover letters, consent forms, blank pages...")
+    parser.add_argument("--recall", type=float, default=RELEVANCE_TARGET_RECALL)
+    parser.add_argument("--output", default=RELEVANCE_MODEL_PATH)
+    args = parser.parse_args()
+
+    positives, negatives = load_folder(args.relevant), load_folder(args.irrelevant)
+    print(f"📊 {len(positives)} result pages, {len(negatives)} other pages")
+    if not positives or not negatives:
+        print("❌ Need example pages of both kinds.")
+        return
+
+    features = np.stack(positives + negatives)
+    labels = np.array([1] * len(positives) + [0] * len(negatives))
+    model = PageRelevanceFilter.fit(features, labels, target_recall=args.recall)
+    PageRelevanceFilter.save(model, args.output)
+
+    print(f"✅ Saved {args.output}: threshold {model['threshold']:.3f}, "
+          f"recall {model['recall']:.1%}, skips {model['skip_rate_negatives']:.1%} of other pages")
+
+if __name__ == "__main__":
+    main()
@@ -43,7 +43,74 @@ DATASET_PATH = "./data/dataset"
 
 CUSTOM_MODEL_PATH = "./models/custom_v8"
 
-MODEL_VERSION = "custom_v8"
+STUDENT_MODEL_PATH = "./models/custom_v8_student" # Written by scripts/distill_model.py
+
+USE_STUDENT_MODEL = False # Serve the distilled student instead of the full model
+
+INFERENCE_MODEL_PATH = STUDENT_MODEL_PATH if USE_STUDENT_MODEL else CUSTOM_MODEL_PATH
+
+MODEL_VERSION = "custom_v8_student" if USE_STUDENT_MODEL else "custom_v8" # Caches are keyed by this, so the two never mix
+
+# The 2D position embedding (4 x coordinate_size + 2 x shape_size) is added to the text embedding, so it must sum to hidden_size
+STUDENT_ARCHITECTURE = {
+    "num_hidden_layers": 4, "hidden_size": 384, "num_attention_heads": 6, "intermediate_size": 1536,
+    "coordinate_size": 64, "shape_size": 64,
+}
+
+DISTILL_TEMPERATURE = 2.0
+
+DISTILL_ALPHA = 0.7 # Weight of the teacher's soft labels vs. the hard annotation labels
+
+DISTILL_EPOCHS = 30
+
+TRAIN_BATCH_SIZE = 8
+
+TRAIN_NUM_WORKERS = 4 # DataLoader worker processes; each reopens the memory-mapped dataset
+
+TRAIN_USE_CPU = True
+
+TRAIN_BF16 = True # bf16 autocast, only switched on if the CPU has native bf16 (AVX512-BF16/AMX)
+
+INCREMENTAL_EPOCHS = 3
+
+INCREMENTAL_LEARNING_RATE = 2e-5
+
+INCREMENTAL_REPLAY_RATIO = 1.0 # Old examples replayed per new example
+
+INFERENCE_BATCH_SIZE = 8
+
+INFERENCE_DEVICE = "auto" # "auto": mps where available, else cpu | "cpu" | "mps"
+
+# How LayoutLM runs on the CPU. Pick per node type with scripts/benchmark_runtime.py.
+CPU_RUNTIME = {
+    "intra_op_threads": None, # Threads per operator; None keeps torch's default (or ForkedWorkerPool's share)
+    "inter_op_threads": 1, # Chunks are one batch at a time, so more inter-op threads only compete for cores
+    "pin_cores": None, # e.g. "0-7": pin to these cores (forked workers split them between themselves)
+    "bf16": True, # bf16 autocast, only switched on if the CPU has native bf16 (AVX512-BF16/AMX)
+    "compile": False, # torch.compile, warmed up on COMPILE_BUCKETS at load; for long-lived single processes (server)
+}
+
+COMPILE_BUCKETS = (128, 256, 512) # With compile on, batches are padded to one of these lengths so shapes repeat
+
+CHUNK_MAX_TOKENS = 512
+
+CHUNK_STRIDE_TOKENS = 32 # Overlap between windows, rounded down to whole lines
+
+SUBWORD_CACHE_SIZE = 200_000 # Words whose subword split is kept between pages (lab vocabulary recurs; values mostly don't)
+
+IMAGE_PREP_WORKERS = 4 # Threads resizing page images for LayoutLM
+
+PIPELINE_WORKERS = 2 # Forked pipeline processes sharing one copy of the model weights
+
+PREANNOTATION_BATCH_PAGES = 32 # Pages labeled per LayoutLM pass during bulk pre-annotation
+
+SERVER_HOST = "127.0.0.1"
+
+SERVER_PORT = 9090
+
+SERVER_BATCH_WINDOW_MS = 25
+
+SERVER_MAX_BATCH_PAGES = 16
 
 JSON_MIN_PATH = "./data/export.json"
 
@@ -57,6 +124,10 @@ SESSION_ID = ".eJxVj8uOhCAQRf-FdUugQBCXs59vIIUUyrSBjmgyj8y_j05608tb5z5SP-zIkY3MB
 
 TASKS_JSON_PATH = "./data/project_tasks.json"
 
+TASKS_INDEX_PATH = "./data/project_tasks.sqlite"
+
+LABEL_STUDIO_PAGE_SIZE = 100
+
 PRIORITY_FOLDER = "./data/priority_cases"
 
 DATA_INPUT_PATH = "data/input"
@@ -65,4 +136,102 @@ DATA_OUTPUT_PATH = "data/output"
 
 DATA_FAILED_PATH = "data/failed"
 
+RESULTS_DB_PATH = "data/results.sqlite"
+
+PREANNOTATION_TABLE = "preannotations" # Pool images labeled for annotation, kept apart from the pipeline's results
+
 SUPPORTED_IMAGES = {'.jpg', '.jpeg', '.png', '.tiff', '.bmp'}
+
+OCR_TWO_PASS = True # Fast low-DPI pass, then high-DPI re-recognition of uncertain regions only
+
+OCR_FAST_DPI = 150
+
+OCR_REFINE_DPI = 300
+
+OCR_ONE_PASS_DPI = 300 # Scan raster resolution when OCR_TWO_PASS is off
+
+OCR_REFINE_CONFIDENCE = 0.5 # Re-OCR tokens EasyOCR is less sure about than this
+
+CRITICAL_REFINE_CONFIDENCE = 0.6 # Re-OCR tokens LayoutLM gives a CRITICAL_LABELS label with less confidence than this
+
+RASTER_DPI = {
+    "scanned": OCR_FAST_DPI if OCR_TWO_PASS else OCR_ONE_PASS_DPI, # OCR input
+    "digital": 100, # Text comes from the PDF layer; LayoutLM only sees a 224x224 image
+}
+
+RASTER_WORKERS = 4 # Parallel poppler processes per document
+
+RASTER_SHARD_PAGES = 4 # Pages per poppler call; small shards get the first pages to OCR sooner
+
+RASTER_FORMAT = "jpeg" # Much smaller temp files than poppler's default PPM
+
+RASTER_JPEG_QUALITY = 92
+
+ACTIVE_LEARNING_STRATEGY = "entropy" # "entropy": highest mean token entropy first | "critical": most low-confidence patient fields first
+
+ACTIVE_LEARNING_BATCH_PAGES = 32 # Pages OCR'd before each batched LayoutLM scoring pass
+
+PREPROCESSING = {
+    # Rasterized PDF scans: already at OCR_FAST_DPI, mostly straight, often with a dark scanner edge
+    "scan": {"max_side": 2000, "grayscale": True, "deskew": True, "crop_borders": True},
+    # Phone photos: 12MP+ frames shrunk hard before detection, tilted, background around the sheet
+    "photo": {"max_side": 1600, "grayscale": True, "deskew": True, "crop_borders": True},
+}
+
+DESKEW_MAX_ANGLE = 5.0 # Degrees searched either side of level
+
+DESKEW_STEP = 0.5 # Search resolution; smaller tilts are left alone
+
+RELEVANCE_FILTER = True # Skip OCR/LayoutLM on pages that don't look like lab results
+
+RELEVANCE_MODEL_PATH = "./models/page_relevance.json" # Written by scripts/train_relevance.py; without it only blank pages are skipped
+
+RELEVANCE_BLANK_INK = 0.002 # Fallback rule: a page with less ink than this (fraction of thumbnail pixels) is blank
+
+RELEVANCE_TARGET_RECALL = 0.99 # Training picks the highest threshold that still keeps this share of result pages
+
+LAB_KEYWORDS = (
+    "анализ", "результат", "норм", "референс", "показател", "единиц", "ммоль", "мкмоль", "г/л", "ед/л", "10^9", "10*9",
+    "гемоглобин", "глюкоз", "холестерин", "лейкоцит", "эритроцит", "тромбоцит", "креатинин", "билирубин",
+    "result", "reference", "range", "units", "mmol", "g/l", "u/l", "hemoglobin", "glucose", "cholesterol",
+)
+
+TEMPLATES_DB_PATH = "data/templates.sqlite"
+
+TEMPLATE_MATCH_THRESHOLD = 0.6 # Share of a template's stable anchor words a page must contain to match it
+
+TEMPLATE_MIN_SUPPORT = 3 # Pages a template must have seen before its priors are used
+
+TEMPLATE_POSITION_TOLERANCE = 15 # Max anchor drift (0-1000 scale) after aligning the page to the template
+
+TEMPLATE_PRIOR_AGREEMENT = 0.95 # An anchor's label is a prior only if this share of its past labels agree
+
+TEMPLATE_SINGLETON_TTL_DAYS = 30 # A template nothing else matched within this many days is dropped
+
+TEMPLATE_LOOKUP_ANCHORS = 20 # Rarest anchor words of a page used to look up candidate templates
+
+TEMPLATE_MAX_CANDIDATES = 8 # Templates sharing the most of those anchors that are actually compared
+
+DEDUP = True # Serve near-duplicate inbox files (re-scans, re-sent photos) from their twin's stored result once their text is confirmed equal
+
+DEDUP_DB_PATH = "data/dedup.sqlite"
+
+DEDUP_MAX_DISTANCE = 6 # Max differing bits of 64 in the page phash
+
+DEDUP_DETAIL_MAX_DISTANCE = 24 # Max differing bits of 256 in the finer hash; keeps same-template reports of different patients apart
+
+DEDUP_RENDER_DPI = 30 # PDF pages are hashed from a render this small
+
+LINE_TOLERANCE = 0.5 # New line when centers jump by more than this many median token heights
+
+COLUMN_MIN_GAP = 8 # Narrowest gutter (0-1000 scale) that separates two columns
+
+METRICS_PATH = "data/metrics/pipeline.jsonl"
+
+METRICS_FORMAT = "jsonl" # "jsonl" | "prometheus" | None
+
+PROFILE_STAGES = set() # e.g. {"extract", "predict"} to dump cProfile stats per document
+
+PROFILE_DIR = "data/metrics/profiles"
+
+BENCHMARK_PATH = "data/benchmarks"
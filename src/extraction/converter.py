@@ -1,45 +1,107 @@
 import os
 import subprocess
-from pdf2image import convert_from_path
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 from src.extraction.document import MedicalDocument
-from src.config import SUPPORTED_IMAGES
+from src.config import SUPPORTED_IMAGES, RASTER_DPI, RASTER_WORKERS, RASTER_SHARD_PAGES, RASTER_FORMAT, RASTER_JPEG_QUALITY
 
 class DocumentConverter:
     @staticmethod
     def convert_to_images(doc: MedicalDocument):
-        
+        """Rasterizes the whole document into doc.pages."""
+        for _ in DocumentConverter.stream_pages(doc):
+            pass
+
+    @staticmethod
+    def stream_pages(doc: MedicalDocument):
+        """
+        Starts rasterizing right away and returns an iterator over the pages in
+        order. Each page is appended to doc.pages as it arrives, so OCR can work
+        on page 1 while poppler is still rendering the rest.
+        """
+        from PIL import Image
+
         if doc.file_ext == '.docx':
             print(f"\nConverting Word Document to PDF: {doc.filename}")
-            doc.pdf_path = doc.original_path.replace('.docx', '.pdf')
-            
-            subprocess.run([
-                'soffice', 
-                '--headless',
-                '--convert-to', 'pdf',
-                '--outdir', os.path.dirname(doc.pdf_path),
-                doc.original_path
-            ], check=True)
-            
+            doc.pdf_path = DocumentConverter.docx_to_pdf(doc.original_path, os.path.dirname(doc.original_path))
+
             print(f"\n🗑️ Deleting original .docx: {doc.original_path}")
             os.remove(doc.original_path)
-            
+
             doc.original_path = doc.pdf_path
             doc.filename = os.path.basename(doc.pdf_path)
             doc.file_ext = '.pdf'
-            
-            print(f"\nExtracting images from: {doc.pdf_path}")
-            doc.pages = convert_from_path(doc.pdf_path)
 
-        elif doc.file_ext == '.pdf':
+        if doc.file_ext == '.pdf':
             doc.pdf_path = doc.original_path
-            print(f"\nExtracting images from: {doc.pdf_path}")
-            doc.pages = convert_from_path(doc.pdf_path)
-            
+            # Scans get a cheap first pass; TextExtractor re-renders only the regions it needs at OCR_REFINE_DPI
+            dpi = RASTER_DPI["digital" if doc.is_digital else "scanned"]
+            print(f"\nExtracting images from: {doc.pdf_path} ({dpi} DPI)")
+            pages = DocumentConverter.rasterize(doc.pdf_path, dpi)
+
         elif doc.file_ext in SUPPORTED_IMAGES:
             print(f"\nLoading image directly: {doc.original_path}")
-            img = Image.open(doc.original_path).convert("RGB")
-            doc.pages = [img]
-            
+            pages = iter([Image.open(doc.original_path).convert("RGB")])
+
         else:
-            raise ValueError(f"\nUnsupported file format '{doc.file_ext}'")
\ No newline at end of file
+            raise ValueError(f"\nUnsupported file format '{doc.file_ext}'")
+
+        doc.pages = []
+        return DocumentConverter._collect(doc, pages)
+
+    @staticmethod
+    def docx_to_pdf(docx_path, out_dir):
+        """Converts a Word document with LibreOffice, leaving the original alone. Returns the PDF's path."""
+        subprocess.run([
+            'soffice',
+            '--headless',
+            '--convert-to', 'pdf',
+            '--outdir', out_dir,
+            docx_path
+        ], check=True)
+        return os.path.join(out_dir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+
+    @staticmethod
+    def _collect(doc, pages):
+        for page in pages:
+            doc.pages.append(page)
+            yield page
+
+    @staticmethod
+    def rasterize(pdf_path, dpi, workers=RASTER_WORKERS, shard_pages=RASTER_SHARD_PAGES):
+        """
+        Renders a PDF with several poppler processes, each on its own page range.
+        All shards are submitted immediately; the returned iterator yields pages
+        in document order as soon as the shard holding them is done.
+        """
+        from pdf2image import convert_from_path, pdfinfo_from_path
+
+        num_pages = int(pdfinfo_from_path(pdf_path)["Pages"])
+        shards = [(first, min(first + shard_pages - 1, num_pages)) for first in range(1, num_pages + 1, shard_pages)]
+        options = {"dpi": dpi, "fmt": RASTER_FORMAT, "thread_count": 1}
+        if RASTER_FORMAT == "jpeg":
+            options["jpegopt"] = {"quality": RASTER_JPEG_QUALITY, "progressive": False, "optimize": False}
+
+        # Threads are enough: each one just waits on its own pdftoppm subprocess
+        executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(shards))), thread_name_prefix="poppler")
+        futures = [executor.submit(convert_from_path, pdf_path, first_page=first, last_page=last, **options) for first, last in shards]
+        executor.shutdown(wait=False)
+
+        def pages():
+            try:
+                for future in futures:
+                    yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return pages()
+
+    @staticmethod
+    def render_page(doc: MedicalDocument, page_idx, dpi):
+        """One page at a given resolution (images come back at their native resolution)."""
+        from pdf2image import convert_from_path
+        from PIL import Image
+
+        if doc.pdf_path:
+            return convert_from_path(doc.pdf_path, dpi=dpi, first_page=page_idx + 1, last_page=page_idx + 1)[0]
+        return Image.open(doc.original_path).convert("RGB")
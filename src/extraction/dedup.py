@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import time
+import numpy as np
+from src.config import SUPPORTED_IMAGES, DEDUP_DB_PATH, DEDUP_MAX_DISTANCE, DEDUP_DETAIL_MAX_DISTANCE, DEDUP_RENDER_DPI
+
+BANDS = 8 # 64-bit hash -> 8 bands of 8 bits; two hashes within 7 bits share at least one band exactly
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+_DCT32 = _dct_matrix(32)
+_DCT64 = _dct_matrix(64)
+
+
+def _dct_bits(gray, dct, keep):
+    """The keep x keep lowest frequencies of a square grayscale block, thresholded at their median (DC excluded)."""
+    low = (dct @ gray @ dct.T)[:keep, :keep].ravel()
+    return low > np.median(low[1:])
+
+
+def page_hashes(image):
+    """
+    (phash, detail) for one page image. phash is the classic 64-bit DCT hash
+    of a 32x32 thumbnail, used to find candidates; detail is a 256-bit hash of
+    a 64x64 thumbnail that must also agree before two pages count as the same,
+    since lab reports on one provider's template share most of their layout.
+    """
+    from PIL import Image
+    gray = image.convert("L")
+    small = np.asarray(gray.resize((32, 32), Image.BOX), dtype=np.float32)
+    large = np.asarray(gray.resize((64, 64), Image.BOX), dtype=np.float32)
+    phash = int(np.packbits(_dct_bits(small, _DCT32, 8)).view(">u8")[0])
+    detail = np.packbits(_dct_bits(large, _DCT64, 16)).tobytes()
+    return phash - (1 << 64) if phash >= 1 << 63 else phash, detail # SQLite integers are signed
+
+
+def hamming(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+def detail_distance(a, b):
+    return int(np.unpackbits(np.frombuffer(a, dtype=np.uint8) ^ np.frombuffer(b, dtype=np.uint8)).sum())
+
+
+def file_page_hashes(path):
+    """page_hashes for every page of an image or PDF, rendered small. Empty for formats it can't read cheaply (.docx)."""
+    from PIL import Image
+    from src.extraction.converter import DocumentConverter
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in SUPPORTED_IMAGES:
+        with Image.open(path) as img:
+            return [page_hashes(img)]
+    if ext == ".pdf":
+        return [page_hashes(page) for page in DocumentConverter.rasterize(path, DEDUP_RENDER_DPI)]
+    return []
+
+
+class DuplicateIndex:
+    """
+    Perceptual hashes of every page seen, to catch re-scans, re-sent photos and
+    double exports that a byte hash misses.
+
+    Each page's 64-bit phash is split into BANDS bands, each indexed in SQLite,
+    so a lookup only compares the pages sharing a band with the query
+    (locality-sensitive hashing) instead of the whole collection. Documents
+    are keyed by their content hash (file_sha256), like ResultStore, so a
+    near-duplicate can be served from whatever is stored under its twin.
+    """
+
+    def __init__(self, path=DEDUP_DB_PATH, max_distance=DEDUP_MAX_DISTANCE, detail_max_distance=DEDUP_DETAIL_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.detail_max_distance = detail_max_distance
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " content_hash TEXT PRIMARY KEY,"
+            " filename TEXT,"
+            " num_pages INTEGER NOT NULL,"
+            " added_at REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " content_hash TEXT NOT NULL,"
+            " page_idx INTEGER NOT NULL,"
+            " phash INTEGER NOT NULL,"
+            " detail BLOB NOT NULL,"
+            + "".join(f" band{i} INTEGER NOT NULL," for i in range(BANDS)) +
+            " PRIMARY KEY (content_hash, page_idx))"
+        )
+        for i in range(BANDS):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS pages_band{i} ON pages (band{i})")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _bands(phash):
+        return [(phash >> (8 * i)) & 0xFF for i in range(BANDS)]
+
+    def __contains__(self, content_hash):
+        return self.conn.execute("SELECT 1 FROM documents WHERE content_hash = ?", (content_hash,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add(self, content_hash, filename, hashes, commit=True):
+        """Indexes a document's pages (a list of page_hashes). Re-adding a content hash replaces it."""
+        self.conn.execute("DELETE FROM pages WHERE content_hash = ?", (content_hash,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents (content_hash, filename, num_pages, added_at) VALUES (?, ?, ?, ?)",
+            (content_hash, filename, len(hashes), time.time())
+        )
+        self.conn.executemany(
+            f"INSERT INTO pages VALUES (?, ?, ?, ?{', ?' * BANDS})",
+            [(content_hash, i, phash, detail, *self._bands(phash)) for i, (phash, detail) in enumerate(hashes)]
+        )
+        if commit:
+            self.conn.commit()
+
+    def hashes(self, content_hash):
+        """The indexed page_hashes of a document, in page order."""
+        rows = self.conn.execute("SELECT phash, detail FROM pages WHERE content_hash = ? ORDER BY page_idx", (content_hash,))
+        return [(phash, bytes(detail)) for phash, detail in rows]
+
+    def _same_page(self, a, b):
+        return hamming(a[0], b[0]) <= self.max_distance and detail_distance(a[1], b[1]) <= self.detail_max_distance
+
+    def find(self, hashes, exclude=None):
+        """
+        Indexed documents with the same number of pages whose every page is a
+        near-duplicate of the matching page in `hashes`, closest first, as
+        [(content_hash, filename)].
+        """
+        if not hashes:
+            return []
+        bands = self._bands(hashes[0][0])
+        rows = self.conn.execute(
+            "SELECT p.content_hash, d.filename, p.phash, p.detail FROM pages p JOIN documents d USING (content_hash)"
+            " WHERE p.page_idx = 0 AND d.num_pages = ? AND (" + " OR ".join(f"p.band{i} = ?" for i in range(BANDS)) + ")",
+            (len(hashes), *bands)
+        ).fetchall()
+
+        matches = []
+        for content_hash, filename, phash, detail in rows:
+            if content_hash == exclude or not self._same_page(hashes[0], (phash, bytes(detail))):
+                continue
+            others = self.hashes(content_hash) if len(hashes) > 1 else [(phash, bytes(detail))]
+            if all(self._same_page(a, b) for a, b in zip(hashes[1:], others[1:])):
+                distance = sum(hamming(a[0], b[0]) for a, b in zip(hashes, others))
+                matches.append((distance, content_hash, filename))
+        return [(content_hash, filename) for _, content_hash, filename in sorted(matches)]
+
+    def update(self, paths):
+        """
+        Makes sure every file in `paths` is indexed, hashing only the ones whose
+        content isn't yet. Returns path -> content hash.
+        """
+        from src.integration.database import file_sha256
+
+        content_hashes = {path: file_sha256(path) for path in paths}
+        added = 0
+        for path, content_hash in content_hashes.items():
+            if content_hash in self:
+                continue
+            try:
+                self.add(content_hash, os.path.basename(path), file_page_hashes(path), commit=False)
+                added += 1
+            except Exception as e:
+                print(f"   ⚠️ Could not hash {os.path.basename(path)}: {e}")
+        self.conn.commit()
+        if added:
+            print(f"🔎 Dedup index: {added} new documents hashed, {len(self)} indexed")
+        return content_hashes
@@ -1,5 +1,4 @@
 import os
-import pdfplumber
 
 class MedicalDocument:
     def __init__(self, file_path):
@@ -10,6 +9,13 @@ class MedicalDocument:
         self.pdf_path = None     
         self.pages = []          
         self.extracted_data = [] 
+        self.ocr_transforms = [] # Per scanned page: ImageTransform from the OCR input back to doc.pages
+        self.skipped_pages = {}  # page index -> {"score", "reason"} for pages the relevance filter kept out of OCR/LayoutLM
+
+    @property
+    def active_pages(self):
+        """Indices of the pages that go through inference (all but the skipped ones)."""
+        return [i for i in range(len(self.extracted_data)) if i not in self.skipped_pages]
 
     def _check_if_digital(self):
         """Determines if the file has a readable text layer."""
@@ -18,6 +24,7 @@ class MedicalDocument:
             
         elif self.file_ext == '.pdf':
             # Peek inside the PDF to see if it has selectable text
+            import pdfplumber
             try:
                 with pdfplumber.open(self.original_path) as pdf:
                     if len(pdf.pages) > 0:
@@ -0,0 +1,82 @@
+import numpy as np
+from src.extraction.document import MedicalDocument
+from src.extraction.tokens import PageTokens
+from src.config import LINE_TOLERANCE, COLUMN_MIN_GAP
+
+class ReadingOrder:
+    """
+    Puts extracted tokens into reading order and tags them with geometry ids.
+    After `apply`, every page has `lines` (0 = top line) and `columns`
+    (0 = leftmost column) filled in, and its tokens are sorted line by line,
+    left to right, so lines are contiguous runs of the arrays.
+    """
+
+    @staticmethod
+    def apply(doc: MedicalDocument):
+        for page in doc.extracted_data:
+            ReadingOrder.sort_page(page)
+
+    @staticmethod
+    def sort_page(page: PageTokens):
+        """Fills page.lines / page.columns and reorders the page in place."""
+        if not len(page):
+            return page
+
+        boxes = page.bboxes.astype(np.int32)
+        page.lines = ReadingOrder.line_ids(boxes)
+        page.columns = ReadingOrder.column_ids(boxes, num_lines=int(page.lines.max()) + 1)
+
+        # Primary key line, secondary key left edge
+        page.reorder(np.lexsort((boxes[:, 0], page.lines)))
+        return page
+
+    @staticmethod
+    def line_ids(boxes, tolerance=LINE_TOLERANCE):
+        """
+        Clusters boxes into text lines by vertical center.
+        Sorted centers start a new line wherever the jump to the next center
+        exceeds `tolerance` times the median token height.
+        """
+        centers = (boxes[:, 1] + boxes[:, 3]) / 2
+        heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1)
+        threshold = tolerance * float(np.median(heights))
+
+        order = np.argsort(centers, kind="stable")
+        breaks = np.diff(centers[order]) > threshold
+        sorted_ids = np.concatenate(([0], np.cumsum(breaks)))
+
+        ids = np.empty(len(boxes), dtype=np.int32)
+        ids[order] = sorted_ids
+        return ids
+
+    @staticmethod
+    def column_ids(boxes, num_lines, min_gap=COLUMN_MIN_GAP):
+        """
+        Splits the page into columns at vertical gutters.
+        A gutter is a run of at least `min_gap` x-positions (0-1000 scale)
+        that almost no box covers, so a single wide title doesn't merge columns.
+        """
+        x0 = np.clip(boxes[:, 0], 0, 1000)
+        x1 = np.clip(boxes[:, 2], 0, 1000)
+
+        # Coverage per x-position via a difference array: +1 at x0, -1 after x1
+        diff = np.zeros(1002, dtype=np.int32)
+        np.add.at(diff, x0, 1)
+        np.add.at(diff, x1 + 1, -1)
+        coverage = np.cumsum(diff)[:1001]
+
+        max_noise = max(1, int(np.ceil(0.05 * num_lines)))
+        is_gap = coverage <= max_noise
+        # Only gutters between text count, not the page margins
+        is_gap[:int(x0.min())] = False
+        is_gap[int(x1.max()) + 1:] = False
+
+        # Start/end positions of every gap run
+        edges = np.diff(np.concatenate(([0], is_gap.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        wide = (ends - starts) >= min_gap
+        gutter_centers = (starts[wide] + ends[wide]) / 2
+
+        centers_x = (x0 + x1) / 2
+        return np.searchsorted(gutter_centers, centers_x).astype(np.int32)
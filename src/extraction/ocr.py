@@ -1,77 +1,226 @@
-import easyocr
-import pdfplumber
 import numpy as np
 from src.extraction.document import MedicalDocument
+from src.extraction.converter import DocumentConverter
+from src.extraction.layout import ReadingOrder
+from src.extraction.preprocessing import ImagePreprocessor, ImageTransform
+from src.extraction.relevance import PageRelevanceFilter
+from src.extraction.tokens import PageTokens, LABEL_IDS
+from src.config import RELEVANCE_FILTER, SUPPORTED_IMAGES, CRITICAL_LABELS, OCR_TWO_PASS, OCR_REFINE_DPI, OCR_REFINE_CONFIDENCE, CRITICAL_REFINE_CONFIDENCE
+
+CRITICAL_LABEL_IDS = [LABEL_IDS[f"{prefix}-{label}"] for label in CRITICAL_LABELS for prefix in ("B", "I")]
 
 class TextExtractor:
-    def __init__(self):
-        # Initialize EasyOCR once. 
-        print("\n⏳ Initializing EasyOCR (Russian/English)...")
-        self.ocr_engine = easyocr.Reader(['ru', 'en'], gpu=False, verbose=False)
-        # gpu=False ensures stability on Mac if MPS isn't perfectly configured.
+    def __init__(self, relevance=None):
+        # EasyOCR (and torch under it) is only loaded once a scanned page shows up,
+        # so a batch of digital PDFs never pays for it.
+        self._ocr_engine = None
+        self.relevance = relevance or (PageRelevanceFilter() if RELEVANCE_FILTER else None)
+
+    @property
+    def ocr_engine(self):
+        if self._ocr_engine is None:
+            import easyocr
+            print("\n⏳ Initializing EasyOCR (Russian/English)...")
+            self._ocr_engine = easyocr.Reader(['ru', 'en'], gpu=False, verbose=False)
+            # gpu=False ensures stability on Mac if MPS isn't perfectly configured.
+        return self._ocr_engine
         
-    def extract(self, doc: MedicalDocument):
+    def extract(self, doc: MedicalDocument, pages=None):
         """
         Main Router:
         Digital PDF -> pdfplumber (No-Loss)
         Scanned/Image -> EasyOCR (AI Extraction)
+        Then both tracks are put into reading order with line/column ids.
+
+        `pages` is an optional page stream from DocumentConverter.stream_pages;
+        scanned pages are OCR'd as they arrive instead of after the last one.
         """
+        doc.skipped_pages = {}
         if doc.is_digital:
             self._extract_digital(doc)
+            for _ in pages or (): # Rasterization ran alongside pdfplumber; let it finish
+                pass
         else:
-            self._extract_scanned(doc)
+            self._extract_scanned(doc, pages)
+
+        ReadingOrder.apply(doc)
+
+        for page_idx, skip in sorted(doc.skipped_pages.items()):
+            print(f"   ⏭️ Page {page_idx+1}: skipped ({skip['reason']})")
+
+    def _check_relevance(self, doc, page_idx, image=None, texts=None):
+        """Runs the relevance filter on one page; records and returns False for pages to skip."""
+        if self.relevance is None:
+            return True
+        relevant, score, reason = self.relevance.check(image, texts)
+        if not relevant:
+            doc.skipped_pages[page_idx] = {"score": score, "reason": reason}
+        return relevant
+
+    @staticmethod
+    def _normalize_boxes(coords, width, height):
+        """Pixel/point [x0, y0, x1, y1] rows -> int16 boxes on the 0-1000 scale."""
+        coords = np.asarray(coords, dtype=np.float32).reshape(-1, 4)
+        scale = np.array([width, height, width, height], dtype=np.float32)
+        return (coords / scale * 1000).astype(np.int16)
 
     def _extract_digital(self, doc: MedicalDocument):
+        import pdfplumber
         print(f"\n💎 Track A: Digital Extraction on {doc.filename}")
         all_pages_data = []
         with pdfplumber.open(doc.pdf_path) as pdf:
-            for page in pdf.pages:
+            for page_idx, page in enumerate(pdf.pages):
                 width, height = float(page.width), float(page.height)
                 words = page.extract_words()
-                page_tokens = []
-                for w in words:
-                    page_tokens.append({
-                        "text": w['text'],
-                        "bbox": [
-                            int((w['x0'] / width) * 1000),
-                            int((w['top'] / height) * 1000),
-                            int((w['x1'] / width) * 1000),
-                            int((w['bottom'] / height) * 1000)
-                        ]
-                    })
-                all_pages_data.append(page_tokens)
+                # Text layer is already here for free; skipped pages keep their text, they just aren't labeled
+                self._check_relevance(doc, page_idx, texts=[w['text'] for w in words])
+                coords = [[w['x0'], w['top'], w['x1'], w['bottom']] for w in words]
+                all_pages_data.append(PageTokens(
+                    [w['text'] for w in words],
+                    self._normalize_boxes(coords, width, height)
+                ))
         doc.extracted_data = all_pages_data
 
-    def _extract_scanned(self, doc: MedicalDocument):
+    def _extract_scanned(self, doc: MedicalDocument, pages=None):
         print(f"\n📸 Track B: AI OCR Extraction (EasyOCR) on {doc.filename}")
+        preprocessor = ImagePreprocessor.for_source("photo" if doc.file_ext in SUPPORTED_IMAGES else "scan")
         all_pages_data = []
-        
-        for img in doc.pages:
-            img_np = np.array(img)
+        doc.ocr_transforms = []
+
+        for page_idx, img in enumerate(doc.pages if pages is None else pages):
+            if not self._check_relevance(doc, page_idx, image=img):
+                all_pages_data.append(PageTokens([], []))
+                doc.ocr_transforms.append(ImageTransform())
+                continue
+
+            img_np, transform = preprocessor.process(img)
             
             # EasyOCR returns: [ ([[x0,y0], [x1,y0], [x1,y1], [x0,y1]], 'Text', confidence), ... ]
             results = self.ocr_engine.readtext(img_np)
-            
-            page_tokens = []
             width, height = img.size
-            
-            for bbox, text, confidence in results:
-                # Extract min/max to get [x0, y0, x1, y1]
-                x0 = min([pt[0] for pt in bbox])
-                y0 = min([pt[1] for pt in bbox])
-                x1 = max([pt[0] for pt in bbox])
-                y1 = max([pt[1] for pt in bbox])
-                
-                # Normalize to 0-1000
-                page_tokens.append({
-                    "text": text,
-                    "bbox": [
-                        int((x0 / width) * 1000),
-                        int((y0 / height) * 1000),
-                        int((x1 / width) * 1000),
-                        int((y1 / height) * 1000)
-                    ]
-                })
-            all_pages_data.append(page_tokens)
+
+            # Corner points [n, 4, 2], mapped back onto the page image, then min/max to get [x0, y0, x1, y1]
+            corners = transform.to_source(np.array([bbox for bbox, _, _ in results], dtype=np.float32).reshape(-1, 4, 2))
+            coords = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+            coords = np.clip(coords, 0, [width, height, width, height])
+
+            # Normalize to 0-1000
+            all_pages_data.append(PageTokens(
+                [text for _, text, _ in results],
+                self._normalize_boxes(coords, width, height),
+                ocr_confidences=[confidence for _, _, confidence in results]
+            ))
+            doc.ocr_transforms.append(transform)
         
-        doc.extracted_data = all_pages_data
\ No newline at end of file
+        doc.extracted_data = all_pages_data
+
+        if OCR_TWO_PASS:
+            for page_idx, page in enumerate(doc.extracted_data):
+                uncertain = np.flatnonzero(page.ocr_confidences < OCR_REFINE_CONFIDENCE)
+                if len(uncertain):
+                    self._refine(doc, page_idx, uncertain)
+
+    def _recognize_boxes(self, image, bboxes):
+        """EasyOCR recognition (no detection) on 0-1000 boxes of `image`; [(box, text, confidence)] per box."""
+        width, height = image.size
+        boxes = bboxes.astype(np.float32) / 1000 * np.array([width, height, width, height], dtype=np.float32)
+        # A little vertical/horizontal slack so glyph edges cut off at low DPI are included
+        pad = np.maximum((boxes[:, 3] - boxes[:, 1]) * 0.25, 2)
+        x0 = np.clip(boxes[:, 0] - pad, 0, width - 1).astype(int)
+        x1 = np.clip(boxes[:, 2] + pad, 1, width).astype(int)
+        y0 = np.clip(boxes[:, 1] - pad, 0, height - 1).astype(int)
+        y1 = np.clip(boxes[:, 3] + pad, 1, height).astype(int)
+        # EasyOCR's horizontal_list format: [x_min, x_max, y_min, y_max]
+        horizontal_list = np.stack([x0, x1, y0, y1], axis=1).tolist()
+        return self.ocr_engine.recognize(np.asarray(image), horizontal_list=horizontal_list, free_list=[], detail=1)
+
+    def same_content(self, file_path, pages):
+        """
+        Whether a file carries the same text as `pages` (a stored result, e.g. a
+        near-duplicate's). Digital PDFs compare their whole text layer. Scans
+        and photos re-read only the stored tokens holding digits (values,
+        dates, ids) with recognition on those boxes, so a re-test on the same
+        template with different numbers doesn't match.
+        """
+        import re
+        from PIL import Image
+
+        doc = MedicalDocument(file_path)
+        normalize = lambda text: re.sub(r"\s+", "", text).lower()
+        if doc.file_ext == ".docx":
+            return False
+        if doc.is_digital:
+            import pdfplumber
+            with pdfplumber.open(file_path) as pdf:
+                if len(pdf.pages) != len(pages):
+                    return False
+                return all(
+                    [normalize(w['text']) for w in page.extract_words()] == [normalize(t) for t in stored.texts]
+                    for page, stored in zip(pdf.pages, pages)
+                )
+
+        if doc.file_ext == ".pdf":
+            images = list(DocumentConverter.rasterize(file_path, OCR_REFINE_DPI))
+        else:
+            images = [Image.open(file_path).convert("RGB")]
+        if len(images) != len(pages):
+            return False
+
+        for img, stored in zip(images, pages):
+            rows = [i for i, text in enumerate(stored.texts) if any(c.isdigit() for c in text)]
+            if not rows:
+                continue
+            results = self._recognize_boxes(img, stored.bboxes[rows])
+            if len(results) != len(rows):
+                return False
+            if any(normalize(text) != normalize(stored.texts[i]) for i, (_, text, _) in zip(rows, results)):
+                return False
+        return True
+
+    def refine_critical(self, doc: MedicalDocument):
+        """
+        Second gate, after LayoutLM: re-OCR scanned tokens that got a patient
+        field (CRITICAL_LABELS) with low confidence. Returns the indices of
+        pages whose text changed, so only those need predicting again.
+        """
+        if doc.is_digital or not OCR_TWO_PASS:
+            return []
+
+        changed_pages = []
+        for page_idx, page in enumerate(doc.extracted_data):
+            uncertain = np.flatnonzero(
+                np.isin(page.label_ids, CRITICAL_LABEL_IDS) & (page.confidences < CRITICAL_REFINE_CONFIDENCE)
+            )
+            if len(uncertain) and self._refine(doc, page_idx, uncertain):
+                changed_pages.append(page_idx)
+        return changed_pages
+
+    def _refine(self, doc: MedicalDocument, page_idx, token_idx):
+        """
+        Re-recognizes the given tokens' regions on a high-DPI render of the page.
+        Detection is skipped (EasyOCR `recognize` on known boxes), so the cost
+        scales with the number of uncertain tokens, not with the page.
+        Returns how many tokens got a more confident reading.
+        """
+        page = doc.extracted_data[page_idx]
+        hires = DocumentConverter.render_page(doc, page_idx, OCR_REFINE_DPI)
+        ocr_width = doc.pages[page_idx].size[0]
+        if page_idx < len(doc.ocr_transforms):
+            ocr_width *= doc.ocr_transforms[page_idx].scale # The first pass may have seen a downscaled copy
+        if hires.size[0] <= ocr_width:
+            return 0 # Nothing sharper to look at
+
+        results = self._recognize_boxes(hires, page.bboxes[token_idx])
+        if len(results) != len(token_idx):
+            print(f"   ⚠️ Page {page_idx+1}: re-OCR returned {len(results)} results for {len(token_idx)} regions, skipping.")
+            return 0
+
+        improved = 0
+        for idx, (_, text, confidence) in zip(token_idx.tolist(), results):
+            if text.strip() and confidence > page.ocr_confidences[idx]:
+                page[idx]["text"] = text
+                page.ocr_confidences[idx] = confidence
+                improved += 1
+
+        print(f"   🔍 Page {page_idx+1}: re-OCR'd {len(token_idx)} regions at {OCR_REFINE_DPI} DPI, improved {improved}.")
+        return improved
@@ -0,0 +1,123 @@
+import json
+import os
+import re
+import numpy as np
+from src.config import RELEVANCE_MODEL_PATH, RELEVANCE_BLANK_INK, RELEVANCE_TARGET_RECALL, LAB_KEYWORDS
+
+_NUMERIC = re.compile(r"\d")
+
+
+class PageRelevanceFilter:
+    """
+    Decides, before OCR and LayoutLM, whether a page can hold lab results.
+    Cover letters, consent forms and blank pages get skipped.
+
+    Features come from a 128px-wide grayscale thumbnail (ink, text rows, table
+    rules) and, when the page has a text layer, from its words (numeric share,
+    lab keyword density). A logistic regression over them is trained by
+    scripts/train_relevance.py; its threshold is the highest one that keeps
+    RELEVANCE_TARGET_RECALL of the result pages. Without a trained model only
+    blank pages are skipped.
+    """
+
+    FEATURES = ("ink_ratio", "text_rows", "row_density", "rule_rows", "has_text", "numeric_share", "keyword_density")
+
+    def __init__(self, model_path=RELEVANCE_MODEL_PATH):
+        self.model = None
+        if model_path and os.path.exists(model_path):
+            with open(model_path) as f:
+                self.model = json.load(f)
+
+    # --- Features ---
+    @classmethod
+    def features(cls, image=None, texts=None):
+        """Feature vector for one page. Whatever isn't available (no image, no text layer) is NaN."""
+        values = np.full(len(cls.FEATURES), np.nan, dtype=np.float32)
+
+        if image is not None:
+            from PIL import Image
+            width = 128
+            height = max(1, round(image.size[1] * width / image.size[0]))
+            thumb = np.asarray(image.resize((width, height), Image.BOX).convert("L"))
+            ink = thumb < 160
+            row_ink = ink.mean(axis=1)
+            text_rows = row_ink > 0.02
+            values[0] = ink.mean()
+            values[1] = text_rows.mean()
+            values[2] = np.count_nonzero(text_rows[1:] & ~text_rows[:-1]) / height * 100 # Text line starts per 100 rows
+            values[3] = (row_ink > 0.6).mean() # Near-full-width rules: table borders
+
+        if texts is not None:
+            values[4] = float(len(texts) > 0)
+            if texts:
+                lowered = [t.lower() for t in texts]
+                values[5] = sum(1 for t in texts if _NUMERIC.search(t)) / len(texts)
+                values[6] = sum(1 for t in lowered if any(k in t for k in LAB_KEYWORDS)) / len(texts)
+        return values
+
+    # --- Decision ---
+    def score(self, features):
+        """Probability that the page holds results, or None without a trained model."""
+        if self.model is None:
+            return None
+        x = np.where(np.isnan(features), self.model["mean"], features)
+        z = (x - np.asarray(self.model["mean"])) / np.asarray(self.model["std"])
+        return float(1.0 / (1.0 + np.exp(-(z @ np.asarray(self.model["weights"]) + self.model["bias"]))))
+
+    def check(self, image=None, texts=None):
+        """(is_relevant, score or None, reason)."""
+        features = self.features(image, texts)
+        if not np.isnan(features[0]) and features[0] < RELEVANCE_BLANK_INK:
+            return False, 0.0, "blank"
+        if texts is not None and image is None and not texts:
+            return False, 0.0, "blank"
+
+        score = self.score(features)
+        if score is None:
+            return True, None, "no model"
+        if score < self.model["threshold"]:
+            return False, score, "not lab results"
+        return True, score, "lab results"
+
+    # --- Training ---
+    @classmethod
+    def fit(cls, features, labels, target_recall=RELEVANCE_TARGET_RECALL, epochs=500, learning_rate=0.1, l2=1e-3):
+        """
+        Logistic regression by full-batch gradient descent (a few hundred pages at most).
+        features: [n, len(FEATURES)] with NaN for missing values; labels: 1 = lab results.
+        """
+        X = np.asarray(features, dtype=np.float64)
+        y = np.asarray(labels, dtype=np.float64)
+        mean = np.nan_to_num(np.nanmean(X, axis=0))
+        X = np.where(np.isnan(X), mean, X)
+        std = X.std(axis=0)
+        std[std == 0] = 1.0
+        Z = (X - mean) / std
+
+        weights, bias = np.zeros(Z.shape[1]), 0.0
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(Z @ weights + bias)))
+            weights -= learning_rate * (Z.T @ (p - y) / len(y) + l2 * weights)
+            bias -= learning_rate * float((p - y).mean())
+
+        # Highest threshold that keeps target_recall of the positive pages
+        p = 1.0 / (1.0 + np.exp(-(Z @ weights + bias)))
+        positives = np.sort(p[y == 1])
+        threshold = float(positives[int(np.floor((1 - target_recall) * len(positives)))]) if len(positives) else 0.5
+        skipped = p < threshold
+
+        return {
+            "features": list(cls.FEATURES),
+            "mean": mean.tolist(), "std": std.tolist(),
+            "weights": weights.tolist(), "bias": bias,
+            "threshold": threshold,
+            "recall": float((~skipped[y == 1]).mean()) if (y == 1).any() else None,
+            "skip_rate_negatives": float(skipped[y == 0].mean()) if (y == 0).any() else None,
+        }
+
+    @staticmethod
+    def save(model, path=RELEVANCE_MODEL_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(model, f, indent=2)
@@ -0,0 +1,175 @@
+import sys
+import numpy as np
+from src.config import LABELS
+
+LABEL_IDS = {label: i for i, label in enumerate(LABELS)}
+NO_LABEL = -1
+
+
+class PageTokens:
+    """
+    Column-oriented tokens for one page.
+
+    texts        list[str], interned (lab vocabulary repeats across pages and documents)
+    bboxes       int16 [n, 4], 0-1000 scale
+    label_ids    int16 [n], index into config.LABELS, -1 = no label
+    confidences  float32 [n], LayoutLM confidence of the label
+    ocr_confidences float32 [n], recognizer confidence of the text (1.0 for digital text layers)
+    lines        int32 [n], reading-order line id, -1 = not computed
+    columns      int32 [n], column id, -1 = not computed
+
+    Stages work on the arrays directly. Indexing or iterating yields TokenView
+    objects that behave like the old {"text", "bbox", "label", "confidence"}
+    dicts, so existing callers keep working.
+    """
+
+    __slots__ = ("texts", "bboxes", "label_ids", "confidences", "ocr_confidences", "lines", "columns")
+
+    def __init__(self, texts, bboxes, label_ids=None, confidences=None, ocr_confidences=None, lines=None, columns=None):
+        n = len(texts)
+        self.texts = [sys.intern(t) for t in texts]
+        self.bboxes = np.asarray(bboxes, dtype=np.int16).reshape(n, 4)
+        self.label_ids = np.full(n, NO_LABEL, dtype=np.int16) if label_ids is None else np.asarray(label_ids, dtype=np.int16)
+        self.confidences = np.zeros(n, dtype=np.float32) if confidences is None else np.asarray(confidences, dtype=np.float32)
+        self.ocr_confidences = np.ones(n, dtype=np.float32) if ocr_confidences is None else np.asarray(ocr_confidences, dtype=np.float32)
+        self.lines = np.full(n, -1, dtype=np.int32) if lines is None else np.asarray(lines, dtype=np.int32)
+        self.columns = np.full(n, -1, dtype=np.int32) if columns is None else np.asarray(columns, dtype=np.int32)
+
+    # --- Conversion ---
+    @classmethod
+    def from_dicts(cls, tokens):
+        tokens = list(tokens)
+        return cls(
+            [t['text'] for t in tokens],
+            [t['bbox'] for t in tokens],
+            label_ids=[LABEL_IDS[t['label']] if 'label' in t else NO_LABEL for t in tokens],
+            confidences=[t.get('confidence', 0.0) for t in tokens],
+            ocr_confidences=[t.get('ocr_confidence', 1.0) for t in tokens],
+            lines=[t.get('line', -1) for t in tokens],
+            columns=[t.get('column', -1) for t in tokens],
+        )
+
+    @classmethod
+    def coerce(cls, tokens):
+        """Accepts a PageTokens or a legacy list of token dicts."""
+        return tokens if isinstance(tokens, cls) else cls.from_dicts(tokens)
+
+    def to_dicts(self):
+        return [view.to_dict() for view in self]
+
+    # --- Sequence protocol (dict-compatible access) ---
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        for i in range(len(self.texts)):
+            yield TokenView(self, i)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.texts)
+        if not 0 <= index < len(self.texts):
+            raise IndexError(index)
+        return TokenView(self, index)
+
+    # --- Array operations ---
+    @property
+    def has_lines(self):
+        return len(self.texts) > 0 and bool((self.lines >= 0).all())
+
+    def reorder(self, order):
+        """Permutes every column in place (e.g. into reading order)."""
+        order = np.asarray(order)
+        self.texts = [self.texts[i] for i in order.tolist()]
+        self.bboxes = self.bboxes[order]
+        self.label_ids = self.label_ids[order]
+        self.confidences = self.confidences[order]
+        self.ocr_confidences = self.ocr_confidences[order]
+        self.lines = self.lines[order]
+        self.columns = self.columns[order]
+
+    def subset(self, indices):
+        """A new PageTokens holding only the given rows (copies, not views)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return PageTokens(
+            [self.texts[i] for i in indices.tolist()], self.bboxes[indices],
+            label_ids=self.label_ids[indices], confidences=self.confidences[indices],
+            ocr_confidences=self.ocr_confidences[indices], lines=self.lines[indices], columns=self.columns[indices],
+        )
+
+    def set_labels(self, label_ids, confidences):
+        self.label_ids[:] = label_ids
+        self.confidences[:] = confidences
+
+
+class TokenView:
+    """A dict-like window onto one row of a PageTokens. Writes go straight to the arrays."""
+
+    __slots__ = ("page", "index")
+
+    KEYS = ("text", "bbox", "label", "confidence", "ocr_confidence", "line", "column")
+
+    def __init__(self, page, index):
+        self.page = page
+        self.index = index
+
+    def __getitem__(self, key):
+        page, i = self.page, self.index
+        if key == "text":
+            return page.texts[i]
+        if key == "bbox":
+            return page.bboxes[i].tolist()
+        if key in ("label", "confidence"):
+            label_id = int(page.label_ids[i])
+            if label_id == NO_LABEL:
+                raise KeyError(key)
+            return LABELS[label_id] if key == "label" else float(page.confidences[i])
+        if key == "ocr_confidence":
+            return float(page.ocr_confidences[i])
+        if key in ("line", "column"):
+            value = int((page.lines if key == "line" else page.columns)[i])
+            if value < 0:
+                raise KeyError(key)
+            return value
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        page, i = self.page, self.index
+        if key == "text":
+            page.texts[i] = sys.intern(value)
+        elif key == "bbox":
+            page.bboxes[i] = value
+        elif key == "label":
+            page.label_ids[i] = LABEL_IDS[value]
+        elif key == "confidence":
+            page.confidences[i] = value
+        elif key == "ocr_confidence":
+            page.ocr_confidences[i] = value
+        elif key == "line":
+            page.lines[i] = value
+        elif key == "column":
+            page.columns[i] = value
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [k for k in self.KEYS if k in self]
+
+    def to_dict(self):
+        return {k: self[k] for k in self.keys()}
+
+    def __repr__(self):
+        return f"TokenView({self.to_dict()})"
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from src.extraction.tokens import PageTokens
+from src.config import RESULTS_DB_PATH, MODEL_VERSION
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Content hash of a file, read in chunks so large scans don't load into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultStore:
+    """
+    Final labeled output per document, keyed by (content hash, model version).
+    A re-sent file hits the cache regardless of its name; bumping MODEL_VERSION
+    makes every old entry miss, so results are never served from a stale model.
+
+    `table` keeps other producers apart from the pipeline's results: pool
+    images labeled while ranking them for annotation (config.PREANNOTATION_TABLE)
+    skip refinement and template priors, so main.py must never serve them.
+    """
+
+    def __init__(self, path=RESULTS_DB_PATH, model_version=MODEL_VERSION, table="results"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name '{table}'")
+        self.path = path
+        self.model_version = model_version
+        self.table = table
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " content_hash TEXT NOT NULL,"
+            " model_version TEXT NOT NULL,"
+            " filename TEXT,"
+            " processed_at REAL,"
+            " data TEXT NOT NULL,"
+            " skipped TEXT,"
+            " PRIMARY KEY (content_hash, model_version))"
+        )
+        # Stores created before page skipping existed
+        columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        if "skipped" not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN skipped TEXT")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def get_skipped(self, content_hash):
+        """page index -> {"score", "reason"} for the pages the relevance filter skipped (see MedicalDocument.skipped_pages)."""
+        row = self.conn.execute(
+            f"SELECT skipped FROM {self.table} WHERE content_hash = ? AND model_version = ?",
+            (content_hash, self.model_version)
+        ).fetchone()
+        return {int(i): skip for i, skip in json.loads(row[0]).items()} if row and row[0] else {}
+
+    def get(self, content_hash):
+        """The stored pages (list of PageTokens) for this content under the current model, or None."""
+        row = self.conn.execute(
+            f"SELECT data FROM {self.table} WHERE content_hash = ? AND model_version = ?",
+            (content_hash, self.model_version)
+        ).fetchone()
+        return [PageTokens.from_dicts(page) for page in json.loads(row[0])] if row else None
+
+    def put(self, content_hash, filename, extracted_data, skipped_pages=None):
+        pages = [PageTokens.coerce(page).to_dicts() for page in extracted_data]
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (content_hash, model_version, filename, processed_at, data, skipped) VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, self.model_version, filename, time.time(), json.dumps(pages, ensure_ascii=False),
+             json.dumps(skipped_pages or {}))
+        )
+        self.conn.commit()
+
+    def purge_stale(self):
+        """Drops entries produced by other model versions. Returns how many were removed."""
+        cursor = self.conn.execute(f"DELETE FROM {self.table} WHERE model_version != ?", (self.model_version,))
+        self.conn.commit()
+        return cursor.rowcount
+
+
+class UncertaintyCache:
+    """
+    Per-image uncertainty scores under one model version, so re-ranking the
+    unannotated pool only scores images that are new since the last run.
+    Keyed like ResultStore: a new MODEL_VERSION invalidates every score.
+    """
+
+    def __init__(self, path=RESULTS_DB_PATH, model_version=MODEL_VERSION):
+        self.model_version = model_version
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS uncertainty ("
+            " content_hash TEXT NOT NULL,"
+            " model_version TEXT NOT NULL,"
+            " num_tokens INTEGER,"
+            " mean_entropy REAL,"
+            " low_confidence_critical INTEGER,"
+            " PRIMARY KEY (content_hash, model_version))"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, content_hashes):
+        """content_hash -> (num_tokens, mean_entropy, low_confidence_critical) for the hashes already scored."""
+        scores = {}
+        hashes = list(content_hashes)
+        for start in range(0, len(hashes), 500): # Stay under SQLite's bound-parameter limit
+            part = hashes[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT content_hash, num_tokens, mean_entropy, low_confidence_critical FROM uncertainty"
+                f" WHERE model_version = ? AND content_hash IN ({','.join('?' * len(part))})",
+                (self.model_version, *part)
+            )
+            scores.update({row[0]: row[1:] for row in rows})
+        return scores
+
+    def put_many(self, scores):
+        """scores: content_hash -> (num_tokens, mean_entropy, low_confidence_critical)."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO uncertainty VALUES (?, ?, ?, ?, ?)",
+            [(h, self.model_version, *values) for h, values in scores.items()]
+        )
+        self.conn.commit()
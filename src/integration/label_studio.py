@@ -0,0 +1,291 @@
+import json
+import os
+import sqlite3
+import unicodedata
+import urllib.parse
+import uuid
+from pathlib import Path
+
+import ijson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.config import LABEL_STUDIO_URL, PROJECT_ID, SESSION_ID, TASKS_INDEX_PATH, LABEL_STUDIO_PAGE_SIZE
+from src.postprocessing.merger import merge_boxes_bio
+
+PREDICTION_SCORE_THRESHOLD = 0.40
+
+
+def task_image_name(task):
+    """Decoded, NFC-normalized basename of a task's image (e.g. '8d9bc659-Махмудова.png')."""
+    raw_path = task.get('data', {}).get('image') or task.get('image')
+    if not raw_path:
+        return None
+    decoded_path = urllib.parse.unquote(raw_path)
+    return unicodedata.normalize('NFC', Path(decoded_path).name)
+
+
+def build_prediction_results(tokens, predictions, width, height, score_threshold=PREDICTION_SCORE_THRESHOLD):
+    """
+    Turns per-token predictions (from LayoutLMPredictor.predict_pages) into
+    Label Studio `rectanglelabels` results, merging BIO runs into solid boxes.
+    """
+    final_pixel_boxes = []
+    final_labels = []
+    final_probs = []
+
+    for token, prediction in zip(tokens, predictions):
+        if prediction is None: continue
+
+        label, conf = prediction
+        # Convert 0-1000 scale back to actual pixel scale
+        b = token['bbox']
+        final_pixel_boxes.append([
+            b[0] * width / 1000,
+            b[1] * height / 1000,
+            b[2] * width / 1000,
+            b[3] * height / 1000
+        ])
+        final_labels.append(label)
+        final_probs.append(conf)
+
+    results = []
+    for box, label, score in merge_boxes_bio(final_pixel_boxes, final_labels, final_probs):
+        if score < score_threshold or label == "O": continue
+
+        x1, y1, x2, y2 = box
+        results.append({
+            "id": str(uuid.uuid4())[:8],
+            "from_name": "label",
+            "to_name": "image",
+            "type": "rectanglelabels",
+            "value": {
+                "x": (x1 / width) * 100,
+                "y": (y1 / height) * 100,
+                "width": ((x2 - x1) / width) * 100,
+                "height": ((y2 - y1) / height) * 100,
+                "rotation": 0,
+                "rectanglelabels": [label]
+            },
+            "score": float(score)
+        })
+    return results
+
+
+class TaskIndex:
+    """
+    Local SQLite index of Label Studio tasks.
+    Scripts query it by id or filename instead of loading the whole export.
+    """
+
+    def __init__(self, path=TASKS_INDEX_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id INTEGER PRIMARY KEY,"
+            " image_name TEXT,"
+            " updated_at TEXT,"
+            " data TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_image_name ON tasks(image_name)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    # --- Writes ---
+    def upsert(self, task):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tasks (id, image_name, updated_at, data) VALUES (?, ?, ?, ?)",
+            (task['id'], task_image_name(task), task.get('updated_at'), json.dumps(task, default=str))
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def retain(self, task_ids):
+        """Drops every task not in `task_ids` (deleted in Label Studio). Returns how many were dropped."""
+        stale = self.ids() - set(task_ids)
+        self.conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in stale])
+        return len(stale)
+
+    # --- Reads ---
+    def get(self, task_id):
+        row = self.conn.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_filename(self, filename):
+        """
+        Tasks whose uploaded image ends with `filename`.
+        Label Studio prefixes uploads with a hash ("8d9bc659-page1.png"), so we match on the suffix.
+        """
+        name = unicodedata.normalize('NFC', filename)
+        pattern = '%' + name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        rows = self.conn.execute(
+            "SELECT data FROM tasks WHERE image_name LIKE ? ESCAPE '\\'", (pattern,)
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def iter_tasks(self):
+        for (data,) in self.conn.execute("SELECT data FROM tasks ORDER BY id"):
+            yield json.loads(data)
+
+    def ids(self):
+        return {r[0] for r in self.conn.execute("SELECT id FROM tasks")}
+
+    def image_names(self):
+        return {r[0] for r in self.conn.execute("SELECT image_name FROM tasks WHERE image_name IS NOT NULL")}
+
+
+class LabelStudioClient:
+    """
+    Paginated, incremental task sync against the Label Studio API.
+    Only tasks updated since the last sync are fetched; each page is parsed
+    straight off the socket and written to the TaskIndex as it arrives.
+    Tasks deleted in Label Studio are dropped from the index once the
+    project holds fewer tasks than it does.
+    """
+
+    def __init__(self, base_url=LABEL_STUDIO_URL, project_id=PROJECT_ID, session_id=SESSION_ID,
+                 page_size=LABEL_STUDIO_PAGE_SIZE, session=None, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.project_id = project_id
+        self.page_size = page_size
+        self.timeout = timeout
+        self.session = session or self._build_session()
+        if session_id:
+            self.session.cookies.set("sessionid", session_id)
+
+    @staticmethod
+    def _build_session():
+        session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def download(self, url, dest_path):
+        """Downloads a task file (e.g. '/data/upload/1/x.png') through the authenticated session."""
+        if url.startswith('/'):
+            url = f"{self.base_url}{url}"
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(dest_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+        return dest_path
+
+    def _query(self, updated_since):
+        query = {"ordering": ["tasks:updated_at"]}
+        if updated_since:
+            query["filters"] = {
+                "conjunction": "and",
+                "items": [{
+                    "filter": "filter:tasks:updated_at",
+                    # Inclusive: tasks sharing the last sync's timestamp may not all have been in it; upserts make re-reads harmless
+                    "operator": "greater_or_equal",
+                    "type": "Datetime",
+                    "value": updated_since,
+                }]
+            }
+        return json.dumps(query)
+
+    @staticmethod
+    def _check(response):
+        if response.status_code == 403:
+            raise PermissionError("403 Forbidden: Your cookie might be expired. Refresh the page and copy 'sessionid' again.")
+        if response.status_code == 401:
+            raise PermissionError("401 Unauthorized: The cookie is invalid.")
+        response.raise_for_status()
+
+    def task_count(self):
+        """Number of tasks currently in the project."""
+        response = self.session.get(f"{self.base_url}/api/projects/{self.project_id}/", timeout=self.timeout)
+        self._check(response)
+        return response.json()["task_number"]
+
+    def iter_tasks(self, updated_since=None, fields="all"):
+        """Yields tasks page by page, oldest update first. fields="task_only" leaves out annotations and predictions."""
+        url = f"{self.base_url}/api/tasks/"
+        page = 1
+        while True:
+            params = {
+                "project": self.project_id,
+                "page": page,
+                "page_size": self.page_size,
+                "fields": fields,
+                "query": self._query(updated_since),
+            }
+            with self.session.get(url, params=params, stream=True, timeout=self.timeout) as response:
+                # Label Studio answers 404 once we page past the last task
+                if response.status_code == 404:
+                    return
+                self._check(response)
+
+                response.raw.decode_content = True
+                count = 0
+                for task in ijson.items(response.raw, "tasks.item", use_float=True):
+                    count += 1
+                    yield task
+
+            if count < self.page_size:
+                return
+            page += 1
+
+    def sync(self, index: TaskIndex, full=False):
+        """
+        Pulls new/updated tasks into the index and drops the ones deleted in
+        Label Studio. Returns the number of tasks written.
+        """
+        updated_since = None if full else index.get_meta("last_updated_at")
+        latest = updated_since
+        written = 0
+        seen = set()
+
+        for task in self.iter_tasks(updated_since):
+            index.upsert(task)
+            seen.add(task['id'])
+            written += 1
+            updated_at = task.get('updated_at')
+            if updated_at and (latest is None or updated_at > latest):
+                latest = updated_at
+            if written % self.page_size == 0:
+                index.commit()
+
+        if latest:
+            index.set_meta("last_updated_at", latest)
+
+        # Deletions don't show up as updates. After a full sync every live task was seen;
+        # otherwise the index only holds stale tasks if it has more than the project
+        if updated_since is None:
+            dropped = index.retain(seen)
+        elif len(index) > self.task_count():
+            dropped = index.retain(task['id'] for task in self.iter_tasks(fields="task_only"))
+        else:
+            dropped = 0
+        if dropped:
+            print(f"🗑️ Dropped {dropped} tasks deleted in Label Studio from the index.")
+        index.commit()
+        return written
@@ -0,0 +1,148 @@
+import json
+import os
+from src.extraction.document import MedicalDocument
+from src.extraction.converter import DocumentConverter
+from src.integration.label_studio import build_prediction_results
+from src.utils.workers import ForkedWorkerPool
+from src.config import MODEL_VERSION, PIPELINE_WORKERS, PREANNOTATION_BATCH_PAGES
+
+
+def completed_images(jsonl_path):
+    """
+    Image names already written to a pre-annotation JSONL file. A line cut off
+    by a crash is truncated away, so appending starts on a clean line.
+    """
+    done = set()
+    if not os.path.exists(jsonl_path):
+        return done
+
+    good_end = 0
+    with open(jsonl_path, "rb") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["data"]["image"])
+            except (ValueError, KeyError):
+                break
+            good_end += len(line)
+    if good_end < os.path.getsize(jsonl_path):
+        print(f"⚠️ Dropping a partial last line from {jsonl_path}")
+        with open(jsonl_path, "r+b") as f:
+            f.truncate(good_end)
+    return done
+
+
+def jsonl_to_json(jsonl_path, json_path):
+    """Streams a JSONL task file into the JSON array Label Studio imports, one task at a time."""
+    with open(jsonl_path, encoding="utf-8") as src, open(json_path, "w", encoding="utf-8") as dst:
+        dst.write("[\n")
+        first = True
+        for line in src:
+            if not line.strip():
+                continue
+            dst.write(("" if first else ",\n") + line.rstrip("\n"))
+            first = False
+        dst.write("\n]\n")
+
+
+class PreAnnotator:
+    """
+    Bulk pre-labeling for Label Studio.
+
+    OCR runs in forked workers (models shared copy-on-write, see
+    ForkedWorkerPool) while the parent labels finished pages with LayoutLM,
+    PREANNOTATION_BATCH_PAGES at a time. Every labeled image is appended to a
+    JSONL file as one task and flushed, so a crashed run resumes where it
+    stopped instead of starting over.
+    """
+
+    def __init__(self, predictor, extractor, output_path, workers=PIPELINE_WORKERS,
+                 batch_pages=PREANNOTATION_BATCH_PAGES, model_version=MODEL_VERSION):
+        self.predictor = predictor
+        self.extractor = extractor
+        self.output_path = output_path
+        self.workers = workers
+        self.batch_pages = batch_pages
+        self.model_version = model_version
+
+    def _extract(self, path):
+        """Worker side: OCR/text layer of the first page, as (width, height, PageTokens) or None."""
+        doc = MedicalDocument(path)
+        self.extractor.extract(doc, DocumentConverter.stream_pages(doc))
+        if not doc.extracted_data or not len(doc.extracted_data[0]):
+            return None
+        width, height = doc.pages[0].size
+        return width, height, doc.extracted_data[0]
+
+    def run(self, paths):
+        """Pre-annotates every path not already in the output file. Returns (written, failed)."""
+        done = completed_images(self.output_path)
+        todo = [p for p in paths if os.path.basename(p) not in done]
+        print(f"📝 {len(done)} already pre-annotated, {len(todo)} to go ({self.workers} OCR workers)")
+        if not todo:
+            return 0, 0
+
+        if os.path.dirname(self.output_path):
+            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+
+        if self.workers > 0:
+            # Both models are loaded here, before forking, so workers share their weights
+            self.extractor.ocr_engine
+            self.predictor.model
+            results = ForkedWorkerPool(self._extract, num_workers=self.workers).iter_results(todo)
+        else:
+            results = self._extract_inline(todo)
+
+        written, failed, pending = 0, 0, []
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            for path, extracted, error in results:
+                if error:
+                    failed += 1
+                    print(f"❌ {os.path.basename(path)}: {error.strip().splitlines()[-1]}")
+                    continue
+                if extracted is None:
+                    # Still written: the task gets imported for manual labeling and isn't OCR'd again on resume
+                    written += self._write(out, path, [], 0.0)
+                    continue
+
+                pending.append((path, *extracted))
+                if len(pending) >= self.batch_pages:
+                    written += self._flush(out, pending)
+                    pending = []
+            if pending:
+                written += self._flush(out, pending)
+
+        print(f"✅ {written} tasks written to {self.output_path}, {failed} failed")
+        return written, failed
+
+    def _extract_inline(self, paths):
+        import traceback
+        for path in paths:
+            try:
+                yield path, self._extract(path), None
+            except Exception:
+                yield path, None, traceback.format_exc()
+
+    def _flush(self, out, pending):
+        from PIL import Image
+
+        images = [Image.open(path).convert("RGB") for path, _, _, _ in pending]
+        predictions = self.predictor.predict_pages(images, [tokens for _, _, _, tokens in pending])
+
+        written = 0
+        for (path, width, height, tokens), page_predictions in zip(pending, predictions):
+            results = build_prediction_results(tokens, page_predictions, width, height)
+            score = sum(r["score"] for r in results) / len(results) if results else 0.0
+            written += self._write(out, path, results, score, flush=False)
+        out.flush()
+        os.fsync(out.fileno())
+        return written
+
+    def _write(self, out, path, results, score, flush=True):
+        task = {
+            "data": {"image": os.path.basename(path)},
+            "predictions": [{"model_version": self.model_version, "result": results, "score": score}],
+        }
+        out.write(json.dumps(task, ensure_ascii=False) + "\n")
+        if flush:
+            out.flush()
+        return 1
@@ -0,0 +1,196 @@
+import base64
+import io
+import json
+import os
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from main import serve_file
+from src.extraction.document import MedicalDocument
+from src.extraction.converter import DocumentConverter
+from src.extraction.ocr import TextExtractor
+from src.extraction.dedup import DuplicateIndex
+from src.model.inference import LayoutLMPredictor
+from src.model.batcher import MicroBatcher
+from src.model.templates import TemplateRegistry
+from src.utils.profiling import PipelineProfiler
+from src.integration.database import ResultStore
+from src.integration.label_studio import LabelStudioClient, build_prediction_results
+from src.config import MODEL_VERSION, SERVER_HOST, SERVER_PORT, SUPPORTED_IMAGES, RASTER_DPI, DEDUP
+
+def task_filename(task):
+    """
+    Local name for a task's file. Label Studio local-files URLs
+    (/data/local-files/?d=dir/scan.png) carry the path in `d`, not the URL path.
+    """
+    url = urllib.parse.urlparse(task['data']['image'])
+    path = urllib.parse.parse_qs(url.query).get("d", [url.path])[0]
+    name = os.path.basename(urllib.parse.unquote(path))
+    if name:
+        return name
+    return f"task_{task.get('id', 'upload')}{os.path.splitext(path)[1] or '.png'}"
+
+def page_sizes(path):
+    """Pixel size of each page as the pipeline renders it, for results served from the cache."""
+    doc = MedicalDocument(path)
+    if doc.file_ext in SUPPORTED_IMAGES:
+        with Image.open(path) as img:
+            return [img.size]
+    import pdfplumber
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = DocumentConverter.docx_to_pdf(path, tmp_dir) if doc.file_ext == ".docx" else path
+        scale = RASTER_DPI["digital" if doc.is_digital else "scanned"] / 72
+        with pdfplumber.open(pdf_path) as pdf:
+            return [(round(page.width * scale), round(page.height * scale)) for page in pdf.pages]
+
+class InferenceService:
+    """
+    Holds the models for the lifetime of the process.
+    Documents go through the same pipeline as main.py (result cache, dedup,
+    template priors, refinement) one at a time on a dedicated thread, which
+    also owns the SQLite stores. LayoutLM calls from that thread and from
+    /predict/tokens requests are micro-batched together.
+    """
+
+    def __init__(self, predictor=None, extractor=None, client=None):
+        self.predictor = predictor or LayoutLMPredictor()
+        self.extractor = extractor or TextExtractor()
+        self.client = client or LabelStudioClient()
+        self.batcher = MicroBatcher(self.predictor)
+        # SQLite connections stay on the thread that opened them
+        self._pipeline = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline", initializer=self._open_stores)
+
+    def _open_stores(self):
+        self.profiler = PipelineProfiler()
+        self.store = ResultStore()
+        self.templates = TemplateRegistry()
+        self.dedup = DuplicateIndex() if DEDUP else None
+
+    def predict_tokens(self, image, tokens):
+        """Labels pre-extracted tokens ({"text", "bbox"} on the 0-1000 scale) for one page image."""
+        return self.batcher.predict_pages([image], [tokens])[0]
+
+    def predict_file(self, path):
+        """
+        Pipeline results for a PDF, .docx or image on disk, as main.py's
+        serve_file returns them: (extracted_data, skipped_pages, doc or None).
+        """
+        return self._pipeline.submit(self._serve, path).result()
+
+    def _serve(self, path):
+        # Runs on the pipeline thread: the stores only exist once its initializer ran there
+        return serve_file(path, self.extractor, self.batcher, self.profiler, self.store, self.templates, self.dedup)
+
+    def predict_bytes(self, data, filename):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, os.path.basename(filename))
+            with open(path, "wb") as f:
+                f.write(data)
+            return self.predict_file(path)
+
+    def predict_tasks(self, tasks):
+        """
+        Label Studio ML backend `/predict`: one prediction per task. Results of
+        multi-page documents carry the page as `item_index`.
+        """
+        predictions = []
+        for task in tasks:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = self.client.download(task['data']['image'], os.path.join(tmp_dir, task_filename(task)))
+                extracted_data, skipped_pages, doc = self.predict_file(path)
+                sizes = [page.size for page in doc.pages] if doc is not None else page_sizes(path)
+
+            results = []
+            for page_idx, (tokens, (width, height)) in enumerate(zip(extracted_data, sizes)):
+                if page_idx in skipped_pages:
+                    continue
+                page_predictions = [(t["label"], t["confidence"]) if "label" in t else None for t in tokens]
+                page_results = build_prediction_results(tokens, page_predictions, width, height)
+                if len(extracted_data) > 1:
+                    for r in page_results:
+                        r["item_index"] = page_idx
+                results.extend(page_results)
+
+            score = sum(r["score"] for r in results) / len(results) if results else 0.0
+            predictions.append({"result": results, "score": score, "model_version": MODEL_VERSION})
+        return predictions
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+      GET  /health           -> liveness (Label Studio ML backend protocol)
+      POST /setup            -> model version (Label Studio ML backend protocol)
+      POST /predict          -> {"tasks": [...]} -> {"results": [...]} for Label Studio
+      POST /predict/tokens   -> {"image": <base64>, "tokens": [...]} -> per-token labels
+      POST /predict/document?filename=x.pdf  (raw file body) -> labeled pages
+    """
+
+    service: InferenceService = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json({"status": "UP", "model_class": "LayoutLMPredictor", "model_version": MODEL_VERSION})
+        else:
+            self._send_json({"error": f"Unknown route {self.path}"}, status=404)
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        try:
+            if url.path == "/setup":
+                self._read_body()
+                self._send_json({"model_version": MODEL_VERSION})
+
+            elif url.path == "/predict":
+                payload = json.loads(self._read_body())
+                self._send_json({"results": self.service.predict_tasks(payload.get("tasks", []))})
+
+            elif url.path == "/predict/tokens":
+                payload = json.loads(self._read_body())
+                image = Image.open(io.BytesIO(base64.b64decode(payload["image"]))).convert("RGB")
+                predictions = self.service.predict_tokens(image, payload["tokens"])
+                self._send_json({"predictions": [list(p) if p else None for p in predictions]})
+
+            elif url.path == "/predict/document":
+                query = urllib.parse.parse_qs(url.query)
+                filename = query.get("filename", ["upload.pdf"])[0]
+                extracted_data, skipped_pages, _ = self.service.predict_bytes(self._read_body(), filename)
+                self._send_json({
+                    "filename": os.path.basename(filename),
+                    "pages": [page.to_dicts() for page in extracted_data],
+                    "skipped_pages": [{"page": i, **skip} for i, skip in sorted(skipped_pages.items())],
+                })
+
+            else:
+                self._send_json({"error": f"Unknown route {url.path}"}, status=404)
+
+        except (KeyError, ValueError) as e:
+            self._send_json({"error": f"Bad request: {e}"}, status=400)
+        except Exception as e:
+            self._send_json({"error": str(e)}, status=500)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, service=None):
+    InferenceRequestHandler.service = service or InferenceService()
+    server = ThreadingHTTPServer((host, port), InferenceRequestHandler)
+    print(f"🚀 Inference server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down.")
+    finally:
+        server.server_close()
@@ -0,0 +1,91 @@
+import numpy as np
+from src.extraction.document import MedicalDocument
+from src.extraction.converter import DocumentConverter
+from src.extraction.ocr import TextExtractor, CRITICAL_LABEL_IDS
+from src.model.inference import LayoutLMPredictor
+from src.integration.database import file_sha256, ResultStore, UncertaintyCache
+from src.config import ACTIVE_LEARNING_STRATEGY, ACTIVE_LEARNING_BATCH_PAGES, CRITICAL_REFINE_CONFIDENCE, PREANNOTATION_TABLE
+
+
+class UncertaintySampler:
+    """
+    Picks the unannotated images the current model is least sure about.
+
+    Every image is scored once per MODEL_VERSION: OCR, then LayoutLM over
+    ACTIVE_LEARNING_BATCH_PAGES pages at a time. Two numbers are kept per image
+    (mean token entropy, count of patient-field tokens below
+    CRITICAL_REFINE_CONFIDENCE), so switching strategy only re-sorts the cache.
+    The labeled pages go into the pre-annotation table of the ResultStore
+    (never the pipeline's results), so pre-annotating the chosen batch
+    doesn't run the model again.
+    """
+
+    STRATEGIES = ("entropy", "critical")
+
+    def __init__(self, predictor=None, extractor=None, cache=None, store=None, batch_pages=ACTIVE_LEARNING_BATCH_PAGES):
+        self.predictor = predictor or LayoutLMPredictor()
+        self.extractor = extractor or TextExtractor()
+        self.cache = cache or UncertaintyCache()
+        self.store = store or ResultStore(table=PREANNOTATION_TABLE)
+        self.batch_pages = batch_pages
+
+    def select(self, paths, k, strategy=ACTIVE_LEARNING_STRATEGY):
+        """The k most informative of `paths`, most informative first."""
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}', expected one of {self.STRATEGIES}")
+        scores = self.score(paths)
+
+        def key(path):
+            _, mean_entropy, low_critical = scores[path]
+            return (mean_entropy, low_critical) if strategy == "entropy" else (low_critical, mean_entropy)
+
+        return sorted(paths, key=key, reverse=True)[:k]
+
+    def score(self, paths):
+        """path -> (num_tokens, mean_entropy, low_confidence_critical), from the cache where possible."""
+        hashes = {path: file_sha256(path) for path in paths}
+        cached = self.cache.get_many(set(hashes.values()))
+        todo = [path for path in paths if hashes[path] not in cached]
+        print(f"🎯 Uncertainty: {len(paths) - len(todo)} cached, {len(todo)} to score")
+
+        pending = [] # (path, doc) waiting for the next batched pass
+        for path in todo:
+            doc = MedicalDocument(path)
+            try:
+                self.extractor.extract(doc, DocumentConverter.stream_pages(doc))
+            except Exception as e:
+                print(f"   ⚠️ Could not read {doc.filename}: {e}")
+                cached[hashes[path]] = (0, 0.0, 0)
+                continue
+            pending.append((path, doc))
+            if sum(len(d.pages) for _, d in pending) >= self.batch_pages:
+                cached.update(self._score_batch(pending, hashes))
+                pending = []
+        if pending:
+            cached.update(self._score_batch(pending, hashes))
+
+        return {path: tuple(cached[hashes[path]]) for path in paths}
+
+    def _score_batch(self, pending, hashes):
+        images = [img for _, doc in pending for img in doc.pages]
+        pages = [page for _, doc in pending for page in doc.extracted_data]
+        outputs = self.predictor.predict_arrays(images, pages, return_entropy=True)
+
+        scores, start = {}, 0
+        for path, doc in pending:
+            doc_outputs = outputs[start:start + len(doc.extracted_data)]
+            start += len(doc.extracted_data)
+
+            num_tokens = sum(len(label_ids) for label_ids, _, _ in doc_outputs)
+            entropy_sum = sum(float(entropies.sum()) for _, _, entropies in doc_outputs)
+            low_critical = sum(
+                int((np.isin(label_ids, CRITICAL_LABEL_IDS) & (confidences < CRITICAL_REFINE_CONFIDENCE)).sum())
+                for label_ids, confidences, _ in doc_outputs
+            )
+            scores[hashes[path]] = (num_tokens, entropy_sum / num_tokens if num_tokens else 0.0, low_critical)
+
+            LayoutLMPredictor.apply(doc, [(label_ids, confidences) for label_ids, confidences, _ in doc_outputs])
+            self.store.put(hashes[path], doc.filename, doc.extracted_data)
+
+        self.cache.put_many(scores)
+        return scores
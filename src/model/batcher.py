@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from src.model.inference import LayoutLMPredictor
+from src.config import SERVER_BATCH_WINDOW_MS, SERVER_MAX_BATCH_PAGES
+
+class _Request:
+    def __init__(self, images, pages_tokens, entities_only):
+        self.images = images
+        self.pages_tokens = pages_tokens
+        self.entities_only = entities_only
+        self.future = Future()
+
+class MicroBatcher:
+    """
+    Collects concurrent predict requests for a short window and runs them
+    through LayoutLMPredictor.predict_arrays as one batch (one per
+    entities_only setting), so request threads never run the model side by side.
+    """
+
+    # Same document-level entry point as the predictor, its model calls going through the batch
+    predict = LayoutLMPredictor.predict
+    apply = staticmethod(LayoutLMPredictor.apply)
+
+    def __init__(self, predictor, window_ms=SERVER_BATCH_WINDOW_MS, max_batch_pages=SERVER_MAX_BATCH_PAGES):
+        self.predictor = predictor
+        self.window = window_ms / 1000.0
+        self.max_batch_pages = max_batch_pages
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    @property
+    def last_num_chunks(self):
+        return self.predictor.last_num_chunks
+
+    def submit(self, images, pages_tokens, entities_only=False) -> Future:
+        """Queues pages for prediction. The future resolves to predict_arrays' output for them."""
+        request = _Request(images, pages_tokens, entities_only)
+        self._queue.put(request)
+        return request.future
+
+    def predict_arrays(self, images, pages_tokens, entities_only=False):
+        """Blocking drop-in for LayoutLMPredictor.predict_arrays."""
+        return self.submit(images, pages_tokens, entities_only).result()
+
+    def predict_pages(self, images, pages_tokens):
+        """Blocking drop-in for LayoutLMPredictor.predict_pages."""
+        return self.predictor.as_tuples(self.predict_arrays(images, pages_tokens))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        num_pages = len(batch[0].images)
+        deadline = time.monotonic() + self.window
+
+        while num_pages < self.max_batch_pages:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            num_pages += len(request.images)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            for entities_only in {r.entities_only for r in batch}:
+                self._predict([r for r in batch if r.entities_only == entities_only], entities_only)
+
+    def _predict(self, batch, entities_only):
+        images = [img for r in batch for img in r.images]
+        pages_tokens = [tokens for r in batch for tokens in r.pages_tokens]
+
+        try:
+            predictions = self.predictor.predict_arrays(images, pages_tokens, entities_only=entities_only)
+        except Exception as e:
+            for r in batch:
+                r.future.set_exception(e)
+            return
+
+        # Hand each caller back exactly the pages it sent
+        start = 0
+        for r in batch:
+            end = start + len(r.images)
+            r.future.set_result(predictions[start:end])
+            start = end
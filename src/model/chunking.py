@@ -0,0 +1,93 @@
+import numpy as np
+from src.extraction.layout import ReadingOrder
+from src.extraction.tokens import PageTokens
+from src.config import CHUNK_MAX_TOKENS, CHUNK_STRIDE_TOKENS
+
+class LineChunker:
+    """
+    Splits a page's words into model-sized windows along reading-order lines.
+
+    Instead of cutting the subword sequence every 512 tokens with a fixed
+    128-token stride, whole lines are packed into each window until the
+    budget is full. Words are never split across windows, and the overlap
+    is just the trailing lines that fit in `stride_tokens` (0 disables it).
+    """
+
+    def __init__(self, tokenizer, max_tokens=CHUNK_MAX_TOKENS, stride_tokens=CHUNK_STRIDE_TOKENS):
+        self.tokenizer = tokenizer
+        # [CLS] and [SEP] take two slots of the window
+        self.budget = max_tokens - 2
+        self.stride_tokens = stride_tokens
+
+    def token_counts(self, page: PageTokens):
+        """Number of subword tokens every word turns into, from one fast-tokenizer call."""
+        encoding = self.tokenizer(page.texts, boxes=page.bboxes.tolist(), add_special_tokens=False, truncation=False)
+        word_ids = np.array([-1 if w is None else w for w in encoding.word_ids()], dtype=np.int64)
+        counts = np.bincount(word_ids[word_ids >= 0], minlength=len(page))
+        # Empty strings still occupy a position the model has to see
+        return np.maximum(counts, 1).tolist()
+
+    @staticmethod
+    def group_lines(page: PageTokens):
+        """
+        Word indices grouped into lines (top to bottom), each line sorted left to right.
+        Reuses the line ids set by ReadingOrder, computing them only if missing.
+        """
+        boxes = page.bboxes.astype(np.int32)
+        line_ids = page.lines if page.has_lines else ReadingOrder.line_ids(boxes)
+
+        order = np.lexsort((boxes[:, 0], line_ids))
+        breaks = np.flatnonzero(np.diff(line_ids[order])) + 1
+        return [line.tolist() for line in np.split(order, breaks)]
+
+    def chunk(self, page: PageTokens, lines=None, counts=None):
+        """
+        Returns a list of windows, each a list of word indices in reading order.
+        `counts` (subwords per word) skips the tokenizer call when the caller already has them.
+        """
+        if not len(page):
+            return []
+
+        counts = counts if counts is not None else self.token_counts(page)
+        lines = lines if lines is not None else self.group_lines(page)
+
+        # A single line longer than the whole budget gets split at word boundaries
+        pieces = []
+        for line in lines:
+            piece, size = [], 0
+            for idx in line:
+                if piece and size + counts[idx] > self.budget:
+                    pieces.append((piece, size))
+                    piece, size = [], 0
+                piece.append(idx)
+                size += counts[idx]
+            if piece:
+                pieces.append((piece, size))
+
+        windows = []
+        current, current_size = [], 0
+        for piece, size in pieces:
+            if current and current_size + size > self.budget:
+                windows.append([idx for p, _ in current for idx in p])
+                current = self._overlap(current)
+                current_size = sum(s for _, s in current)
+                # Never let the carried-over context crowd out the new line
+                while current and current_size + size > self.budget:
+                    current_size -= current.pop(0)[1]
+            current.append((piece, size))
+            current_size += size
+
+        if current:
+            windows.append([idx for p, _ in current for idx in p])
+        return windows
+
+    def _overlap(self, window_pieces):
+        """The trailing whole lines of a window that fit into the stride budget."""
+        carried, size = [], 0
+        for piece, piece_size in reversed(window_pieces):
+            if size + piece_size > self.stride_tokens:
+                break
+            carried.insert(0, (piece, piece_size))
+            size += piece_size
+        # Carrying the whole window over would never make progress
+        return carried if len(carried) < len(window_pieces) else carried[1:]
@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.config import CHUNK_MAX_TOKENS, SUBWORD_CACHE_SIZE, IMAGE_PREP_WORKERS
+
+
+class EncodedPage:
+    """A page's words as subwords: flat ids, how many each word has, and where each word's run starts."""
+    __slots__ = ("ids", "counts", "offsets")
+
+    def __init__(self, ids, counts, offsets):
+        self.ids = ids
+        self.counts = counts
+        self.offsets = offsets
+
+
+class PageEncoder:
+    """
+    LayoutLMv3 inputs for pages whose words and boxes we already have, without
+    LayoutLMv3Processor. The processor handles one page at a time and aligns
+    boxes to subwords in Python; here:
+
+    - In split-into-words mode every word is tokenized on its own (with its
+      prefix space), so its subwords don't depend on context. They are cached
+      per word, and every word missing from the cache, across all pages of a
+      call, goes through a single fast-tokenizer call.
+    - Chunks are assembled from those cached runs with numpy indexing, which
+      also gives each subword its word's box.
+    - Images are resized on a small thread pool (PIL releases the GIL), then
+      rescaled and normalized as one numpy batch.
+
+    Produces the same ids, boxes and pixel values as the processor.
+    """
+
+    def __init__(self, tokenizer, image_processor, max_tokens=CHUNK_MAX_TOKENS,
+                 cache_size=SUBWORD_CACHE_SIZE, image_workers=IMAGE_PREP_WORKERS):
+        from tokenizers import Tokenizer
+
+        # Private copy: the shared backend keeps whatever padding/truncation the last processor call set
+        self._backend = Tokenizer.from_str(tokenizer.backend_tokenizer.to_str())
+        self._backend.no_padding()
+        self._backend.no_truncation()
+        self.cls_id, self.sep_id, self.pad_id = tokenizer.cls_token_id, tokenizer.sep_token_id, tokenizer.pad_token_id
+        self.budget = max_tokens - 2 # [CLS] and [SEP]
+        self.cache_size = cache_size
+        self._subwords = {} # word -> int32 subword ids, oldest first
+        self.cache_hits = self.cache_misses = 0
+
+        size = image_processor.size
+        self.image_size = (size["width"], size["height"])
+        self.resample = image_processor.resample
+        self.scale = np.float32(image_processor.rescale_factor if image_processor.do_rescale else 1.0)
+        normalize = image_processor.do_normalize
+        self.mean = np.asarray(image_processor.image_mean if normalize else 0.0, dtype=np.float32)
+        self.std = np.asarray(image_processor.image_std if normalize else 1.0, dtype=np.float32)
+        self.image_workers = image_workers
+        self._pool, self._pool_pid = None, None
+
+    # --- Text ---
+    def encode_pages(self, pages):
+        """One EncodedPage per PageTokens; all uncached words of all pages are tokenized in one call."""
+        vocab = {}
+        for page in pages:
+            for word in page.texts:
+                if word not in vocab:
+                    vocab[word] = self._subwords.get(word)
+        missing = [word for word, ids in vocab.items() if ids is None]
+        self.cache_hits += len(vocab) - len(missing)
+        self.cache_misses += len(missing)
+        if missing:
+            encodings = self._backend.encode_batch([[word] for word in missing], is_pretokenized=True, add_special_tokens=False)
+            for word, encoding in zip(missing, encodings):
+                vocab[word] = np.asarray(encoding.ids, dtype=np.int32)
+            self._remember(missing, vocab)
+
+        encoded = []
+        for page in pages:
+            pieces = [vocab[word] for word in page.texts]
+            counts = np.fromiter((len(p) for p in pieces), dtype=np.int64, count=len(pieces))
+            ids = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int32)
+            offsets = np.cumsum(counts) - counts
+            encoded.append(EncodedPage(ids, counts, offsets))
+        return encoded
+
+    def _remember(self, words, vocab):
+        overflow = len(self._subwords) + len(words) - self.cache_size
+        if overflow > 0:
+            # Oldest first (dicts keep insertion order); recurring lab vocabulary is re-added on its next page
+            for word in list(self._subwords)[:overflow]:
+                del self._subwords[word]
+        for word in words[-self.cache_size:]:
+            self._subwords[word] = vocab[word]
+
+    def batch(self, items):
+        """
+        items: [(EncodedPage, page bboxes, window of word indices)]. Returns
+        numpy input_ids, attention_mask and bbox padded to the longest row,
+        plus word_index: the page word behind every position (-1 for
+        [CLS], [SEP] and padding).
+        """
+        rows = []
+        for encoded, _, window in items:
+            counts = encoded.counts[window]
+            total = int(counts.sum())
+            # Subword positions of the window's words, in window order
+            positions = np.repeat(encoded.offsets[window] - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            words = np.repeat(window, counts)
+            rows.append((encoded.ids[positions[:self.budget]], words[:self.budget]))
+
+        n, length = len(rows), max(len(ids) for ids, _ in rows) + 2
+        input_ids = np.full((n, length), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((n, length), dtype=np.int64)
+        bbox = np.zeros((n, length, 4), dtype=np.int64)
+        word_index = np.full((n, length), -1, dtype=np.int64)
+        for r, ((ids, words), (_, bboxes, _)) in enumerate(zip(rows, items)):
+            k = len(ids)
+            input_ids[r, 0], input_ids[r, 1:k + 1], input_ids[r, k + 1] = self.cls_id, ids, self.sep_id
+            attention_mask[r, :k + 2] = 1
+            bbox[r, 1:k + 1] = bboxes[words] # [CLS]/[SEP] boxes stay [0, 0, 0, 0]
+            word_index[r, 1:k + 1] = words
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "bbox": bbox, "word_index": word_index}
+
+    # --- Images ---
+    def pixel_values(self, images):
+        """[N, 3, H, W] float32, resized like the image processor and normalized in one batch."""
+        pool = self._image_pool() if len(images) > 1 else None
+        resized = list(pool.map(self._resize, images)) if pool else [self._resize(img) for img in images]
+        batch = (np.stack(resized).astype(np.float32) * self.scale - self.mean) / self.std
+        return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+
+    def _resize(self, image):
+        return np.asarray(image.convert("RGB").resize(self.image_size, self.resample))
+
+    def _image_pool(self):
+        if self.image_workers <= 1:
+            return None
+        # Threads don't survive fork: a forked worker starts its own pool
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.image_workers, thread_name_prefix="image-prep")
+            self._pool_pid = os.getpid()
+        return self._pool
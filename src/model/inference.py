@@ -1,106 +1,317 @@
-import torch
-from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Processor
+import os
+import threading
+import numpy as np
 from src.extraction.document import MedicalDocument
-from src.config import CUSTOM_MODEL_PATH, BASE_MODEL_PATH
+from src.extraction.tokens import PageTokens, LABEL_IDS, NO_LABEL
+from src.model.chunking import LineChunker
+from src.model.encoding import PageEncoder
+from src.utils.hardware import cpu_supports_bf16, pin_cores, configure_torch_threads, torch_threads_configured
+from src.config import (
+    LABELS, INFERENCE_MODEL_PATH, BASE_MODEL_PATH, INFERENCE_BATCH_SIZE, INFERENCE_DEVICE,
+    CHUNK_MAX_TOKENS, CHUNK_STRIDE_TOKENS, CPU_RUNTIME, COMPILE_BUCKETS
+)
+
+O_LABEL_ID = LABEL_IDS["O"]
 
 class LayoutLMPredictor:
-    def __init__(self):
-        print(f"🧠 Loading LayoutLMv3 Model from {CUSTOM_MODEL_PATH}...")
-        
-        self.model = LayoutLMv3ForTokenClassification.from_pretrained(CUSTOM_MODEL_PATH)
-        self.processor = LayoutLMv3Processor.from_pretrained(BASE_MODEL_PATH, apply_ocr=False)
-        self.id2label = self.model.config.id2label
-        
-        self.device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
-        self.model.to(self.device)
-        self.model.eval()
-
-    def predict(self, doc: MedicalDocument):
+    """
+    The one inference engine for LayoutLMv3.
+    main.py and every prediction script go through `predict_pages`, so model
+    placement, chunking and merging behave the same everywhere.
+
+    torch/transformers are imported and the weights loaded on first use (or in
+    the background via `preload()`), so constructing a predictor is instant.
+
+    On the CPU, `runtime` (see config.CPU_RUNTIME) sets core pinning, thread
+    counts, bf16 autocast and torch.compile. A compiled model only ever sees
+    batches padded to batch_size x one of COMPILE_BUCKETS, each traced once
+    while loading.
+    """
+
+    def __init__(self, model_path=INFERENCE_MODEL_PATH, batch_size=INFERENCE_BATCH_SIZE, chunk_stride=CHUNK_STRIDE_TOKENS,
+                 device=INFERENCE_DEVICE, runtime=CPU_RUNTIME):
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.chunk_stride = chunk_stride
+        self.device_name = device
+        self.runtime = dict(runtime)
+        self.last_num_chunks = 0 # Chunks in the most recent predict_pages call, for profiling
+
+        # Pinned here, before any torch threads exist, so every pool started later inherits it
+        if self.runtime.get("pin_cores") is not None and device != "mps":
+            pin_cores(self.runtime["pin_cores"])
+
+        self._model = None
+        self._processor = None
+        self._load_lock = threading.Lock()
+        self._preload_thread = None
+        self._forward = None # The model, or its torch.compile wrapper
+
+    def preload(self):
+        """Starts loading the model on a background thread, overlapping with conversion/OCR."""
+        if self._model is None and self._preload_thread is None:
+            self._preload_thread = threading.Thread(target=self._load, name="model-preload", daemon=True)
+            self._preload_thread.start()
+        return self
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._load()
+        return self._model
+
+    @property
+    def processor(self):
+        if self._processor is None:
+            self._load()
+        return self._processor
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is not None:
+                return
+
+            import torch
+            from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Processor
+
+            print(f"🧠 Loading LayoutLMv3 Model from {self.model_path}...")
+            if not os.path.exists(os.path.join(self.model_path, "model.safetensors")):
+                print("   ⚠️ No model.safetensors found; loading the pickle checkpoint is slower and cannot be memory-mapped.")
+
+            # safetensors checkpoints are memory-mapped, so weights are paged in lazily instead of copied
+            model = LayoutLMv3ForTokenClassification.from_pretrained(self.model_path)
+            # Tokens always come from our own extractors, never from the processor's OCR
+            self._processor = LayoutLMv3Processor.from_pretrained(BASE_MODEL_PATH, apply_ocr=False)
+            self.chunker = LineChunker(self._processor.tokenizer, CHUNK_MAX_TOKENS, self.chunk_stride)
+            # Inference builds model inputs itself; the processor only supplies the tokenizer and image settings
+            self.encoder = PageEncoder(self._processor.tokenizer, self._processor.image_processor, CHUNK_MAX_TOKENS)
+            self.id2label = model.config.id2label
+            # Model label ids -> config.LABELS ids, the space PageTokens stores labels in
+            self._label_map = np.array([LABEL_IDS[self.id2label[i]] for i in range(len(self.id2label))], dtype=np.int16)
+
+            if self.device_name == "auto":
+                self.device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+            else:
+                self.device = torch.device(self.device_name)
+            model.to(self.device)
+            model.eval()
+
+            on_cpu = self.device.type == "cpu"
+            self.bf16 = on_cpu and bool(self.runtime.get("bf16")) and cpu_supports_bf16()
+            self.compiled = on_cpu and bool(self.runtime.get("compile"))
+            self._configure_threads()
+            self._forward = model
+            if self.compiled:
+                self._forward = torch.compile(model, dynamic=False)
+                self._warmup()
+            self._model = model
+
+    def _configure_threads(self):
+        """
+        Applies the runtime's thread counts once per process, whichever thread
+        loads the model. A forked worker that already set its own share keeps it.
+        """
+        if self.device.type != "cpu" or torch_threads_configured():
+            return
+        intra, inter = configure_torch_threads(self.runtime.get("intra_op_threads"), self.runtime.get("inter_op_threads"))
+        print(f"   ⚙️ CPU runtime: {intra} intra-op / {inter} inter-op threads"
+              f"{', bf16' if self.bf16 else ''}{', compiled' if self.compiled else ''}")
+
+    def _inference_context(self):
+        import torch
+        from contextlib import ExitStack
+
+        stack = ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.bf16:
+            stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+        return stack
+
+    def _warmup(self):
+        """Traces the compiled model once per bucket so no request pays for compilation."""
+        import time
+        import torch
+
+        for length in COMPILE_BUCKETS:
+            start = time.perf_counter()
+            inputs = {
+                "input_ids": torch.full((self.batch_size, length), self._processor.tokenizer.pad_token_id, dtype=torch.long),
+                "attention_mask": torch.ones((self.batch_size, length), dtype=torch.long),
+                "bbox": torch.zeros((self.batch_size, length, 4), dtype=torch.long),
+                "pixel_values": torch.zeros((self.batch_size, 3, 224, 224)),
+            }
+            with self._inference_context():
+                self._forward(**inputs)
+            print(f"   🔥 Compiled for {self.batch_size}x{length} tokens in {time.perf_counter() - start:.1f}s")
+
+    def _pad_for_compile(self, inputs):
+        """Pads a batch to batch_size rows and the next COMPILE_BUCKETS length; the extra rows and positions are ignored."""
+        import torch.nn.functional as F
+
+        rows, length = inputs["input_ids"].shape
+        bucket = next((b for b in COMPILE_BUCKETS if b >= length), length)
+        extra_len, extra_rows = bucket - length, self.batch_size - rows
+        if not extra_len and not extra_rows:
+            return inputs
+
+        padded = {}
+        for key, value in inputs.items():
+            if key == "pixel_values":
+                pad = (0, 0, 0, 0, 0, 0, 0, extra_rows)
+            elif value.dim() == 3: # bbox
+                pad = (0, 0, 0, extra_len, 0, extra_rows)
+            else:
+                pad = (0, extra_len, 0, extra_rows)
+            fill = self._processor.tokenizer.pad_token_id if key == "input_ids" else 0
+            padded[key] = F.pad(value, pad, value=fill)
+        return padded
+
+    def predict(self, doc: MedicalDocument, page_indices=None, token_indices=None):
+        """
+        Labels every page the relevance filter kept, or only `page_indices` (e.g. after re-OCR).
+        `token_indices` (page index -> rows) restricts pages to some of their
+        tokens, e.g. what TemplateRegistry priors didn't cover; the other rows keep their labels.
+        """
         print(f"🔮 Predicting labels for: {doc.filename}")
+        page_indices = doc.active_pages if page_indices is None else list(page_indices)
+        token_indices = token_indices or {}
+        pages = [doc.extracted_data[i].subset(token_indices[i]) if i in token_indices else doc.extracted_data[i] for i in page_indices]
+        # As the pipeline always has: "O" doesn't compete, any entity reading of a word wins over it
+        page_arrays = self.predict_arrays([doc.pages[i] for i in page_indices], pages, entities_only=True)
+
+        for slot, i in enumerate(page_indices):
+            if i in token_indices:
+                page = doc.extracted_data[i]
+                label_ids, confidences = page.label_ids.copy(), page.confidences.copy()
+                label_ids[token_indices[i]], confidences[token_indices[i]] = page_arrays[slot]
+                page_arrays[slot] = (label_ids, confidences)
+        self.apply(doc, page_arrays, page_indices)
+
+    @staticmethod
+    def apply(doc: MedicalDocument, page_arrays, page_indices=None):
+        """Writes predict_arrays output straight into the document's token arrays."""
+        page_indices = range(len(doc.extracted_data)) if page_indices is None else page_indices
+        for i, (label_ids, confidences) in zip(page_indices, page_arrays):
+            page = doc.extracted_data[i]
+            # We don't care about background
+            keep = (label_ids != NO_LABEL) & (label_ids != O_LABEL_ID)
+            page.set_labels(np.where(keep, label_ids, NO_LABEL), np.where(keep, confidences, 0.0))
+
+            if len(page):
+                print(f"   📄 Page {i+1}: Classified {int(keep.sum())} entities.")
+
+    @staticmethod
+    def as_tuples(page_arrays):
+        """predict_arrays output -> per token (label, confidence), or None where nothing was predicted."""
+        return [
+            [(LABELS[l], c) if l != NO_LABEL else None for l, c in zip(label_ids.tolist(), confidences.tolist())]
+            for label_ids, confidences in page_arrays
+        ]
+
+    def predict_pages(self, images, pages_tokens):
+        """
+        Batched inference over many pages.
+        Returns, for every page, a list aligned with its tokens holding
+        (label, confidence) — "O" included — or None for empty pages.
+        """
+        return self.as_tuples(self.predict_arrays(images, pages_tokens))
+
+    def predict_arrays(self, images, pages_tokens, return_entropy=False, entities_only=False):
+        """
+        Same as predict_pages, but returns per page a (label_ids int16, confidences
+        float32) pair of arrays aligned with its tokens. Label ids index
+        config.LABELS; -1 marks tokens without a prediction.
+        With return_entropy, each page gets a third array: the entropy (nats) of
+        the label distribution behind each kept prediction, for uncertainty sampling.
+        With entities_only, "O" predictions are left out of the merge, so a word
+        gets the most confident non-O label any of its subwords or chunks had
+        (or none); otherwise "O" competes like every other label.
+        """
+        import torch
+
+        self.model
+        self._configure_threads()
+        pages = [PageTokens.coerce(tokens) for tokens in pages_tokens]
+        best_labels = [np.full(len(page), NO_LABEL, dtype=np.int16) for page in pages]
+        best_confidences = [np.full(len(page), -1.0, dtype=np.float32) for page in pages]
+        best_entropies = [np.zeros(len(page), dtype=np.float32) for page in pages]
+        todo = [i for i, page in enumerate(pages) if len(page)]
+        self.last_num_chunks = 0
+        if not todo:
+            return list(zip(best_labels, best_confidences, best_entropies) if return_entropy else zip(best_labels, best_confidences))
+
+        # 1. Resize/normalize each page image once; chunks index into this by page
+        pixel_values = torch.from_numpy(self.encoder.pixel_values([images[i] for i in todo]))
+
+        # 2. Subwords of every page in one tokenizer call, then line-aligned windows of whole words (see LineChunker)
+        encoded = self.encoder.encode_pages([pages[i] for i in todo])
+        chunks = [] # (page_slot, int array of word indices into that page)
+        for page_slot, page_idx in enumerate(todo):
+            counts = np.maximum(encoded[page_slot].counts, 1).tolist() # Empty words still take a position
+            for window in self.chunker.chunk(pages[page_idx], counts=counts):
+                chunks.append((page_slot, np.asarray(window, dtype=np.int64)))
+        self.last_num_chunks = len(chunks)
+
+        # 3. Forward pass in mini-batches of chunks, across page boundaries
+        for start in range(0, len(chunks), self.batch_size):
+            batch_chunks = chunks[start:start + self.batch_size]
+            # Padded to the longest chunk in this batch, not always to 512
+            batch = self.encoder.batch([(encoded[page_slot], pages[todo[page_slot]].bboxes, window) for page_slot, window in batch_chunks])
+            word_index = batch.pop("word_index")
+
+            inputs = {k: torch.from_numpy(v).to(self.device) for k, v in batch.items()}
+            inputs['pixel_values'] = pixel_values[[page_slot for page_slot, _ in batch_chunks]].to(self.device)
+            if self.compiled:
+                inputs = self._pad_for_compile(inputs)
+
+            with self._inference_context():
+                logits = self._forward(**inputs).logits # Shape: [chunks, seq_len, num_labels]
+                # Compiled batches come back padded to batch_size x bucket; only the real rows and positions line up with word_index
+                logits = logits[:len(batch_chunks), :word_index.shape[1]]
+
+                distribution = torch.softmax(logits.float(), dim=-1)
+                probs, preds = distribution.max(-1)
+                chunk_preds = self._label_map[preds.cpu().numpy()]
+                chunk_probs = probs.cpu().numpy()
+                chunk_entropies = None
+                if return_entropy:
+                    chunk_entropies = -(distribution * torch.log(distribution.clamp_min(1e-12))).sum(-1).cpu().numpy()
+
+            # 4. Merge overlapping chunks using "Max Confidence"
+            for b, (page_slot, _) in enumerate(batch_chunks):
+                page_idx = todo[page_slot]
+                seq = self._merge_positions(word_index[b], chunk_preds[b], entities_only)
+                self._merge_max_confidence(
+                    best_labels[page_idx], best_confidences[page_idx],
+                    word_index[b, seq], chunk_preds[b, seq], chunk_probs[b, seq],
+                    best_entropies[page_idx] if return_entropy else None,
+                    chunk_entropies[b, seq] if return_entropy else None
+                )
+
+        if return_entropy:
+            return [
+                (labels, np.maximum(confidences, 0.0), entropies)
+                for labels, confidences, entropies in zip(best_labels, best_confidences, best_entropies)
+            ]
+        return [(labels, np.maximum(confidences, 0.0)) for labels, confidences in zip(best_labels, best_confidences)]
+
+    @staticmethod
+    def _merge_positions(word_index, preds, entities_only=False):
+        """Positions of a chunk row that take part in the merge: those with a word, minus "O" with entities_only."""
+        # Special tokens ([CLS], [SEP]) and padding have no word
+        keep = word_index >= 0
+        if entities_only:
+            keep &= preds != O_LABEL_ID
+        return np.flatnonzero(keep)
 
-        for i, (image, tokens) in enumerate(zip(doc.pages, doc.extracted_data)):
-            if not tokens:
-                continue
-
-            words = [t['text'] for t in tokens]
-            boxes = [t['bbox'] for t in tokens]
-
-            # 1. Enable Sliding Window (Chunking)
-            encoding = self.processor(
-                image, 
-                words, 
-                boxes=boxes, 
-                return_tensors="pt", 
-                truncation=True, 
-                padding="max_length",
-                max_length=512,
-                return_overflowing_tokens=True, # Create chunks
-                stride=128                      # Overlap by 128 tokens
-            )
-
-            # 2. Fix Pixel Values for Batched Chunks
-            num_chunks = encoding['input_ids'].shape[0]
-            pixel_values = encoding['pixel_values']
-            chunk_word_ids = [encoding.word_ids(batch_index=i) for i in range(num_chunks)]
-            
-            # Catch the Hugging Face quirk: convert list to PyTorch Tensor
-            if isinstance(pixel_values, list):
-                if len(pixel_values) > 0 and isinstance(pixel_values[0], torch.Tensor):
-                    pixel_values = torch.stack(pixel_values)
-                else:
-                    pixel_values = torch.tensor(pixel_values)
-
-            # Ensure it has a batch dimension (Shape must be: [batch, channels, height, width])
-            if pixel_values.dim() == 3:
-                pixel_values = pixel_values.unsqueeze(0)
-            
-            # If we only have 1 image but 3 text chunks, duplicate the image 3 times
-            if pixel_values.shape[0] == 1 and num_chunks > 1:
-                pixel_values = pixel_values.repeat(num_chunks, 1, 1, 1)
-
-            encoding['pixel_values'] = pixel_values
-
-            # Remove keys that the model doesn't expect in its forward pass
-            encoding.pop("overflow_to_sample_mapping", None)
-
-            # Move inputs to device
-            encoding = {k: v.to(self.device) for k, v in encoding.items()}
-
-            # 3. Forward Pass (Batch process all chunks at once)
-            with torch.no_grad():
-                outputs = self.model(**encoding)
-
-            logits = outputs.logits # Shape: [num_chunks, 512, num_labels]
-            chunk_preds = logits.argmax(-1)
-            chunk_probs = torch.softmax(logits, dim=-1).max(-1).values
-
-            # 4. Merge Chunks using "Max Confidence"
-            best_predictions = {} # Dictionary to store: word_idx -> (label, confidence)
-
-            for chunk_idx in range(num_chunks):
-                word_ids = chunk_word_ids[chunk_idx]
-                
-                for seq_idx, word_idx in enumerate(word_ids):
-                    if word_idx is None:
-                        continue # Skip special tokens like [CLS] and [SEP]
-
-                    label_id = chunk_preds[chunk_idx][seq_idx].item()
-                    label_name = self.id2label[label_id]
-                    confidence = chunk_probs[chunk_idx][seq_idx].item()
-
-                    if label_name == "O":
-                        continue # We don't care about background
-
-                    # If we've seen this word in a previous chunk, only overwrite if confidence is higher
-                    if word_idx in best_predictions:
-                        if confidence > best_predictions[word_idx][1]:
-                            best_predictions[word_idx] = (label_name, confidence)
-                    else:
-                        best_predictions[word_idx] = (label_name, confidence)
-
-            # 5. Apply the winning predictions back to our document object
-            for word_idx, (label, conf) in best_predictions.items():
-                tokens[word_idx]["label"] = label
-                tokens[word_idx]["confidence"] = conf
-            
-            print(f"   📄 Page {i+1}: Classified {len(best_predictions)} entities across {num_chunks} chunks.")
\ No newline at end of file
+    @staticmethod
+    def _merge_max_confidence(best_labels, best_confidences, word_idx, labels, confidences, best_entropies=None, entropies=None):
+        """Keeps, per word, the prediction with the highest confidence over all its subwords and chunks."""
+        # Ascending order means that, for a word repeated in this update, the highest confidence is written last
+        order = np.argsort(confidences, kind="stable")
+        word_idx, labels, confidences = word_idx[order], labels[order], confidences[order]
+        better = confidences > best_confidences[word_idx]
+        best_labels[word_idx[better]] = labels[better]
+        best_confidences[word_idx[better]] = confidences[better]
+        if best_entropies is not None:
+            best_entropies[word_idx[better]] = entropies[order][better]
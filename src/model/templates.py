@@ -0,0 +1,309 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+import numpy as np
+from src.extraction.document import MedicalDocument
+from src.extraction.tokens import LABEL_IDS, NO_LABEL
+from src.config import (
+    TEMPLATES_DB_PATH, TEMPLATE_MATCH_THRESHOLD, TEMPLATE_MIN_SUPPORT,
+    TEMPLATE_POSITION_TOLERANCE, TEMPLATE_PRIOR_AGREEMENT,
+    TEMPLATE_SINGLETON_TTL_DAYS, TEMPLATE_LOOKUP_ANCHORS, TEMPLATE_MAX_CANDIDATES,
+)
+
+O_LABEL_ID = LABEL_IDS["O"]
+STABLE_SHARE = 0.8 # An anchor is part of the template's fixed text if it shows up on this share of its pages
+EXPIRE_EVERY_S = 3600 # How often a long-running registry drops stale one-page templates
+_WORD = re.compile(r"[^\w]+")
+
+
+def page_anchors(page):
+    """
+    Anchor words of a page: text without digits that occurs exactly once on it
+    (titles, column headers, field captions). Values, dates and repeated
+    units fall out. Returns normalized text -> (row, x center, y center).
+    """
+    centers = (page.bboxes[:, :2].astype(np.float32) + page.bboxes[:, 2:]) / 2
+    seen, anchors = set(), {}
+    for row, text in enumerate(page.texts):
+        key = _WORD.sub("", text.lower())
+        if len(key) < 2 or any(c.isdigit() for c in key):
+            continue
+        if key in seen:
+            anchors.pop(key, None) # Not unique on this page
+            continue
+        seen.add(key)
+        anchors[key] = (row, float(centers[row, 0]), float(centers[row, 1]))
+    return anchors
+
+
+class _Template:
+    __slots__ = ("id", "name", "pages_seen", "anchors")
+
+    def __init__(self, template_id, name=None, pages_seen=0):
+        self.id = template_id
+        self.name = name
+        self.pages_seen = pages_seen
+        self.anchors = {} # text -> [seen, x, y, {label_id: votes}]
+
+    def stable(self):
+        if self.pages_seen <= 1:
+            return self.anchors
+        return {k: a for k, a in self.anchors.items() if a[0] / self.pages_seen >= STABLE_SHARE}
+
+
+class TemplateRegistry:
+    """
+    Known provider layouts, learned from the pipeline's own output.
+
+    A page is fingerprinted by its anchor words and their positions. If most of
+    a known template's fixed anchors are present, and they sit where the
+    template has them after one global shift, the page matches. Anchors whose
+    label has been the same on (almost) every page of the template are then
+    labeled from that prior; LayoutLM only sees the rest of the page (the
+    result rows and patient values).
+
+    Templates and their anchors live in SQLite so every worker shares them.
+    Every unmatched page starts a template; the ones no other page joined
+    within TEMPLATE_SINGLETON_TTL_DAYS are dropped, and lookups only compare
+    the few templates sharing the most of a page's rarest anchors, so matching
+    doesn't slow down as the inbox history grows.
+    """
+
+    def __init__(self, path=TEMPLATES_DB_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            " id INTEGER PRIMARY KEY,"
+            " name TEXT,"
+            " pages_seen INTEGER NOT NULL,"
+            " created_at REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS anchors ("
+            " template_id INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " seen INTEGER NOT NULL,"
+            " x REAL, y REAL,"
+            " votes TEXT NOT NULL,"
+            " PRIMARY KEY (template_id, text))"
+        )
+        self.conn.commit()
+        self._expired_at = 0.0
+        self._expire()
+        self._load()
+
+    def _expire(self):
+        """Deletes one-page templates older than the TTL (pages that never recurred)."""
+        cutoff = time.time() - TEMPLATE_SINGLETON_TTL_DAYS * 86400
+        stale = [row[0] for row in self.conn.execute(
+            "SELECT id FROM templates WHERE pages_seen <= 1 AND created_at < ?", (cutoff,)
+        )]
+        for start in range(0, len(stale), 500):
+            part = stale[start:start + 500]
+            marks = ",".join("?" * len(part))
+            self.conn.execute(f"DELETE FROM anchors WHERE template_id IN ({marks})", part)
+            self.conn.execute(f"DELETE FROM templates WHERE id IN ({marks})", part)
+        self.conn.commit()
+        self._expired_at = time.time()
+        if stale:
+            print(f"   🧹 Dropped {len(stale)} one-page templates older than {TEMPLATE_SINGLETON_TTL_DAYS} days.")
+        return stale
+
+    def _forget(self, template_ids):
+        for template_id in template_ids:
+            template = self.templates.pop(template_id, None)
+            if template is None:
+                continue
+            for text in template.anchors:
+                ids = self._index.get(text)
+                if ids is not None:
+                    ids.discard(template_id)
+                    if not ids:
+                        del self._index[text]
+
+    def _load(self):
+        self.templates = {}
+        self._index = {} # anchor text -> template ids
+        for template_id, name, pages_seen in self.conn.execute("SELECT id, name, pages_seen FROM templates"):
+            self.templates[template_id] = _Template(template_id, name, pages_seen)
+        for template_id, text, seen, x, y, votes in self.conn.execute("SELECT template_id, text, seen, x, y, votes FROM anchors"):
+            votes = {int(k): v for k, v in json.loads(votes).items()}
+            self.templates[template_id].anchors[text] = [seen, x, y, votes]
+            self._index.setdefault(text, set()).add(template_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def name(self, template_id, name):
+        """Attach a provider name to a template (e.g. after checking a few of its pages)."""
+        self.templates[template_id].name = name
+        self.conn.execute("UPDATE templates SET name = ? WHERE id = ?", (name, template_id))
+        self.conn.commit()
+
+    # --- Matching ---
+    def match(self, anchors):
+        """Best (template, (dx, dy) shift, score) for a page's anchors, or None."""
+        # Common words ("result", "units") point at every template; the rarest ones pick out the few that matter
+        indexed = sorted((self._index[text] for text in anchors if text in self._index), key=len)
+        hits = Counter()
+        for ids in indexed[:TEMPLATE_LOOKUP_ANCHORS]:
+            hits.update(ids)
+        candidates = [template_id for template_id, _ in hits.most_common(TEMPLATE_MAX_CANDIDATES)]
+
+        best = None
+        for template_id in candidates:
+            template = self.templates.get(template_id)
+            if template is None:
+                continue
+            stable = template.stable()
+            common = [t for t in stable if t in anchors]
+            if not stable or len(common) / len(stable) < TEMPLATE_MATCH_THRESHOLD:
+                continue
+
+            # One global shift (scanner offset) must explain the positions of the shared anchors
+            deltas = np.array([[anchors[t][1] - stable[t][1], anchors[t][2] - stable[t][2]] for t in common])
+            shift = np.median(deltas, axis=0)
+            inliers = (np.abs(deltas - shift) <= TEMPLATE_POSITION_TOLERANCE).all(axis=1)
+            score = inliers.sum() / len(stable)
+            if inliers.mean() >= STABLE_SHARE and score >= TEMPLATE_MATCH_THRESHOLD and (best is None or score > best[2]):
+                best = (template, (float(shift[0]), float(shift[1])), float(score))
+        return best
+
+    # --- Priors ---
+    def apply_priors(self, doc: MedicalDocument):
+        """
+        Labels the fixed regions of matched pages from their template.
+        Returns a plan: page index -> (template id or None, rows LayoutLM still
+        has to label). Pass it to LayoutLMPredictor.predict as token_indices
+        (via `token_indices(plan)`) and to `learn` afterwards.
+        """
+        plan = {}
+        for page_idx in doc.active_pages:
+            page = doc.extracted_data[page_idx]
+            anchors = page_anchors(page)
+            found = self.match(anchors) if anchors else None
+            if found is None:
+                plan[page_idx] = (None, None)
+                continue
+
+            template, (dx, dy), _ = found
+            fixed = []
+            if template.pages_seen >= TEMPLATE_MIN_SUPPORT:
+                for text, (row, x, y) in anchors.items():
+                    anchor = template.anchors.get(text)
+                    if anchor is None or anchor[0] < TEMPLATE_MIN_SUPPORT or not anchor[3]:
+                        continue
+                    if abs(x - dx - anchor[1]) > TEMPLATE_POSITION_TOLERANCE or abs(y - dy - anchor[2]) > TEMPLATE_POSITION_TOLERANCE:
+                        continue
+                    label_id, votes = max(anchor[3].items(), key=lambda kv: kv[1])
+                    agreement = votes / sum(anchor[3].values())
+                    if agreement >= TEMPLATE_PRIOR_AGREEMENT:
+                        fixed.append((row, label_id, agreement))
+
+            if not fixed:
+                plan[page_idx] = (template.id, None)
+                continue
+
+            rows = np.array([r for r, _, _ in fixed], dtype=np.int64)
+            labels = np.array([l for _, l, _ in fixed], dtype=np.int16)
+            agreement = np.array([a for _, _, a in fixed], dtype=np.float32)
+            is_o = labels == O_LABEL_ID
+            page.label_ids[rows] = np.where(is_o, NO_LABEL, labels)
+            page.confidences[rows] = np.where(is_o, 0.0, agreement)
+
+            remaining = np.setdiff1d(np.arange(len(page)), rows)
+            plan[page_idx] = (template.id, remaining)
+            print(f"   🧩 Page {page_idx+1}: template #{template.id}{' (' + template.name + ')' if template.name else ''}, "
+                  f"{len(rows)} tokens from priors, {len(remaining)} left for LayoutLM.")
+        return plan
+
+    @staticmethod
+    def token_indices(plan):
+        return {page_idx: rows for page_idx, (_, rows) in plan.items() if rows is not None}
+
+    # --- Learning ---
+    def learn(self, doc: MedicalDocument, plan):
+        """
+        Folds the final labels of each planned page into its template (a new
+        one if nothing matched). Every anchor counts as seen, but only rows
+        LayoutLM labeled vote: a label that came from the prior would only
+        confirm itself.
+        """
+        if time.time() - self._expired_at > EXPIRE_EVERY_S:
+            self._forget(self._expire())
+
+        for page_idx, (template_id, rows) in plan.items():
+            page = doc.extracted_data[page_idx]
+            anchors = page_anchors(page)
+            if not anchors:
+                continue
+            voters = np.ones(len(page), dtype=bool) if rows is None else np.isin(np.arange(len(page)), rows)
+
+            # Other workers learn into the same templates: re-read this one under the write lock
+            self.conn.commit()
+            self.conn.execute("BEGIN IMMEDIATE")
+            if template_id is not None and not self._reload(template_id):
+                self._forget([template_id]) # Expired by another worker meanwhile
+                template_id = None
+            if template_id is None:
+                cursor = self.conn.execute("INSERT INTO templates (name, pages_seen, created_at) VALUES (NULL, 0, ?)", (time.time(),))
+                template_id = cursor.lastrowid
+                self.templates[template_id] = _Template(template_id)
+            template = self.templates[template_id]
+            template.pages_seen += 1
+
+            labels = np.where(page.label_ids == NO_LABEL, O_LABEL_ID, page.label_ids)
+            for text, (row, x, y) in anchors.items():
+                label_id = int(labels[row])
+                anchor = template.anchors.get(text)
+                if anchor is None:
+                    anchor = template.anchors[text] = [0, x, y, {}]
+                    self._index.setdefault(text, set()).add(template_id)
+                anchor[0] += 1
+                anchor[1] += (x - anchor[1]) / anchor[0] # Running mean position
+                anchor[2] += (y - anchor[2]) / anchor[0]
+                if voters[row]:
+                    anchor[3][label_id] = anchor[3].get(label_id, 0) + 1
+
+            self._prune(template)
+            self._save(template)
+            self.conn.commit()
+
+    def _reload(self, template_id):
+        """Re-reads one template from SQLite; False if it no longer exists."""
+        row = self.conn.execute("SELECT name, pages_seen FROM templates WHERE id = ?", (template_id,)).fetchone()
+        if row is None:
+            return False
+        template = _Template(template_id, *row)
+        for text, seen, x, y, votes in self.conn.execute("SELECT text, seen, x, y, votes FROM anchors WHERE template_id = ?", (template_id,)):
+            template.anchors[text] = [seen, x, y, {int(k): v for k, v in json.loads(votes).items()}]
+            self._index.setdefault(text, set()).add(template_id)
+        self.templates[template_id] = template
+        return True
+
+    def _prune(self, template):
+        """Forgets words that turned out to be variable (patient names, comments) once there's enough evidence."""
+        if template.pages_seen < 2 * TEMPLATE_MIN_SUPPORT:
+            return
+        for text in [t for t, a in template.anchors.items() if a[0] / template.pages_seen < 0.5]:
+            del template.anchors[text]
+            self._index.get(text, set()).discard(template.id)
+
+    def _save(self, template):
+        self.conn.execute("UPDATE templates SET pages_seen = ? WHERE id = ?", (template.pages_seen, template.id))
+        self.conn.execute("DELETE FROM anchors WHERE template_id = ?", (template.id,))
+        self.conn.executemany(
+            "INSERT INTO anchors (template_id, text, seen, x, y, votes) VALUES (?, ?, ?, ?, ?, ?)",
+            [(template.id, text, a[0], a[1], a[2], json.dumps(a[3])) for text, a in template.anchors.items()]
+        )
@@ -1,19 +1,19 @@
 import os
 import random
-import torch
-from PIL import Image, ImageDraw, ImageFont
-from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Processor
-from src.config import BASE_MODEL_PATH, MODEL_PATH, LABEL_COLORS, IMAGES_PATH
+from PIL import ImageDraw
+from src.config import LABEL_COLORS, IMAGES_PATH
+from src.extraction.document import MedicalDocument
+from src.extraction.converter import DocumentConverter
+from src.extraction.ocr import TextExtractor
+from src.model.inference import LayoutLMPredictor
 
 CONFIDENCE_THRESHOLD = 0.50 # Only show boxes with >50% confidence
 
 def main():
-    # 1. Load Model & Processor
-    print(f"⏳ Loading model from {MODEL_PATH + "/final"}...")
+    # 1. Load Model & Extractor (same engine as main.py)
     try:
-        model = LayoutLMv3ForTokenClassification.from_pretrained(MODEL_PATH + "/final")
-        # Use the base processor (it handles image resizing/OCR)
-        processor = LayoutLMv3Processor.from_pretrained(BASE_MODEL_PATH)
+        predictor = LayoutLMPredictor()
+        extractor = TextExtractor()
     except Exception as e:
         print(f"❌ Error loading model: {e}")
         return
@@ -28,41 +28,27 @@ def main():
     image_path = os.path.join(IMAGES_PATH, filename)
     print(f"📸 Testing on: {filename}")
 
-    image = Image.open(image_path).convert("RGB")
+    # 3. Run Extraction + Inference
+    doc = MedicalDocument(image_path)
+    DocumentConverter.convert_to_images(doc)
+    extractor.extract(doc)
 
-    # 3. Run Inference
-    # We must use the same truncation logic as training
-    inputs = processor(
-        image, 
-        return_tensors="pt", 
-        truncation=True, 
-        max_length=512
-    )
+    image = doc.pages[0]
+    tokens = doc.extracted_data[0] if doc.extracted_data else []
+    predictions = predictor.predict_pages([image], [tokens])[0]
 
-    with torch.no_grad():
-        outputs = model(**inputs)
-
-    # 4. Decode Output
-    logits = outputs.logits
-    predictions = logits.argmax(-1).squeeze().tolist()
-    # Get probabilities to filter low-confidence guesses
-    probs = logits.softmax(-1).max(-1).values.squeeze().tolist()
-    
-    token_boxes = inputs.bbox.squeeze().tolist()
-    id2label = model.config.id2label # The model remembers your labels!
-
-    # 5. Draw on Image
+    # 4. Draw on Image
     draw = ImageDraw.Draw(image)
-    # Optional: Load a font, or use default
-    # font = ImageFont.truetype("arial.ttf", 15) 
 
     print("\n--- 🔍 Detections ---")
     found_something = False
     
     width, height = image.size
 
-    for box, label_id, prob in zip(token_boxes, predictions, probs):
-        label = id2label[label_id]
+    for token, prediction in zip(tokens, predictions):
+        if prediction is None:
+            continue
+        label, prob = prediction
         
         # Skip "Outside" or Low Confidence
         if label == "O" or prob < CONFIDENCE_THRESHOLD:
@@ -71,6 +57,7 @@ def main():
         found_something = True
         
         # Un-normalize box (0-1000 -> pixels)
+        box = token['bbox']
         unnorm_box = [
             box[0] * width / 1000,
             box[1] * height / 1000,
@@ -86,7 +73,7 @@ def main():
         draw.rectangle(unnorm_box, outline=color, width=2)
         draw.text((unnorm_box[0], unnorm_box[1] - 10), f"{label} ({prob:.2f})", fill=color)
         
-        print(f"Found {label} : {prob:.2%} confidence")
+        print(f"Found {label} ({token['text']}) : {prob:.2%} confidence")
 
     if found_something:
         # Save the result
@@ -98,4 +85,4 @@ def main():
         print("⚠️ No labels detected. The model might need more training or the image is empty.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
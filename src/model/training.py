@@ -0,0 +1,226 @@
+import json
+import os
+import re
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import Trainer
+from src.utils.hardware import cpu_supports_bf16, available_cpus
+from src.config import TRAIN_BATCH_SIZE, TRAIN_NUM_WORKERS, TRAIN_USE_CPU, TRAIN_BF16
+
+LABEL_PAD_ID = -100 # Ignored by the token classification loss
+
+MANIFEST_NAME = "trained_examples.json"
+
+
+class LayoutLMCollator:
+    """
+    Dynamic padding for LayoutLMv3 token classification: every batch is padded
+    only to its own longest example (rounded up to pad_to_multiple_of), instead
+    of every example being stored at 512. Combined with group_by_length, most
+    batches carry almost no padding.
+
+    Takes rows as returned by a dataset in "numpy" format and ignores columns
+    the model doesn't consume (id, length), so the Trainer can keep them.
+    """
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=8, max_length=512):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.max_length = max_length
+
+    def __call__(self, rows):
+        longest = max(len(r["input_ids"]) for r in rows)
+        if self.pad_to_multiple_of:
+            longest = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        longest = min(longest, self.max_length)
+
+        n = len(rows)
+        input_ids = np.full((n, longest), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((n, longest), dtype=np.int64)
+        bbox = np.zeros((n, longest, 4), dtype=np.int64)
+        labels = np.full((n, longest), LABEL_PAD_ID, dtype=np.int64)
+
+        for i, r in enumerate(rows):
+            length = min(len(r["input_ids"]), longest)
+            input_ids[i, :length] = r["input_ids"][:length]
+            attention_mask[i, :length] = r["attention_mask"][:length]
+            bbox[i, :length] = np.asarray(r["bbox"], dtype=np.int64).reshape(-1, 4)[:length]
+            labels[i, :length] = r["labels"][:length]
+
+        return {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask),
+            "bbox": torch.from_numpy(bbox),
+            "labels": torch.from_numpy(labels),
+            "pixel_values": torch.from_numpy(np.stack([np.asarray(r["pixel_values"], dtype=np.float32) for r in rows])),
+        }
+
+
+def build_training_arguments(output_dir, epochs, learning_rate):
+    """
+    TrainingArguments shared by fine-tuning and distillation: memory-mapped
+    rows read by persistent loader workers, length-grouped batches padded by
+    LayoutLMCollator, bf16 only where the CPU does it natively.
+    Returns (arguments, one-line description for the log).
+    """
+    from transformers import TrainingArguments
+
+    num_workers = min(TRAIN_NUM_WORKERS, max(0, available_cpus() - 1))
+    bf16 = TRAIN_BF16 and TRAIN_USE_CPU and cpu_supports_bf16()
+    if TRAIN_BF16 and not bf16:
+        print("ℹ️ bf16 requested but this CPU has no native bf16, training in fp32.")
+
+    args = TrainingArguments(
+        output_dir=output_dir,
+        max_steps=-1,
+        num_train_epochs=epochs,
+
+        per_device_train_batch_size=TRAIN_BATCH_SIZE,
+        per_device_eval_batch_size=TRAIN_BATCH_SIZE,
+        gradient_accumulation_steps=1,
+
+        use_cpu=TRAIN_USE_CPU,
+        bf16=bf16,
+        fp16=False,
+
+        dataloader_num_workers=num_workers,
+        dataloader_persistent_workers=num_workers > 0,
+        dataloader_prefetch_factor=2 if num_workers > 0 else None,
+        dataloader_pin_memory=not TRAIN_USE_CPU,
+        # Batches of similar length -> dynamic padding adds almost nothing
+        group_by_length=True,
+        length_column_name="length",
+        # The collator picks the model inputs itself; "length" must survive for the sampler
+        remove_unused_columns=False,
+
+        save_strategy="epoch",
+        eval_strategy="epoch",
+        logging_strategy="epoch",
+
+        load_best_model_at_end=True,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        save_total_limit=3,
+
+        warmup_ratio=0.1,
+        learning_rate=learning_rate,
+    )
+    return args, f"batch {TRAIN_BATCH_SIZE}, {num_workers} loader workers, {'bf16' if bf16 else 'fp32'}"
+
+
+# --- Distillation ---
+def _layer_map(num_student, num_teacher):
+    """Student layer i -> teacher layer, spread evenly so the student keeps the first and last layers."""
+    if num_student == 1:
+        return [num_teacher - 1]
+    return [round(i * (num_teacher - 1) / (num_student - 1)) for i in range(num_student)]
+
+
+def init_student_from_teacher(teacher, student):
+    """
+    Starts the student from the teacher instead of from random weights: each
+    student layer takes an evenly spaced teacher layer, and every tensor is
+    cut down to the student's shape (the leading hidden units, heads and
+    intermediate units; the x/y/h/w position tables to coordinate_size and
+    shape_size). Returns the number of tensors copied.
+    """
+    config = student.config
+    spatial = 4 * config.coordinate_size + 2 * config.shape_size
+    if spatial != config.hidden_size:
+        raise ValueError(f"4 x coordinate_size + 2 x shape_size is {spatial}, but hidden_size is {config.hidden_size}")
+
+    layer_map = _layer_map(student.config.num_hidden_layers, teacher.config.num_hidden_layers)
+    teacher_state = teacher.state_dict()
+    copied = 0
+    with torch.no_grad():
+        for name, param in student.state_dict().items():
+            source = re.sub(r"(encoder\.layer\.)(\d+)(\.)", lambda m: f"{m.group(1)}{layer_map[int(m.group(2))]}{m.group(3)}", name)
+            weight = teacher_state.get(source)
+            if weight is None or weight.dim() != param.dim():
+                continue
+            if any(t < s for t, s in zip(weight.shape, param.shape)):
+                continue
+            param.copy_(weight[tuple(slice(0, s) for s in param.shape)])
+            copied += 1
+    return copied
+
+
+class DistillationTrainer(Trainer):
+    """
+    Trains a student on the teacher's soft labels as well as the annotations:
+    loss = alpha * T^2 * KL(teacher || student at temperature T) + (1 - alpha) * cross-entropy.
+    Only real tokens count (labels != LABEL_PAD_ID); the frozen teacher runs on
+    the same batch under no_grad.
+    """
+
+    def __init__(self, *args, teacher, temperature, alpha, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher = teacher.to(self.args.device).eval()
+        for param in self.teacher.parameters():
+            param.requires_grad_(False)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, num_items_in_batch=None):
+        outputs = model(**inputs)
+        with torch.no_grad():
+            teacher_logits = self.teacher(**{k: v for k, v in inputs.items() if k != "labels"}).logits
+
+        mask = inputs["labels"] != LABEL_PAD_ID
+        student = outputs.logits[mask] / self.temperature
+        teacher = teacher_logits[mask].float() / self.temperature
+        soft = F.kl_div(F.log_softmax(student.float(), dim=-1), F.softmax(teacher, dim=-1), reduction="batchmean")
+        loss = self.alpha * soft * self.temperature ** 2 + (1 - self.alpha) * outputs.loss
+        return (loss, outputs) if return_outputs else loss
+
+
+# --- Incremental training ---
+def load_manifest(model_path):
+    """Ids of the dataset examples a checkpoint has been trained on (empty if it has no manifest)."""
+    path = os.path.join(model_path, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f)["example_ids"])
+
+
+def save_manifest(model_path, example_ids, parent=None):
+    os.makedirs(model_path, exist_ok=True)
+    with open(os.path.join(model_path, MANIFEST_NAME), "w") as f:
+        json.dump({"parent": parent, "example_ids": sorted(example_ids)}, f, ensure_ascii=False)
+
+
+def next_model_path(model_path):
+    """models/custom_v8 -> models/custom_v9 (one past the highest custom_vN already on disk)."""
+    models_dir, name = os.path.split(os.path.normpath(model_path))
+    match = re.fullmatch(r"(.*_v)(\d+)", name)
+    if not match:
+        raise ValueError(f"Model directory '{name}' has no _vN version suffix")
+    prefix = match.group(1)
+    versions = [int(match.group(2))]
+    if os.path.isdir(models_dir):
+        for entry in os.listdir(models_dir):
+            m = re.fullmatch(re.escape(prefix) + r"(\d+)", entry)
+            if m:
+                versions.append(int(m.group(1)))
+    return os.path.join(models_dir, f"{prefix}{max(versions) + 1}")
+
+
+def select_incremental(dataset, trained_ids, replay_ratio, seed=42):
+    """
+    New examples (ids not in trained_ids) plus replay_ratio x as many old ones
+    drawn at random, so the model keeps seeing what it already learned.
+    Returns (subset, number of new examples).
+    """
+    ids = np.array([str(i) for i in dataset["id"]])
+    is_new = ~np.isin(ids, list(trained_ids))
+    new_idx = np.flatnonzero(is_new)
+    old_idx = np.flatnonzero(~is_new)
+
+    rng = np.random.default_rng(seed)
+    num_replay = min(len(old_idx), int(round(len(new_idx) * replay_ratio)))
+    replay_idx = rng.choice(old_idx, size=num_replay, replace=False) if num_replay else np.array([], dtype=np.int64)
+
+    indices = np.sort(np.concatenate([new_idx, replay_idx]))
+    return dataset.select(indices.tolist()), len(new_idx)
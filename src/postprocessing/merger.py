@@ -0,0 +1,48 @@
+def merge_boxes_bio(boxes, labels, scores):
+    """Merges tokens based on BIO tags AND geometric proximity."""
+    merged_results = []
+    if not boxes: return merged_results
+
+    curr_box = None
+    curr_label = None
+    curr_scores = []
+    Y_BREAK_THRESHOLD = 15.0 
+
+    for box, label, score in zip(boxes, labels, scores):
+        if label == "O":
+            if curr_box:
+                avg_score = sum(curr_scores) / len(curr_scores)
+                merged_results.append((curr_box, curr_label, avg_score))
+                curr_box = None
+            continue
+
+        prefix = label[0] 
+        core_label = label[2:] if len(label) > 2 else label
+
+        is_vertical_break = False
+        if curr_box:
+            gap = box[1] - curr_box[3] 
+            if gap > Y_BREAK_THRESHOLD:
+                is_vertical_break = True
+
+        if (curr_box is None or core_label != curr_label or prefix == "B" or is_vertical_break):
+            if curr_box:
+                avg_score = sum(curr_scores) / len(curr_scores)
+                merged_results.append((curr_box, curr_label, avg_score))
+            
+            curr_box = list(box)
+            curr_label = core_label
+            curr_scores = [score]
+            
+        elif prefix == "I" and core_label == curr_label:
+            curr_box[0] = min(curr_box[0], box[0])
+            curr_box[1] = min(curr_box[1], box[1])
+            curr_box[2] = max(curr_box[2], box[2])
+            curr_box[3] = max(curr_box[3], box[3])
+            curr_scores.append(score)
+
+    if curr_box:
+        avg_score = sum(curr_scores) / len(curr_scores)
+        merged_results.append((curr_box, curr_label, avg_score))
+
+    return merged_results
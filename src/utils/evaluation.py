@@ -0,0 +1,96 @@
+import json
+import os
+import unicodedata
+import urllib.parse
+from pathlib import Path
+
+
+def load_ground_truth(json_path, images_dir):
+    """
+    Annotated items from a Label Studio JSON-MIN export, resolved to local images.
+    Returns [(image_path, [(label, (x, y, w, h) in percent), ...]), ...].
+    """
+    with open(json_path, "r") as f:
+        data = json.load(f)
+
+    local = {unicodedata.normalize('NFC', name): name for name in os.listdir(images_dir)}
+    items = []
+    for item in data:
+        raw = item.get('image') or item.get('data', {}).get('image')
+        if not raw:
+            continue
+        # Label Studio prefixes uploads with a hash ("8d9bc659-name.png"); local copies may not have it
+        exported = unicodedata.normalize('NFC', Path(urllib.parse.unquote(raw)).name)
+        match = next((original for norm, original in local.items() if exported.endswith(norm)), None)
+        if match is None:
+            continue
+        entities = [
+            (a['rectanglelabels'][0], (a['x'], a['y'], a['width'], a['height']))
+            for a in item.get('label', []) if a.get('rectanglelabels')
+        ]
+        items.append((os.path.join(images_dir, match), entities))
+    return items
+
+
+def entities_from_results(results):
+    """Label Studio rectanglelabels results (see build_prediction_results) -> [(label, (x, y, w, h))]."""
+    return [
+        (r["value"]["rectanglelabels"][0], (r["value"]["x"], r["value"]["y"], r["value"]["width"], r["value"]["height"]))
+        for r in results
+    ]
+
+
+def iou(a, b):
+    ax0, ay0, aw, ah = a
+    bx0, by0, bw, bh = b
+    ix = max(0.0, min(ax0 + aw, bx0 + bw) - max(ax0, bx0))
+    iy = max(0.0, min(ay0 + ah, by0 + bh) - max(ay0, by0))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class EntityScorer:
+    """
+    Entity-level precision/recall per label. A predicted box counts as a hit
+    when it has the gold box's label and overlaps it by at least `iou_threshold`;
+    each gold box can be matched once (greedy, best overlap first).
+    """
+
+    def __init__(self, iou_threshold=0.5):
+        self.iou_threshold = iou_threshold
+        self.counts = {} # label -> [tp, fp, fn]
+
+    def add(self, gold, predicted):
+        for label in {l for l, _ in gold} | {l for l, _ in predicted}:
+            g = [box for l, box in gold if l == label]
+            p = [box for l, box in predicted if l == label]
+            pairs = sorted(
+                ((iou(gb, pb), gi, pi) for gi, gb in enumerate(g) for pi, pb in enumerate(p)),
+                reverse=True,
+            )
+            used_g, used_p = set(), set()
+            for overlap, gi, pi in pairs:
+                if overlap < self.iou_threshold:
+                    break
+                if gi in used_g or pi in used_p:
+                    continue
+                used_g.add(gi)
+                used_p.add(pi)
+
+            counts = self.counts.setdefault(label, [0, 0, 0])
+            counts[0] += len(used_g)
+            counts[1] += len(p) - len(used_p)
+            counts[2] += len(g) - len(used_g)
+
+    @staticmethod
+    def _scores(tp, fp, fn):
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return {"precision": precision, "recall": recall, "f1": f1, "support": tp + fn}
+
+    def report(self):
+        per_label = {label: self._scores(*counts) for label, counts in sorted(self.counts.items())}
+        totals = [sum(c[i] for c in self.counts.values()) for i in range(3)]
+        return {"micro": self._scores(*totals), "labels": per_label}
@@ -0,0 +1,85 @@
+import os
+import sys
+
+
+def cpu_flags():
+    """CPU feature flags from /proc/cpuinfo (Linux); empty elsewhere."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def cpu_supports_bf16():
+    """
+    True when the CPU has native bfloat16 matmul (AVX512-BF16 or AMX). Elsewhere
+    torch still accepts bf16 but emulates it, which is slower than fp32.
+    """
+    if sys.platform != "linux":
+        return False
+    return bool(cpu_flags() & {"avx512_bf16", "amx_bf16"})
+
+
+def available_cpus():
+    """Cores this process may run on (respects taskset/cgroup affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def parse_cores(spec):
+    """"0-3,8" or [0, 1, 2] -> sorted list of core ids."""
+    if isinstance(spec, str):
+        cores = set()
+        for part in spec.split(","):
+            first, _, last = part.strip().partition("-")
+            cores.update(range(int(first), int(last or first) + 1))
+        return sorted(cores)
+    return sorted(int(c) for c in spec)
+
+
+def pin_cores(cores):
+    """
+    Restricts the calling thread, and every thread it starts from now on, to
+    `cores`. Call it before the first torch/OpenMP work so the intra-op pool
+    is created pinned. Returns False where affinity can't be set.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, parse_cores(cores))
+    return True
+
+
+_threads_configured_pid = None # Process whose torch thread counts were set; a forked child starts unset
+
+
+def torch_threads_configured():
+    """Whether configure_torch_threads already ran in this process."""
+    return _threads_configured_pid == os.getpid()
+
+
+def configure_torch_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Sets torch's intra-op (per-operator) and inter-op thread counts; None leaves
+    a count as it is. The inter-op count can only be set before torch's first
+    parallel work in the process, so a late call keeps the current one.
+    Returns the (intra, inter) counts now in effect.
+    """
+    global _threads_configured_pid
+    import torch
+
+    _threads_configured_pid = os.getpid()
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads and inter_op_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            print(f"   ⚠️ Inter-op threads already started, keeping {torch.get_num_interop_threads()}.")
+    return torch.get_num_threads(), torch.get_num_interop_threads()
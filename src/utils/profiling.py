@@ -0,0 +1,211 @@
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from src.config import METRICS_PATH, METRICS_FORMAT, PROFILE_STAGES, PROFILE_DIR
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux), falling back to the process peak elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size. On Linux this is VmHWM, the mark reset_peak_rss()
+    clears; ru_maxrss can't be used there, since it also folds in the peaks
+    of exited threads and is never reset.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024 # kB
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def memory_breakdown(pid="self"):
+    """
+    RSS, PSS and the shared/private split of a process, in MB (Linux smaps_rollup).
+    PSS charges each shared page to its sharers proportionally, so summing it
+    over forked workers gives their real combined footprint; RSS would count
+    the shared weights once per worker. Elsewhere only rss_mb is filled in.
+    """
+    fields = {"Rss": 0, "Pss": 0, "Shared_Clean": 0, "Shared_Dirty": 0, "Private_Clean": 0, "Private_Dirty": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    fields[key] = int(rest.split()[0]) # kB
+    except OSError:
+        return {"rss_mb": current_rss_mb() if pid == "self" else 0.0, "pss_mb": None, "shared_mb": None, "private_mb": None}
+    return {
+        "rss_mb": fields["Rss"] / 1024,
+        "pss_mb": fields["Pss"] / 1024,
+        "shared_mb": (fields["Shared_Clean"] + fields["Shared_Dirty"]) / 1024,
+        "private_mb": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024,
+    }
+
+
+def reset_peak_rss():
+    """Resets VmHWM so the next peak_rss_mb() is per-document (Linux only, no-op elsewhere)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class DocumentProfile:
+    """Stage timings and counters for one document."""
+
+    def __init__(self, filename, profile_stages, profile_dir):
+        self.filename = filename
+        self.stages = {}
+        self.counters = {"pages": 0, "tokens": 0, "chunks": 0}
+        self.profile_stages = profile_stages
+        self.profile_dir = profile_dir
+        self.peak_rss_is_per_document = reset_peak_rss()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        """Times a pipeline stage; also runs it under cProfile if it is listed in PROFILE_STAGES."""
+        profiler = cProfile.Profile() if name in self.profile_stages else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                # Readable by pstats, snakeviz, or `py-spy`-style flamegraph converters (flameprof)
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{self.filename}.{name}.prof"))
+
+            entry = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0})
+            entry["wall_s"] += time.perf_counter() - wall
+            entry["cpu_s"] += time.process_time() - cpu
+
+    def count(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_record(self):
+        return {
+            "ts": time.time(),
+            "document": self.filename,
+            "wall_s": time.perf_counter() - self._wall_start,
+            "cpu_s": time.process_time() - self._cpu_start,
+            "stages": self.stages,
+            **self.counters,
+            "rss_mb": current_rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_scope": "document" if self.peak_rss_is_per_document else "process",
+        }
+
+
+class PipelineProfiler:
+    """
+    Per-document, per-stage instrumentation for the pipeline.
+    Costs two clock reads per stage, so it stays on in production.
+
+    Output formats:
+      "jsonl"      -> one JSON record per document appended to METRICS_PATH
+      "prometheus" -> cumulative counters rewritten to METRICS_PATH (textfile collector format)
+
+    Only running totals are kept in memory. `record_limit` keeps the last N
+    records in `records` as well (None: all of them, for benchmark/evaluate
+    runs that read them back).
+    """
+
+    def __init__(self, path=METRICS_PATH, fmt=METRICS_FORMAT, profile_stages=PROFILE_STAGES, profile_dir=PROFILE_DIR,
+                 record_limit=0):
+        if fmt not in ("jsonl", "prometheus", None):
+            raise ValueError(f"Unsupported metrics format '{fmt}'")
+        self.path = path
+        self.fmt = fmt
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.records = deque(maxlen=record_limit)
+        self._totals = {"documents": 0, "pages": 0, "tokens": 0, "chunks": 0}
+        self._stage_totals = {}
+
+        if self.path and self.fmt and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    @contextmanager
+    def document(self, filename):
+        profile = DocumentProfile(filename, self.profile_stages, self.profile_dir)
+        try:
+            yield profile
+        finally:
+            self.emit(profile.to_record())
+
+    def emit(self, record):
+        self.records.append(record)
+        self._totals["documents"] += 1
+        for key in ("pages", "tokens", "chunks"):
+            self._totals[key] += record.get(key, 0)
+        for name, stage in record["stages"].items():
+            totals = self._stage_totals.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0})
+            totals["wall_s"] += stage["wall_s"]
+            totals["cpu_s"] += stage["cpu_s"]
+
+        if not self.path or not self.fmt:
+            return
+        if self.fmt == "jsonl":
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            self._write_prometheus(record)
+
+    def _write_prometheus(self, last_record):
+        lines = [
+            "# TYPE lab_pipeline_documents_total counter",
+            f"lab_pipeline_documents_total {self._totals['documents']}",
+        ]
+        for key in ("pages", "tokens", "chunks"):
+            lines.append(f"# TYPE lab_pipeline_{key}_total counter")
+            lines.append(f"lab_pipeline_{key}_total {self._totals[key]}")
+
+        lines.append("# TYPE lab_pipeline_stage_wall_seconds_total counter")
+        for name, totals in self._stage_totals.items():
+            lines.append(f'lab_pipeline_stage_wall_seconds_total{{stage="{name}"}} {totals["wall_s"]:.6f}')
+        lines.append("# TYPE lab_pipeline_stage_cpu_seconds_total counter")
+        for name, totals in self._stage_totals.items():
+            lines.append(f'lab_pipeline_stage_cpu_seconds_total{{stage="{name}"}} {totals["cpu_s"]:.6f}')
+
+        lines.append("# TYPE lab_pipeline_last_document_peak_rss_megabytes gauge")
+        lines.append(f"lab_pipeline_last_document_peak_rss_megabytes {last_record['peak_rss_mb']:.1f}")
+
+        # Write-then-rename so a scraper never sees a half-written file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        """Human-readable per-stage totals for the end of a run."""
+        lines = [f"⏱️ {self._totals['documents']} documents, {self._totals['pages']} pages, {self._totals['tokens']} tokens"]
+        for name, totals in self._stage_totals.items():
+            lines.append(f"   {name:<10} wall {totals['wall_s']:8.2f}s | cpu {totals['cpu_s']:8.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,225 @@
+import os
+import random
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Latin-only so the digital PDFs can use the built-in Helvetica font
+TESTS = [
+    ("Hemoglobin", "g/L", (120, 160)),
+    ("Erythrocytes", "10^12/L", (3.9, 5.5)),
+    ("Leukocytes", "10^9/L", (4.0, 9.0)),
+    ("Platelets", "10^9/L", (150, 400)),
+    ("Hematocrit", "%", (36, 48)),
+    ("ESR", "mm/h", (2, 15)),
+    ("Glucose", "mmol/L", (3.3, 5.5)),
+    ("Cholesterol", "mmol/L", (3.0, 5.2)),
+    ("ALT", "U/L", (0, 41)),
+    ("AST", "U/L", (0, 37)),
+    ("Creatinine", "umol/L", (62, 106)),
+    ("Urea", "mmol/L", (2.5, 8.3)),
+    ("Total bilirubin", "umol/L", (3.4, 20.5)),
+    ("Ferritin", "ng/mL", (20, 250)),
+    ("TSH", "mIU/L", (0.4, 4.0)),
+    ("Vitamin D", "ng/mL", (30, 100)),
+]
+
+SECTIONS = ["Complete Blood Count", "Biochemistry", "Hormones"]
+FIRST_NAMES = ["Aziz", "Dilnoza", "Timur", "Malika", "Rustam", "Nodira"]
+LAST_NAMES = ["Karimov", "Usmanova", "Rakhimov", "Yusupova", "Saidov", "Alieva"]
+
+PAGE_WIDTH_PT, PAGE_HEIGHT_PT = 595, 842 # A4
+MARGIN_PT = 50
+ROW_HEIGHT_PT = 16
+
+
+def _lines_for_document(rng, num_pages, rows_per_page):
+    """
+    The text of a synthetic lab report as (x_pt, y_pt_from_top, text) triples per page.
+    Page 1 carries the patient block; every page has a section header and a results table.
+    """
+    name = f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}"
+    pages = []
+    for page_idx in range(num_pages):
+        lines = []
+        y = MARGIN_PT
+        lines.append((MARGIN_PT, y, "CITY CLINICAL LABORATORY"))
+        y += ROW_HEIGHT_PT * 2
+
+        if page_idx == 0:
+            lines.append((MARGIN_PT, y, f"Patient: {name}")); y += ROW_HEIGHT_PT
+            lines.append((MARGIN_PT, y, f"Date of birth: {rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1950, 2015)}"))
+            lines.append((330, y, f"Gender: {rng.choice(['M', 'F'])}")); y += ROW_HEIGHT_PT
+            lines.append((MARGIN_PT, y, f"Weight: {rng.randint(45, 110)} kg"))
+            lines.append((330, y, f"Height: {rng.randint(150, 195)} cm")); y += ROW_HEIGHT_PT * 2
+
+        lines.append((MARGIN_PT, y, rng.choice(SECTIONS))); y += ROW_HEIGHT_PT * 1.5
+        columns = [(MARGIN_PT, "Test"), (230, "Result"), (320, "Unit"), (420, "Reference")]
+        for x, header in columns:
+            lines.append((x, y, header))
+        y += ROW_HEIGHT_PT
+
+        for _ in range(rows_per_page):
+            if y > PAGE_HEIGHT_PT - MARGIN_PT:
+                break
+            test, unit, (low, high) = rng.choice(TESTS)
+            value = rng.uniform(low * 0.7, high * 1.3)
+            value_text = f"{value:.1f}" if high < 20 else f"{value:.0f}"
+            for (x, _), text in zip(columns, (test, value_text, unit, f"{low} - {high}")):
+                lines.append((x, y, text))
+            y += ROW_HEIGHT_PT
+
+        pages.append(lines)
+    return pages
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_digital_pdf(path, pages):
+    """Minimal PDF with a real text layer (Helvetica), so MedicalDocument routes it as digital."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None) # placeholders, filled in once the page ids are known
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf"]
+        for x, y, text in lines:
+            ops.append(f"1 0 0 1 {x:.1f} {PAGE_HEIGHT_PT - y:.1f} Tm ({_pdf_escape(text)}) Tj")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH_PT} {PAGE_HEIGHT_PT}] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        ))
+
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj_id, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def render_page(lines, rng, dpi=200, noise=True):
+    """Rasterizes one page like a scanner would: slight skew, grey paper, speckle noise."""
+    scale = dpi / 72
+    width, height = int(PAGE_WIDTH_PT * scale), int(PAGE_HEIGHT_PT * scale)
+    img = Image.new("L", (width, height), 245)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=int(10 * scale))
+    for x, y, text in lines:
+        draw.text((x * scale, y * scale), text, fill=20, font=font)
+
+    if noise:
+        img = img.rotate(rng.uniform(-1.5, 1.5), resample=Image.BILINEAR, fillcolor=245)
+        np_rng = np.random.default_rng(rng.randint(0, 2**32 - 1))
+        arr = np.asarray(img, dtype=np.int16)
+        arr = arr + np_rng.normal(0, 8, arr.shape).astype(np.int16)
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img.convert("RGB")
+
+
+def write_scanned_pdf(path, pages, rng, dpi=200):
+    images = [render_page(lines, rng, dpi) for lines in pages]
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+
+
+def write_image(path, lines, rng, dpi=200):
+    render_page(lines, rng, dpi).save(path)
+
+
+def write_docx(path, pages):
+    from docx import Document # Optional: only the benchmark corpus needs python-docx
+
+    document = Document()
+    for page_idx, lines in enumerate(pages):
+        if page_idx > 0:
+            document.add_page_break()
+        # Group the positioned lines back into rows so tables come out as real tables
+        rows = {}
+        for x, y, text in lines:
+            rows.setdefault(y, []).append(text)
+        table_rows = [cells for cells in rows.values() if len(cells) == 4]
+        for cells in rows.values():
+            if len(cells) != 4:
+                document.add_paragraph("   ".join(cells))
+        if table_rows:
+            table = document.add_table(rows=len(table_rows), cols=4)
+            for r, cells in enumerate(table_rows):
+                for c, text in enumerate(cells):
+                    table.cell(r, c).text = text
+    document.save(path)
+
+
+def generate_corpus(out_dir, specs, seed=0):
+    """
+    Deterministically writes one file per spec and returns their paths.
+    A spec is a (kind, num_pages, rows_per_page) tuple, kind in {"digital", "scanned", "image", "docx"}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for idx, (kind, num_pages, rows_per_page) in enumerate(specs):
+        rng = random.Random(f"{seed}-{idx}-{kind}-{num_pages}-{rows_per_page}")
+        pages = _lines_for_document(rng, num_pages, rows_per_page)
+        stem = os.path.join(out_dir, f"{idx:03d}_{kind}_{num_pages}p_{rows_per_page}r")
+
+        if kind == "digital":
+            path = stem + ".pdf"
+            write_digital_pdf(path, pages)
+        elif kind == "scanned":
+            path = stem + ".pdf"
+            write_scanned_pdf(path, pages, rng)
+        elif kind == "image":
+            path = stem + ".png"
+            write_image(path, pages[0], rng)
+        elif kind == "docx":
+            path = stem + ".docx"
+            write_docx(path, pages)
+        else:
+            raise ValueError(f"Unknown synthetic document kind '{kind}'")
+        paths.append(path)
+    return paths
+
+
+def synthetic_pages(num_pages, rows_per_page, seed=0):
+    """
+    In-memory pages for model-only benchmarks: (image, PageTokens) pairs with
+    word boxes on LayoutLM's 0-1000 scale, no OCR involved.
+    """
+    from src.extraction.tokens import PageTokens
+
+    rng = random.Random(f"{seed}-{num_pages}-{rows_per_page}")
+    result = []
+    for lines in _lines_for_document(rng, num_pages, rows_per_page):
+        texts, bboxes = [], []
+        for x, y, text in lines:
+            for word in text.split():
+                width = 5.5 * len(word) # Helvetica 10pt, roughly
+                bboxes.append([
+                    int(x / PAGE_WIDTH_PT * 1000), int((y - 8) / PAGE_HEIGHT_PT * 1000),
+                    int(min(x + width, PAGE_WIDTH_PT) / PAGE_WIDTH_PT * 1000), int(y / PAGE_HEIGHT_PT * 1000),
+                ])
+                texts.append(word)
+                x += width + 3
+        result.append((render_page(lines, rng, dpi=100, noise=False), PageTokens(texts, bboxes)))
+    return result
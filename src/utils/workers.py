@@ -0,0 +1,117 @@
+import gc
+import multiprocessing as mp
+import queue
+import sys
+import traceback
+from src.utils.hardware import available_cpus, parse_cores, pin_cores, configure_torch_threads
+from src.utils.profiling import memory_breakdown
+from src.config import PIPELINE_WORKERS, CPU_RUNTIME
+
+
+class ForkedWorkerPool:
+    """
+    Runs `handler(item)` in forked worker processes that inherit whatever the
+    parent already loaded (LayoutLM weights, the EasyOCR detector/recognizer).
+
+    Weight tensors are never written during inference, so their pages stay
+    shared copy-on-write between all workers. gc.freeze() moves the parent's
+    objects out of the collector's reach before forking; otherwise the first
+    collection in each worker touches every object header and un-shares the
+    pages they live on.
+
+    Linux only (needs fork). Load models in the parent, but don't run inference
+    there before forking: intra-op thread pools don't survive fork.
+    """
+
+    def __init__(self, handler, num_workers=PIPELINE_WORKERS, threads_per_worker=None, cores=CPU_RUNTIME["pin_cores"]):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or max(1, available_cpus() // num_workers)
+        # With pinning, worker i gets its own slice of the cores so workers never share one
+        self.cores = parse_cores(cores) if cores is not None else None
+        self.memory = {} # worker id -> {"start": memory_breakdown, "end": memory_breakdown}
+
+    def run(self, items):
+        """Processes every item; returns [(item, result, error)] in completion order."""
+        return list(self.iter_results(items))
+
+    def iter_results(self, items):
+        """Like run(), but yields each (item, result, error) as soon as a worker finishes it."""
+        ctx = mp.get_context("fork")
+        tasks, results = ctx.Queue(), ctx.Queue()
+        for item in items:
+            tasks.put(item)
+        for _ in range(self.num_workers):
+            tasks.put(None)
+
+        gc.collect()
+        gc.freeze()
+        workers = [ctx.Process(target=self._work, args=(i, tasks, results), name=f"pipeline-worker-{i}") for i in range(self.num_workers)]
+        for w in workers:
+            w.start()
+
+        running = set(range(self.num_workers))
+        try:
+            while running:
+                try:
+                    kind, worker_id, payload = results.get(timeout=1.0)
+                except queue.Empty:
+                    for worker_id in list(running):
+                        if not workers[worker_id].is_alive():
+                            print(f"⚠️ Worker {worker_id} exited with code {workers[worker_id].exitcode}")
+                            running.discard(worker_id)
+                    continue
+
+                if kind == "result":
+                    yield payload
+                elif kind == "memory":
+                    phase, breakdown = payload
+                    self.memory.setdefault(worker_id, {})[phase] = breakdown
+                elif kind == "done":
+                    running.discard(worker_id)
+        finally:
+            for w in workers:
+                if running: # Consumer stopped early: don't wait for the rest of the queue
+                    w.terminate()
+                w.join()
+            gc.unfreeze()
+
+    def _work(self, worker_id, tasks, results):
+        if self.cores:
+            share = self.cores[worker_id * self.threads_per_worker:(worker_id + 1) * self.threads_per_worker]
+            pin_cores(share or self.cores)
+        if "torch" in sys.modules:
+            # Marks this process configured, so the predictor keeps the worker's share
+            configure_torch_threads(self.threads_per_worker)
+        results.put(("memory", worker_id, ("start", memory_breakdown())))
+
+        while True:
+            item = tasks.get()
+            if item is None:
+                break
+            try:
+                results.put(("result", worker_id, (item, self.handler(item), None)))
+            except Exception:
+                results.put(("result", worker_id, (item, None, traceback.format_exc())))
+
+        results.put(("memory", worker_id, ("end", memory_breakdown())))
+        results.put(("done", worker_id, None))
+
+    def memory_report(self, parent=None):
+        """How much each worker added on top of what it shares with the parent."""
+        parent = parent or memory_breakdown()
+        lines = [f"🧠 Parent: RSS {parent['rss_mb']:.0f} MB"]
+        total = parent["rss_mb"] # Everything the workers share is already in here
+        for worker_id in sorted(self.memory):
+            start, end = self.memory[worker_id].get("start"), self.memory[worker_id].get("end")
+            if not start or not end:
+                lines.append(f"   worker {worker_id}: incomplete (crashed?)")
+                continue
+            line = f"   worker {worker_id}: RSS {start['rss_mb']:.0f} -> {end['rss_mb']:.0f} MB (+{end['rss_mb'] - start['rss_mb']:.0f})"
+            if end["pss_mb"] is not None:
+                line += f" | PSS {end['pss_mb']:.0f} MB | shared {end['shared_mb']:.0f} MB | private {end['private_mb']:.0f} MB"
+                total += end["private_mb"]
+            lines.append(line)
+        if parent["pss_mb"] is not None:
+            lines.append(f"   Node footprint (parent RSS + worker private): {total:.0f} MB")
+        return "\n".join(lines)
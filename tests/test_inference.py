@@ -0,0 +1,190 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.config import LABELS, CPU_RUNTIME
+from src.extraction.tokens import PageTokens, LABEL_IDS, NO_LABEL
+from src.model.chunking import LineChunker
+from src.model.encoding import EncodedPage, PageEncoder
+from src.model.inference import LayoutLMPredictor, O_LABEL_ID
+
+ENTITY = LABEL_IDS["B-Section_Header"]
+PAD_ID = 1
+
+
+class StubEncoder(PageEncoder):
+    """One subword per word (id 3 + word index), blank images; batching is the real PageEncoder.batch."""
+
+    def __init__(self):
+        self.cls_id, self.sep_id, self.pad_id = 0, 2, PAD_ID
+        self.budget = 510
+
+    def encode_pages(self, pages):
+        return [EncodedPage(np.arange(3, 3 + len(p), dtype=np.int32), np.ones(len(p), dtype=np.int64), np.arange(len(p)))
+                for p in pages]
+
+    def pixel_values(self, images):
+        return np.zeros((len(images), 3, 224, 224), dtype=np.float32)
+
+
+def stub_forward(input_ids, **inputs):
+    """Even subword ids read as "O", odd ones as ENTITY; both at the same confidence."""
+    import torch
+
+    logits = torch.zeros((*input_ids.shape, len(LABELS)))
+    odd = (input_ids % 2 == 1) & (input_ids >= 3)
+    logits[..., O_LABEL_ID] = torch.where(odd, 0.0, 10.0)
+    logits[..., ENTITY] = torch.where(odd, 10.0, 0.0)
+    return SimpleNamespace(logits=logits)
+
+
+def stub_predictor(compiled):
+    """A predictor wired to the stubs; compiled pads every batch like torch.compile needs."""
+    import torch
+
+    predictor = LayoutLMPredictor(device="cpu", batch_size=4, runtime={**CPU_RUNTIME, "pin_cores": None, "compile": compiled})
+    predictor._model = predictor._forward = stub_forward
+    predictor._processor = SimpleNamespace(tokenizer=SimpleNamespace(pad_token_id=PAD_ID))
+    predictor.encoder = StubEncoder()
+    predictor.chunker = LineChunker(tokenizer=None)
+    predictor._label_map = np.arange(len(LABELS), dtype=np.int16)
+    predictor.device = torch.device("cpu")
+    predictor.bf16, predictor.compiled = False, compiled
+    return predictor
+
+
+def empty_best(n):
+    return np.full(n, NO_LABEL, dtype=np.int16), np.full(n, -1.0, dtype=np.float32)
+
+
+def test_merge_keeps_the_most_confident_prediction_per_word():
+    best_labels, best_confidences = empty_best(3)
+    word_idx = np.array([0, 0, 1, 0, 1])
+    labels = np.array([1, 2, 3, 4, 5], dtype=np.int16)
+    confidences = np.array([0.3, 0.9, 0.5, 0.6, 0.4], dtype=np.float32)
+
+    LayoutLMPredictor._merge_max_confidence(best_labels, best_confidences, word_idx, labels, confidences)
+
+    assert best_labels.tolist() == [2, 3, NO_LABEL]
+    assert best_confidences.tolist() == pytest.approx([0.9, 0.5, -1.0])
+
+
+def test_merge_only_replaces_lower_confidences_across_calls():
+    best_labels, best_confidences = empty_best(2)
+    LayoutLMPredictor._merge_max_confidence(
+        best_labels, best_confidences, np.array([0, 1]), np.array([1, 1], dtype=np.int16), np.array([0.8, 0.2], dtype=np.float32)
+    )
+    # A later chunk overlapping both words
+    LayoutLMPredictor._merge_max_confidence(
+        best_labels, best_confidences, np.array([0, 1]), np.array([2, 2], dtype=np.int16), np.array([0.7, 0.6], dtype=np.float32)
+    )
+
+    assert best_labels.tolist() == [1, 2]
+    assert best_confidences.tolist() == pytest.approx([0.8, 0.6])
+
+
+def test_merge_moves_entropies_with_the_winning_prediction():
+    best_labels, best_confidences = empty_best(2)
+    best_entropies = np.zeros(2, dtype=np.float32)
+
+    LayoutLMPredictor._merge_max_confidence(
+        best_labels, best_confidences, np.array([1, 0, 1]), np.array([1, 2, 3], dtype=np.int16),
+        np.array([0.9, 0.4, 0.5], dtype=np.float32), best_entropies, np.array([0.1, 1.2, 0.7], dtype=np.float32)
+    )
+
+    assert best_labels.tolist() == [2, 1]
+    assert best_entropies.tolist() == pytest.approx([1.2, 0.1])
+
+
+def test_merge_of_nothing_changes_nothing():
+    best_labels, best_confidences = empty_best(2)
+    empty = np.zeros(0, dtype=np.int64)
+    LayoutLMPredictor._merge_max_confidence(best_labels, best_confidences, empty, empty.astype(np.int16), empty.astype(np.float32))
+    assert best_labels.tolist() == [NO_LABEL, NO_LABEL]
+
+
+def grid_page(rows, words_per_row):
+    texts, bboxes = [], []
+    for r in range(rows):
+        for w in range(words_per_row):
+            texts.append(f"w{r}_{w}")
+            bboxes.append([w * 100, r * 50, w * 100 + 80, r * 50 + 30])
+    return PageTokens(texts, bboxes)
+
+
+def test_chunker_packs_whole_lines_with_line_overlap():
+    page = grid_page(rows=4, words_per_row=3)
+    chunker = LineChunker(tokenizer=None, max_tokens=2 + 6, stride_tokens=3)
+
+    windows = chunker.chunk(page, counts=[1] * len(page))
+
+    # Two lines per window, the previous window's last line carried over
+    assert windows == [[0, 1, 2, 3, 4, 5], [3, 4, 5, 6, 7, 8], [6, 7, 8, 9, 10, 11]]
+
+
+def test_chunker_splits_lines_longer_than_the_budget_at_word_boundaries():
+    page = grid_page(rows=1, words_per_row=5)
+    chunker = LineChunker(tokenizer=None, max_tokens=2 + 4, stride_tokens=0)
+
+    windows = chunker.chunk(page, counts=[2] * len(page))
+
+    assert windows == [[0, 1], [2, 3], [4]]
+    assert sorted(i for window in windows for i in window) == list(range(5))
+
+
+def test_chunker_returns_nothing_for_an_empty_page():
+    assert LineChunker(tokenizer=None).chunk(PageTokens([], [])) == []
+
+
+def test_merge_positions_skip_special_tokens_and_padding():
+    word_index = np.array([-1, 0, 1, 1, -1, -1])
+    preds = np.array([O_LABEL_ID, ENTITY, O_LABEL_ID, ENTITY, O_LABEL_ID, ENTITY])
+
+    assert LayoutLMPredictor._merge_positions(word_index, preds).tolist() == [1, 2, 3]
+    assert LayoutLMPredictor._merge_positions(word_index, preds, entities_only=True).tolist() == [1, 3]
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_o_competes_unless_entities_only(compiled):
+    page = grid_page(rows=1, words_per_row=4) # Subword ids 3..6: words 1 and 3 read as "O"
+    predictor = stub_predictor(compiled)
+
+    [(labels, _)] = predictor.predict_arrays([None], [page])
+    assert labels.tolist() == [ENTITY, O_LABEL_ID, ENTITY, O_LABEL_ID]
+
+    [(labels, confidences)] = predictor.predict_arrays([None], [page], entities_only=True)
+    assert labels.tolist() == [ENTITY, NO_LABEL, ENTITY, NO_LABEL]
+    assert confidences[1] == 0 and confidences[3] == 0
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_entities_only_keeps_an_entity_reading_over_a_more_confident_o(compiled):
+    # Two short lines per window with one line of overlap: the middle line is seen twice
+    page = grid_page(rows=3, words_per_row=1)
+    predictor = stub_predictor(compiled)
+    predictor.chunker = LineChunker(tokenizer=None, max_tokens=2 + 2, stride_tokens=1)
+
+    def forward(input_ids, **inputs):
+        out = stub_forward(input_ids, **inputs)
+        # Second window: word 1 (id 4) reads as a weak ENTITY instead of a confident "O"
+        second = input_ids[1] == 4
+        out.logits[1, second, O_LABEL_ID] = 0.0
+        out.logits[1, second, ENTITY] = 2.0
+        return out
+
+    predictor._forward = forward
+    [(labels, _)] = predictor.predict_arrays([None], [page], entities_only=True)
+    assert labels[1] == ENTITY
+
+    [(labels, _)] = predictor.predict_arrays([None], [page])
+    assert labels[1] == O_LABEL_ID
+
+
+def test_padded_compiled_batches_merge_with_entities_only():
+    page = grid_page(rows=1, words_per_row=5) # Subword ids 3..7: words 1 and 3 read as "O"
+
+    [(labels, confidences)] = stub_predictor(compiled=True).predict_arrays([None], [page], entities_only=True)
+
+    assert labels.tolist() == [ENTITY, NO_LABEL, ENTITY, NO_LABEL, ENTITY]
+    assert (confidences[[0, 2, 4]] > 0.9).all() and (confidences[[1, 3]] == 0).all()
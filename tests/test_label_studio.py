@@ -0,0 +1,173 @@
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.integration.label_studio import LabelStudioClient, TaskIndex, task_image_name
+
+
+class StubLabelStudio:
+    """The slice of the Label Studio API the client uses, served from an in-memory task list."""
+
+    def __init__(self):
+        self.tasks = {}
+        self.files = {}
+        self.status = None # Forces every response to this status (e.g. 403)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                stub.requests.append(url)
+                if stub.status:
+                    return self._send(stub.status, {"detail": "nope"})
+                if url.path == "/api/tasks/":
+                    return self._send(*stub.tasks_page(urllib.parse.parse_qs(url.query)))
+                if url.path.startswith("/api/projects/"):
+                    return self._send(200, {"task_number": len(stub.tasks)})
+                if url.path in stub.files:
+                    body = stub.files[url.path]
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self._send(404, {"detail": "Not found"})
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add(self, task_id, updated_at, image=None):
+        self.tasks[task_id] = {"id": task_id, "updated_at": updated_at, "data": {"image": image or f"/data/upload/1/{task_id}.png"}}
+
+    def tasks_page(self, params):
+        tasks = sorted(self.tasks.values(), key=lambda t: (t["updated_at"], t["id"]))
+        query = json.loads(params["query"][0])
+        for item in query.get("filters", {}).get("items", []):
+            assert item["operator"] == "greater_or_equal"
+            tasks = [t for t in tasks if t["updated_at"] >= item["value"]]
+        page, size = int(params["page"][0]), int(params["page_size"][0])
+        chunk = tasks[(page - 1) * size:page * size]
+        if page > 1 and not chunk:
+            return 404, {"detail": "Invalid page."}
+        if params["fields"][0] == "task_only":
+            chunk = [{k: v for k, v in t.items() if k != "annotations"} for t in chunk]
+        return 200, {"tasks": chunk, "total": len(tasks)}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    stub = StubLabelStudio()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def client(stub):
+    return LabelStudioClient(base_url=stub.url, project_id=1, session_id=None, page_size=2, timeout=5)
+
+
+@pytest.fixture
+def index(tmp_path):
+    with TaskIndex(str(tmp_path / "tasks.sqlite")) as index:
+        yield index
+
+
+def test_full_sync_pages_through_every_task(stub, client, index):
+    for i in range(1, 6):
+        stub.add(i, f"2024-01-0{i}T00:00:00Z")
+
+    assert client.sync(index, full=True) == 5
+    assert index.ids() == {1, 2, 3, 4, 5}
+    assert index.get_meta("last_updated_at") == "2024-01-05T00:00:00Z"
+    assert index.get(3)["data"]["image"] == "/data/upload/1/3.png"
+
+
+def test_incremental_sync_keeps_tasks_sharing_the_boundary_timestamp(stub, client, index):
+    stub.add(1, "2024-01-01T00:00:00Z")
+    stub.add(2, "2024-01-02T00:00:00Z")
+    client.sync(index)
+
+    # Saved in the same second as task 2, after the previous sync read it
+    stub.add(3, "2024-01-02T00:00:00Z")
+    client.sync(index)
+
+    assert index.ids() == {1, 2, 3}
+
+
+def test_incremental_sync_picks_up_updates(stub, client, index):
+    stub.add(1, "2024-01-01T00:00:00Z", image="/data/upload/1/old.png")
+    client.sync(index)
+
+    stub.add(1, "2024-01-03T00:00:00Z", image="/data/upload/1/new.png")
+    client.sync(index)
+
+    assert len(index) == 1
+    assert index.get(1)["data"]["image"] == "/data/upload/1/new.png"
+    assert index.get_meta("last_updated_at") == "2024-01-03T00:00:00Z"
+
+
+def test_deleted_tasks_leave_the_index(stub, client, index):
+    for i in range(1, 4):
+        stub.add(i, f"2024-01-0{i}T00:00:00Z")
+    client.sync(index)
+
+    del stub.tasks[2]
+    client.sync(index)
+    assert index.ids() == {1, 3}
+
+    del stub.tasks[3]
+    client.sync(index, full=True)
+    assert index.ids() == {1}
+
+
+def test_incremental_sync_skips_the_id_sweep_when_nothing_was_deleted(stub, client, index):
+    stub.add(1, "2024-01-01T00:00:00Z")
+    client.sync(index)
+    stub.requests.clear()
+
+    client.sync(index)
+
+    fields = [urllib.parse.parse_qs(url.query).get("fields") for url in stub.requests if url.path == "/api/tasks/"]
+    assert ["task_only"] not in fields
+
+
+def test_expired_session_raises_permission_error(stub, client, index):
+    stub.status = 403
+    with pytest.raises(PermissionError):
+        client.sync(index)
+
+
+def test_download_resolves_relative_urls(stub, client, tmp_path):
+    stub.files["/data/upload/1/scan.png"] = b"\x89PNG fake"
+    path = client.download("/data/upload/1/scan.png", str(tmp_path / "scan.png"))
+    with open(path, "rb") as f:
+        assert f.read() == b"\x89PNG fake"
+
+
+def test_find_by_filename_matches_the_upload_suffix(index):
+    index.upsert({"id": 7, "updated_at": "2024-01-01", "data": {"image": "/data/upload/1/8d9bc659-%D0%9C%D0%B0%D1%85.png"}})
+    index.commit()
+
+    assert task_image_name(index.get(7)) == "8d9bc659-Мах.png"
+    assert [t["id"] for t in index.find_by_filename("Мах.png")] == [7]
+    assert index.find_by_filename("other.png") == []
@@ -0,0 +1,72 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.extraction.tokens import PageTokens, LABEL_IDS
+from src.integration.server import InferenceService, task_filename
+
+ENTITY = LABEL_IDS["B-Section_Header"]
+
+
+class StubPredictor:
+    """Labels every token ENTITY at 0.9 and counts the model calls."""
+
+    last_num_chunks = 0
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict_arrays(self, images, pages_tokens, return_entropy=False, entities_only=False):
+        self.calls += 1
+        return [(np.full(len(p), ENTITY, dtype=np.int16), np.full(len(p), 0.9, dtype=np.float32)) for p in pages_tokens]
+
+
+class StubExtractor:
+    """The same two words on every page, no OCR."""
+
+    def extract(self, doc, pages):
+        for _ in pages:
+            doc.extracted_data.append(PageTokens(["Glucose", "5.4"], [[100, 100, 200, 130], [300, 100, 340, 130]]))
+
+    def refine_critical(self, doc):
+        return []
+
+    def same_content(self, file_path, pages):
+        return False
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    # The stores, the dedup index and the metrics log all live under ./data
+    monkeypatch.chdir(tmp_path)
+    return InferenceService(predictor=StubPredictor(), extractor=StubExtractor(), client=object())
+
+
+def test_predict_file_runs_the_pipeline_then_serves_the_cache(service, tmp_path):
+    path = tmp_path / "scan.png"
+    Image.new("RGB", (200, 100), "white").save(path)
+
+    first, skipped, doc = service.predict_file(str(path))
+    assert doc is not None and skipped == {}
+    assert [t["label"] for t in first[0]] == ["B-Section_Header", "B-Section_Header"]
+
+    second, _, doc = service.predict_file(str(path))
+    assert doc is None
+    assert second[0].to_dicts() == first[0].to_dicts()
+    assert service.predictor.calls == 1
+
+
+def test_predict_bytes_names_the_upload(service):
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 100), "white").save(buffer, format="PNG")
+
+    pages, _, _ = service.predict_bytes(buffer.getvalue(), "../upload.png")
+    assert len(pages) == 1
+
+
+def test_task_filename():
+    assert task_filename({"id": 3, "data": {"image": "/data/upload/1/8d9bc659-scan%201.png"}}) == "8d9bc659-scan 1.png"
+    assert task_filename({"id": 3, "data": {"image": "/data/local-files/?d=labs%2Fjan%2Fscan.png"}}) == "scan.png"
+    assert task_filename({"id": 3, "data": {"image": "/data/local-files/?d="}}) == "task_3.png"
@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from src.extraction.tokens import PageTokens, TokenView, LABEL_IDS, NO_LABEL
+from src.extraction.layout import ReadingOrder
+
+
+def make_page():
+    return PageTokens.from_dicts([
+        {"text": "Glucose", "bbox": [100, 200, 220, 230], "label": "B-Test_Context_Name", "confidence": 0.9},
+        {"text": "5.4", "bbox": [400, 200, 440, 230], "ocr_confidence": 0.75},
+        {"text": "mmol/L", "bbox": [460, 200, 540, 230], "line": 0, "column": 1},
+    ])
+
+
+def test_from_dicts_fills_the_arrays():
+    page = make_page()
+
+    assert len(page) == 3
+    assert page.texts == ["Glucose", "5.4", "mmol/L"]
+    assert page.bboxes.dtype == np.int16 and page.bboxes.shape == (3, 4)
+    assert page.label_ids.tolist() == [LABEL_IDS["B-Test_Context_Name"], NO_LABEL, NO_LABEL]
+    assert page.confidences[0] == pytest.approx(0.9)
+    assert page.ocr_confidences.tolist() == pytest.approx([1.0, 0.75, 1.0])
+    assert page.lines.tolist() == [-1, -1, 0]
+    assert page.columns.tolist() == [-1, -1, 1]
+
+
+def test_to_dicts_round_trips_and_omits_unset_keys():
+    page = make_page()
+    dicts = page.to_dicts()
+
+    assert dicts[0] == {"text": "Glucose", "bbox": [100, 200, 220, 230], "label": "B-Test_Context_Name",
+                        "confidence": pytest.approx(0.9), "ocr_confidence": 1.0}
+    assert "label" not in dicts[1] and "line" not in dicts[1]
+    assert dicts[2]["line"] == 0 and dicts[2]["column"] == 1
+    assert PageTokens.from_dicts(dicts).to_dicts() == dicts
+
+
+def test_coerce_passes_page_tokens_through():
+    page = make_page()
+    assert PageTokens.coerce(page) is page
+    assert PageTokens.coerce(page.to_dicts()).texts == page.texts
+
+
+def test_texts_are_interned():
+    a = PageTokens(["".join(["mmol", "/L"])], [[0, 0, 1, 1]])
+    b = PageTokens(["".join(["mm", "ol/L"])], [[0, 0, 1, 1]])
+    assert a.texts[0] is b.texts[0]
+
+
+def test_indexing_yields_views():
+    page = make_page()
+
+    assert isinstance(page[0], TokenView)
+    assert page[-1]["text"] == "mmol/L"
+    with pytest.raises(IndexError):
+        page[3]
+    assert [t["text"] for t in page] == page.texts
+
+
+def test_token_view_reads_like_a_dict():
+    token = make_page()[1]
+
+    assert token["bbox"] == [400, 200, 440, 230]
+    assert "label" not in token and "confidence" not in token
+    assert token.get("label") is None
+    assert token.get("line", -1) == -1
+    assert token.keys() == ["text", "bbox", "ocr_confidence"]
+    with pytest.raises(KeyError):
+        token["label"]
+    with pytest.raises(KeyError):
+        token["unknown"]
+
+
+def test_token_view_writes_through_to_the_arrays():
+    page = make_page()
+    token = page[1]
+
+    token["label"] = "B-Test_Context_Name"
+    token["confidence"] = 0.5
+    token["bbox"] = [1, 2, 3, 4]
+    token["line"] = 3
+
+    assert page.label_ids[1] == LABEL_IDS["B-Test_Context_Name"]
+    assert page.confidences[1] == pytest.approx(0.5)
+    assert page.bboxes[1].tolist() == [1, 2, 3, 4]
+    assert page.lines[1] == 3
+    assert "label" in token
+    with pytest.raises(KeyError):
+        token["unknown"] = 1
+
+
+def test_subset_copies_the_selected_rows():
+    page = make_page()
+    sub = page.subset([2, 0])
+
+    assert sub.texts == ["mmol/L", "Glucose"]
+    assert sub.label_ids.tolist() == [NO_LABEL, LABEL_IDS["B-Test_Context_Name"]]
+    assert sub.columns.tolist() == [1, -1]
+    sub.bboxes[0] = 0
+    sub.label_ids[1] = NO_LABEL
+    assert page.bboxes[2].tolist() == [460, 200, 540, 230]
+    assert page.label_ids[0] == LABEL_IDS["B-Test_Context_Name"]
+
+
+def test_subset_of_nothing_is_empty():
+    sub = make_page().subset([])
+    assert len(sub) == 0 and sub.bboxes.shape == (0, 4)
+
+
+def test_set_labels_writes_in_place():
+    page = make_page()
+    label_ids = page.label_ids
+
+    page.set_labels([NO_LABEL, 1, 2], [0.0, 0.6, 0.7])
+
+    assert page.label_ids is label_ids
+    assert page.label_ids.tolist() == [NO_LABEL, 1, 2]
+    assert page.confidences.tolist() == pytest.approx([0.0, 0.6, 0.7])
+
+
+def test_reading_order_sorts_lines_then_left_edges():
+    page = PageTokens(
+        ["value", "Name", "second", "line"],
+        [[500, 102, 560, 128], [100, 100, 180, 130], [100, 300, 200, 330], [300, 302, 360, 328]],
+    )
+
+    ReadingOrder.sort_page(page)
+
+    assert page.texts == ["Name", "value", "second", "line"]
+    assert page.lines.tolist() == [0, 0, 1, 1]
+    assert page.has_lines
+    assert (page.columns >= 0).all()